@@ -252,8 +252,16 @@ def axidraw_CLI(dev = False):
             action="store_const",  const='True', \
             help='Enable CLI progress bar while plotting')
 
+    parser.add_argument("--daemon", nargs='?', const='', \
+            metavar='SOCKET', type=str, \
+            help='Send the job to a running axidaemon, at the given or default socket')
+
     args = parser.parse_args()
 
+    if args.daemon is not None: # Thin client: a running axidaemon does the work
+        from axicli import daemon
+        sys.exit(daemon.run_client(args, args.daemon or None))
+
     # Handle trivial cases
     from pyaxidraw import axidraw
     ad = axidraw.AxiDraw()
@@ -282,9 +290,9 @@ def axidraw_CLI(dev = False):
 
 
     if args.mode == "reorder":
-        from pyaxidraw import axidraw_svg_reorder
+        from pyaxidraw import svg_reorder
 
-        adc = axidraw_svg_reorder.ReorderEffect()
+        adc = svg_reorder.ReorderEffect()
 
         adc.getoptions([])
         utils.effect_parse(adc, svg_input)
@@ -332,9 +340,9 @@ def axidraw_CLI(dev = False):
 
     combined_config = utils.FakeConfigModule(config_dict)
 
-    from pyaxidraw import axidraw_control
+    from pyaxidraw import multi_unit
 
-    adc = axidraw_control.AxiDrawWrapperClass(params = combined_config)
+    adc = multi_unit.AxiDrawWrapperClass(params = combined_config)
 
     adc.getoptions([])
 
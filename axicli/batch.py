@@ -0,0 +1,160 @@
+'''
+axibatch - Batch time and distance estimates for many SVG files.
+
+Basic syntax:
+    axibatch svg_or_directory [svg_or_directory ...] [OPTIONS]
+
+Each SVG file (or each .svg file found within a directory) is previewed,
+and one line of JSON is written for it, as soon as it is done, with its
+estimated plot time, distances, pen lifts, and any warnings.
+
+Files are distributed over a pool of worker processes. Each worker loads
+the configuration once and reuses a single AxiDraw instance for all of
+the files that it handles, avoiding the start-up cost of one axicli
+process per file.
+'''
+
+import argparse
+import json
+import multiprocessing
+import os
+import pathlib
+import sys
+
+from axicli import utils
+
+_worker = None # Per-process BatchWorker, created by _init_worker
+
+
+class BatchWorker:
+    '''A configured AxiDraw instance, reused to estimate a series of SVG files'''
+
+    def __init__(self, config=None, fast_estimate=False):
+        from pyaxidraw import axidraw # Deferred; imported once per worker process
+
+        self.messages = []
+        self.config_dict = utils.load_configs([config, 'axidrawinternal.axidraw_conf'])
+        self.ad = axidraw.AxiDraw(user_message_fun=self.messages.append,
+            params=utils.FakeConfigModule(self.config_dict))
+        self.fast_estimate = fast_estimate
+
+    def estimate(self, svg_file):
+        '''Preview one SVG file; return a dict of results for it'''
+        ad = self.ad
+        del self.messages[:]
+        result = {'file': str(svg_file)}
+        try:
+            ad.plot_setup(str(svg_file))
+            utils.assign_option_values(ad.options, None, [self.config_dict],
+                utils.OPTION_NAMES)
+            ad.options.mode = "plot"
+            ad.options.preview = True
+            ad.options.rendering = 0
+            ad.options.report_time = False
+            ad.fast_estimate = self.fast_estimate
+            ad.plot_run()
+        except Exception as err: # pylint: disable=broad-except
+            result['error'] = str(err) or type(err).__name__
+            return result
+        finally:
+            ad.document = None # Release the parsed document
+            ad.original_document = None
+        result.update({
+            'time_estimate': round(ad.time_estimate, 3),
+            'distance_pendown': round(ad.distance_pendown, 4),
+            'distance_total': round(ad.distance_total, 4),
+            'pen_lifts': ad.pen_lifts,
+            'warnings': [message.strip() for message in self.messages if message.strip()]})
+        if ad.errors.code:
+            result['error_code'] = ad.errors.code
+        return result
+
+
+def _init_worker(config, fast_estimate):
+    global _worker # pylint: disable=global-statement
+    _worker = BatchWorker(config, fast_estimate)
+
+
+def _estimate(svg_file):
+    return _worker.estimate(svg_file)
+
+
+def find_svgs(inputs):
+    '''List of SVG files: the given files, plus .svg files found within given directories'''
+    svg_files = []
+    for item in inputs:
+        path = pathlib.Path(item)
+        if path.is_dir():
+            svg_files.extend(sorted(child for child in path.rglob('*')
+                if child.suffix.lower() == '.svg' and child.is_file()))
+        else:
+            svg_files.append(path)
+    return svg_files
+
+
+def run_batch(svg_files, config=None, jobs=None, fast_estimate=False):
+    '''
+    Estimate each of the SVG files, yielding a dict of results for each,
+    in the order that they are completed. Use a pool of jobs worker processes
+    (default: one per CPU core), or, if jobs is 0, estimate in this process.
+    '''
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    if jobs == 0:
+        worker = BatchWorker(config, fast_estimate)
+        for svg_file in svg_files:
+            yield worker.estimate(svg_file)
+        return
+    with multiprocessing.Pool(jobs, _init_worker, (config, fast_estimate)) as pool:
+        yield from pool.imap_unordered(_estimate, svg_files)
+
+
+def batch_CLI():
+    ''' The core of axibatch '''
+
+    desc = 'Estimate plot time and distance for many SVG files, as JSON lines.'
+
+    parser = argparse.ArgumentParser(description=desc)
+
+    parser.add_argument("inputs", nargs='+', metavar='SVG_OR_DIR', \
+            help="SVG files, or directories to search for SVG files")
+
+    parser.add_argument("-f", "--config", type=str, dest="config",
+                        help="Filename for the custom configuration file.")
+
+    parser.add_argument("-j","--jobs", \
+            metavar='COUNT', type=int, \
+            help="Number of worker processes. Default: one per CPU core. "\
+            + "0: Estimate within a single process.")
+
+    parser.add_argument("-F","--fast_estimate", \
+            action="store_const", const=True, default=False, \
+            help="Estimate analytically, without simulating each motion command")
+
+    parser.add_argument("-o","--output_file",\
+            metavar='FILE', \
+            help="Optional JSON lines output file name. Default: standard output")
+
+    args = parser.parse_args()
+
+    svg_files = find_svgs(args.inputs)
+    if args.config is not None: # Check the config file once, before starting workers
+        utils.load_config(args.config)
+
+    out_stream = sys.stdout if args.output_file is None else\
+        open(args.output_file, 'w', encoding='utf8')
+    failures = 0
+    try:
+        for result in run_batch(svg_files, args.config, args.jobs, args.fast_estimate):
+            if 'error' in result:
+                failures += 1
+            out_stream.write(json.dumps(result) + '\n')
+            out_stream.flush()
+    finally:
+        if out_stream is not sys.stdout:
+            out_stream.close()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    batch_CLI()
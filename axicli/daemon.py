@@ -0,0 +1,352 @@
+'''
+axidaemon - Long-running AxiDraw plot server, with a local control socket.
+
+Basic syntax:
+    axidaemon [--socket PATH] [OPTIONS]
+
+The daemon imports the AxiDraw software and loads its configuration once,
+then accepts jobs over a local (Unix domain) socket. Serial ports are opened
+on first use and kept open between jobs, and one configured AxiDraw instance
+is kept per port, so that short jobs do not pay the start-up, USB enumeration
+and connection costs of a new axicli process.
+
+Protocol: A client connects, sends one request as a line of JSON, and reads
+back events, one JSON object per line, until the "result" event. A request
+has the form:
+
+    {"command": "plot", "svg": "<svg ...>...</svg>", "options": {"speed_pendown": 50},
+     "output": false}
+
+where command is one of plot, preview, res_plot, toggle, walk, status, or
+shutdown; svg is an SVG file name or string (not needed for toggle or walk);
+options are AxiDraw option values (walk requires manual_cmd, e.g., walk_mmx,
+and dist); and output requests the output SVG in the result. Events are:
+
+    {"event": "message", "text": "..."}               Message from AxiDraw software
+    {"event": "progress", "distance_pendown": 12.5}   Pen-down distance so far, mm
+    {"event": "result", "error_code": 0, ...}         End of job
+
+The axicli --daemon option sends its job to a running daemon, rather than
+plotting from within its own process.
+'''
+
+import argparse
+import getpass
+import json
+import logging
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+
+from axicli import utils
+from axidrawinternal.plot_utils_import import from_dependency_import # plotink
+
+logger = logging.getLogger(__name__)
+
+# Request command: AxiDraw mode used for it
+COMMAND_MODES = {'plot': 'plot', 'preview': 'plot', 'res_plot': 'res_plot',
+    'toggle': 'toggle', 'walk': 'manual'}
+
+PROGRESS_INTERVAL = 0.5 # Minimum time between progress events, s
+
+
+def default_socket_path():
+    '''Default socket file name, unique to the current user'''
+    return os.path.join(tempfile.gettempdir(), f"axidraw-{getpass.getuser()}.sock")
+
+
+class DaemonUnit:
+    '''An AxiDraw instance and open serial port, reused for successive jobs on one port'''
+
+    def __init__(self, params):
+        from pyaxidraw import axidraw # Deferred; clients need not import the AxiDraw software
+
+        self.lock = threading.Lock() # Held while running a job
+        self.port = None # Open serial port, or None
+        self.emit = None # Event function of the current job
+        self.last_progress = 0
+        self.ad = axidraw.AxiDraw(user_message_fun=self.message, params=params)
+        self.ad.progress_fun = self.progress
+
+    def message(self, text):
+        '''Forward a message from the AxiDraw software to the client'''
+        if self.emit is not None:
+            self.emit({'event': 'message', 'text': str(text)})
+
+    def progress(self, ad_ref):
+        '''Forward plot progress to the client, at most once per PROGRESS_INTERVAL'''
+        now = time.time()
+        if self.emit is None or now - self.last_progress < PROGRESS_INTERVAL:
+            return
+        self.last_progress = now
+        self.emit({'event': 'progress', 'distance_pendown':
+            round(25.4 * ad_ref.plot_status.stats.down_travel_inch, 3)})
+
+    def close(self):
+        '''Close the serial port, if open'''
+        if self.port is not None:
+            from_dependency_import('plotink.ebb_serial').closePort(self.port)
+            self.port = None
+
+
+class PlotServer:
+    '''Configuration, AxiDraw instances, and open ports, shared by all jobs'''
+
+    def __init__(self, config=None):
+        self.config_dict = utils.load_configs([config, 'axidrawinternal.axidraw_conf'])
+        self.params = utils.FakeConfigModule(self.config_dict)
+        self.units = {} # DaemonUnit for each port name; '' for the first AxiDraw found
+        self.units_lock = threading.Lock()
+        self.jobs = 0
+
+    def get_unit(self, port_name):
+        '''DaemonUnit for a port name, created on first use'''
+        with self.units_lock:
+            if port_name not in self.units:
+                self.units[port_name] = DaemonUnit(self.params)
+            return self.units[port_name]
+
+    @staticmethod
+    def open_port(port_name):
+        '''Open a serial port to the named AxiDraw, or to the first one found'''
+        from pyaxidraw import port_cache
+        return port_cache.default_cache.open_port(port_name or None)
+
+    def status(self):
+        '''Status of the daemon, for the "status" command'''
+        with self.units_lock:
+            ports = sorted(name for name, unit in self.units.items() if unit.port is not None)
+        return {'event': 'result', 'error_code': 0, 'jobs': self.jobs, 'open_ports': ports}
+
+    def run_job(self, request, emit):
+        '''Run one plot, preview, res_plot, toggle or walk request; return the result event'''
+        command = request.get('command', 'plot')
+        if command not in COMMAND_MODES:
+            raise ValueError(f'Unknown command: {command}')
+        options = dict(request.get('options') or {})
+        port_name = str(options.pop('port', None) or '')
+        unit = self.get_unit(port_name)
+
+        with unit.lock:
+            ad = unit.ad
+            unit.emit = emit
+            unit.last_progress = 0
+            try:
+                ad.plot_setup(request.get('svg'))
+                utils.assign_option_values(ad.options, None, [self.config_dict],
+                    utils.OPTION_NAMES)
+                for name, value in options.items():
+                    setattr(ad.options, name, value)
+                ad.options.mode = COMMAND_MODES[command]
+                if command == 'preview':
+                    ad.options.preview = True
+                if command == 'walk' and not str(ad.options.manual_cmd).startswith('walk_'):
+                    raise ValueError('The walk command requires a manual_cmd of walk_x, '
+                        'walk_y, walk_mmx, walk_mmy, or walk_home.')
+
+                if not ad.options.preview:
+                    if unit.port is None:
+                        unit.port = self.open_port(port_name)
+                    if unit.port is None:
+                        ad.user_message_fun('Failed to connect to AxiDraw ' + port_name)
+                        return {'event': 'result', 'error_code': 101}
+                    ad.options.port = unit.port # Open port object; left open after the plot
+                    ad.options.port_config = 0
+
+                try:
+                    output = ad.plot_run(True)
+                except Exception:
+                    unit.close() # The port may be in an unknown state
+                    raise
+            finally:
+                unit.emit = None
+                ad.document = None # Release the parsed document
+                ad.original_document = None
+            self.jobs += 1
+
+            if ad.errors.code == 104: # Lost USB connectivity; reopen port for the next job
+                unit.close()
+            result = {'event': 'result', 'error_code': ad.errors.code,
+                'time_elapsed': round(ad.time_elapsed, 3)}
+            if ad.options.mode in ('plot', 'res_plot'):
+                result.update({
+                    'time_estimate': round(ad.time_estimate, 3),
+                    'distance_pendown': round(ad.distance_pendown, 4),
+                    'distance_total': round(ad.distance_total, 4),
+                    'pen_lifts': ad.pen_lifts})
+            if request.get('output'):
+                result['svg'] = output
+            return result
+
+    def close(self):
+        '''Close all open serial ports'''
+        with self.units_lock:
+            for unit in self.units.values():
+                with unit.lock:
+                    unit.close()
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    '''Read one JSON request line; write JSON event lines, ending with a result'''
+
+    def handle(self):
+        plot_server = self.server.plot_server
+
+        def emit(event):
+            self.wfile.write((json.dumps(event) + '\n').encode('utf8'))
+            self.wfile.flush()
+
+        try:
+            request = json.loads(self.rfile.readline().decode('utf8'))
+            command = request.get('command', 'plot')
+            if command == 'status':
+                result = plot_server.status()
+            elif command == 'shutdown':
+                result = {'event': 'result', 'error_code': 0}
+                threading.Thread(target=self.server.shutdown).start()
+            else:
+                result = plot_server.run_job(request, emit)
+        except Exception as err: # pylint: disable=broad-except
+            logger.exception('Request failed')
+            result = {'event': 'result', 'error_code': -1,
+                'error': str(err) or type(err).__name__}
+        try:
+            emit(result)
+        except OSError:
+            pass # Client has disconnected
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    '''Threaded Unix socket server; jobs for different ports may run concurrently'''
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, plot_server):
+        self.plot_server = plot_server
+        self.socket_path = socket_path
+        if os.path.exists(socket_path):
+            if daemon_listening(socket_path):
+                raise RuntimeError(f'An AxiDraw daemon is already listening on {socket_path}.')
+            os.unlink(socket_path) # Remove stale socket from a previous daemon
+        super().__init__(socket_path, _RequestHandler)
+
+    def server_close(self):
+        super().server_close()
+        self.plot_server.close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+def daemon_listening(socket_path):
+    '''True if a daemon (or other server) accepts connections on the socket file'''
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(socket_path)
+        except OSError: # e.g., refused: socket left behind by a daemon that has exited
+            return False
+    return True
+
+
+def send_request(request, socket_path=None, event_fun=None):
+    '''
+    Send a request to a running daemon. Pass each message and progress event
+    to event_fun, if given, and return the result event.
+    '''
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path or default_socket_path())
+        stream = client.makefile('rwb')
+        stream.write((json.dumps(request) + '\n').encode('utf8'))
+        stream.flush()
+        for line in stream:
+            event = json.loads(line.decode('utf8'))
+            if event.get('event') == 'result':
+                return event
+            if event_fun is not None:
+                event_fun(event)
+    raise RuntimeError('Connection to AxiDraw daemon closed without a result.')
+
+
+def run_client(args, socket_path=None):
+    '''
+    Send the job described by axicli arguments to a running daemon, print its
+    messages, and write its output file. Return the exit code for axicli.
+    '''
+    mode = args.mode or 'plot'
+    if mode == 'plot':
+        command = 'preview' if args.preview else 'plot'
+    elif mode in ('res_plot', 'toggle'):
+        command = mode
+    elif mode == 'manual' and str(args.manual_cmd).startswith('walk_'):
+        command = 'walk'
+    else:
+        print(f'Mode {mode} is not available with --daemon.')
+        return 1
+
+    options = {key: value for key, value in utils.load_configs([args.config]).items()
+        if key in utils.OPTION_NAMES} # Custom configuration, if any, on the client side
+    for name in utils.OPTION_NAMES:
+        value = getattr(args, name, None)
+        if value is not None:
+            options[name] = value
+    options.pop('mode', None)
+
+    request = {'command': command, 'options': options, 'output': bool(args.output_file)}
+    if args.svg_in is not None:
+        with open(args.svg_in, encoding='utf8') as svg_file: # Daemon may not share our files
+            request['svg'] = svg_file.read()
+
+    def print_event(event):
+        if event['event'] == 'message':
+            print(event['text'])
+        elif event['event'] == 'progress' and args.progress:
+            print(f"Pen-down distance: {event['distance_pendown']:.1f} mm", file=sys.stderr)
+
+    try:
+        result = send_request(request, socket_path, print_event)
+    except OSError as err:
+        print(f'Unable to connect to AxiDraw daemon: {err}')
+        return 1
+    if result.get('error'):
+        print(result['error'])
+    if result.get('svg') is not None:
+        utils.output_result(args.output_file, result['svg'])
+    return 1 if result.get('error_code') else 0
+
+
+def daemon_CLI():
+    ''' The core of axidaemon '''
+
+    desc = 'Long-running AxiDraw plot server, controlled over a local socket.'
+
+    parser = argparse.ArgumentParser(description=desc)
+
+    parser.add_argument("-s", "--socket", type=str, dest="socket_path",
+                        default=default_socket_path(),
+                        help="Socket file name. Default: " + default_socket_path())
+
+    parser.add_argument("-f", "--config", type=str, dest="config",
+                        help="Filename for the custom configuration file.")
+
+    args = parser.parse_args()
+
+    plot_server = PlotServer(args.config)
+    try:
+        server = DaemonServer(args.socket_path, plot_server)
+    except RuntimeError as err:
+        plot_server.close()
+        print(err, file=sys.stderr)
+        sys.exit(1)
+    with server:
+        print(f"AxiDraw daemon listening on {args.socket_path}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    daemon_CLI()
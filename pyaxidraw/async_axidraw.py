@@ -0,0 +1,142 @@
+# coding=utf-8
+#
+# Copyright 2023 Windell H. Oskay, Evil Mad Scientist Laboratories
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+
+"""
+pyaxidraw/async_axidraw.py
+
+asyncio interface to the AxiDraw Python API.
+
+An AsyncAxiDraw wraps an AxiDraw instance. Its plot context, interactive
+context, and query functions are coroutines: each call is queued to a
+command thread that owns the unit's serial port, and the coroutine awaits
+its completion without blocking the event loop. One event loop can thus
+drive many units at once, with a single command thread per unit rather
+than an executor thread tied up for each call.
+
+Serial communication with the AxiDraw (pyserial) is blocking, so it stays
+on the command thread; only the waiting moves to the event loop. Cancelling
+plot_run() requests a pause, as does pause(), through the AxiDraw software
+pause event; the plot stops as it would on a keyboard interrupt.
+"""
+
+import asyncio
+
+from pyaxidraw import axidraw, command_queue
+
+PAUSE_RETRY = 0.1 # Interval between pause requests while waiting for a plot to stop, s
+
+
+def _queued_call(name):
+    '''Coroutine method that queues the named AxiDraw method, and awaits its result'''
+    async def method(self, *args, **kwargs):
+        return await self.run(getattr(self.ad, name), *args, **kwargs)
+    method.__name__ = name
+    method.__doc__ = f'Queue AxiDraw.{name}() on the command thread; await its result'
+    return method
+
+
+class AsyncAxiDraw:
+    '''asyncio interface to one AxiDraw; calls run in order on its command thread'''
+
+    def __init__(self, ad=None, queue_size=1000, **kwargs):
+        self.ad = axidraw.AxiDraw(**kwargs) if ad is None else ad
+        self.commands = command_queue.CommandQueue(queue_size)
+
+    @property
+    def options(self):
+        '''Options of the wrapped AxiDraw'''
+        return self.ad.options
+
+    @property
+    def errors(self):
+        '''Error settings and error code of the wrapped AxiDraw'''
+        return self.ad.errors
+
+    async def run(self, function, *args, **kwargs):
+        '''Queue any call on the command thread; await its result'''
+        return await asyncio.wrap_future(self.commands.submit(function, *args, **kwargs))
+
+    def pause(self):
+        '''Request a pause of the plot in progress, as with a keyboard interrupt'''
+        if self.ad.software_initiated_pause_event is not None:
+            self.ad.transmit_pause_request()
+
+    async def plot_run(self, output=False):
+        '''
+        Plot (or preview) the document; return the output SVG if output is True.
+        If cancelled, pause the plot, wait for it to stop, then re-raise.
+        '''
+        future = self.commands.submit(self.ad.plot_run, output)
+        try:
+            return await asyncio.shield(asyncio.wrap_future(future))
+        except asyncio.CancelledError:
+            if not future.cancel(): # Already running: pause it, and wait for it to stop
+                while not future.done():
+                    self.pause()
+                    await asyncio.sleep(PAUSE_RETRY)
+            raise
+
+    plot_setup = _queued_call('plot_setup')
+    load_config = _queued_call('load_config')
+
+    connect = _queued_call('connect')
+    update = _queued_call('update')
+    goto = _queued_call('goto')
+    moveto = _queued_call('moveto')
+    lineto = _queued_call('lineto')
+    go = _queued_call('go')
+    move = _queued_call('move')
+    line = _queued_call('line')
+    penup = _queued_call('penup')
+    pendown = _queued_call('pendown')
+    draw_path = _queued_call('draw_path')
+    delay = _queued_call('delay')
+    flush_motion = _queued_call('flush_motion')
+    usb_command = _queued_call('usb_command')
+    usb_query = _queued_call('usb_query')
+    block = _queued_call('block')
+    current_pos = _queued_call('current_pos')
+    current_pen = _queued_call('current_pen')
+    turtle_pos = _queued_call('turtle_pos')
+    turtle_pen = _queued_call('turtle_pen')
+
+    def interactive(self):
+        '''Begin interactive context; does not communicate with the AxiDraw'''
+        self.ad.interactive()
+
+    async def disconnect(self):
+        '''Finish queued commands, end the serial session, and stop the command thread'''
+        try:
+            await self.run(self.ad.disconnect)
+        finally:
+            await self.close()
+
+    async def close(self):
+        '''Finish queued commands and stop the command thread'''
+        if self.commands.thread.is_alive():
+            try:
+                await asyncio.wrap_future(self.commands.submit(lambda: None))
+            finally:
+                self.commands.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
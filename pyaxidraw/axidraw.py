@@ -27,28 +27,86 @@ Requires Python 3.7 or newer and Pyserial 3.5 or newer.
 __version__ = '3.9.6'  # Dated 2023-12-12
 
 import math
+import functools
+import itertools
 import gettext
 import copy
 import logging
 import threading
 import signal
+import socket  # for exception handling only
+import time
 
 from lxml import etree
 
 from axidrawinternal import axidraw
 
 from axidrawinternal.plot_utils_import import from_dependency_import # plotink
-from axidrawinternal import boundsclip, serial_utils
+from axidrawinternal import digest_svg, dripfeed, motion, plot_optimizations, serial_utils
 inkex = from_dependency_import('ink_extensions.inkex')
+simpletransform = from_dependency_import('ink_extensions.simpletransform')
 ebb_motion = from_dependency_import('plotink.ebb_motion')
 ebb_serial = from_dependency_import('plotink.ebb_serial')
 plot_utils = from_dependency_import('plotink.plot_utils')
 path_objects = from_dependency_import('axidrawinternal.path_objects')
+text_utils = from_dependency_import('plotink.text_utils')
+requests = from_dependency_import('requests')
+urllib3 = from_dependency_import('urllib3') # for exception handling only
 from axicli import utils as axicli_utils
+from pyaxidraw import command_queue, doc_state, estimate, fastclip, incremental_reorder,\
+    port_cache, preview_recorder, session, stats_collector, vertex_arrays
 
 logger = logging.getLogger(__name__)
 
 
+def queued(method):
+    '''
+    Interactive context command: With async_commands, queue the call to run on
+    the command thread, and return a Future for it without waiting.
+    '''
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.async_commands and not self._on_command_thread():
+            return self._command_queue_ref().submit(method, self, *args, **kwargs)
+        return method(self, *args, **kwargs)
+    return wrapper
+
+
+def synchronous(method):
+    '''
+    Interactive context query: With async_commands, run the call on the command
+    thread once queued commands have finished, and wait for its result.
+    '''
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.async_commands and not self._on_command_thread():
+            return self._command_queue_ref().call(method, self, *args, **kwargs)
+        return method(self, *args, **kwargs)
+    return wrapper
+
+
+def copy_digest(digest):
+    '''
+    Copy of a DocDigest, with its own layers, paths, and vertex lists, to be
+    clipped and optimized without modifying the original. Much faster than
+    copy.deepcopy(), as other path and layer attributes are shared.
+    '''
+    new_digest = copy.copy(digest)
+    new_digest.plotdata = dict(digest.plotdata)
+    new_digest.metadata = dict(digest.metadata)
+    new_digest.layers = []
+    for layer in digest.layers:
+        new_layer = copy.copy(layer)
+        new_layer.paths = []
+        for path in layer.paths:
+            new_path = copy.copy(path)
+            new_path.subpaths = [[[vertex[0], vertex[1]] for vertex in subpath]
+                for subpath in path.subpaths]
+            new_layer.paths.append(new_path)
+        new_digest.layers.append(new_layer)
+    return new_digest
+
+
 class ErrConfig: # pylint: disable=too-few-public-methods
     '''Configure error reporting options for AxiDraw Python API'''
     def __init__(self):
@@ -66,6 +124,7 @@ class AxiDraw(axidraw.AxiDraw):
         super().__init__(*args, **kwargs)
 
         self.document = None
+        self._doc_state = None # Revertible state of the document, for copy-on-write
         self.original_document = None
 
         self.time_estimate = 0
@@ -77,6 +136,33 @@ class AxiDraw(axidraw.AxiDraw):
         self.keyboard_pause = False
         self.errors = ErrConfig()
         self._interrupted = False # Duplicate flag for keyboard interrupt for special cases.
+        self.incremental_reorder = True # Repair, rather than redo, path order between copies
+        self.tour_cache = None
+        self.hiding_tiles = 0 # Tiles per side for hidden-line removal; 0 or 1 disables tiling
+        self.hiding_workers = None # Worker processes for tiled hidden-line removal; None: auto
+        self.fast_estimate = False # Preview: Estimate time analytically, without rendering
+        self._estimating = False
+
+        self.preview = preview_recorder.Preview() # Record preview moves into arrays
+        self.preview_budget = 0 # Preview: Max. vertices per rendered preview path; 0: unlimited
+        self.preview_png = None # Preview: PNG file to also render the preview into
+        self.preview_png_size = 512 # Preview: Size of longer side of PNG preview, pixels
+        self.input_digest = None # DocDigest given to plot_setup(), in place of an SVG
+        self.shared_digest = None # Prepared DocDigest to plot, instead of digesting the SVG
+        self.defer_optimize = False # Prepare only: Leave randomizing & reordering to the plot
+        self.collect_stats = False # Collect time, distance & pen lifts by layer and by path
+        self.plot_stats = None # StatsCollector of the last plot, if collect_stats was set
+        self.progress_fun = None # Called with this AxiDraw instance after each path plotted
+        self.port_cache = port_cache.default_cache # Find USB ports via cache; None: search
+        self.buffered_motion = False # Interactive: Plan consecutive pen-down moves together
+        self.lookahead = 100 # Interactive, buffered motion: Max. vertices planned together
+        self._motion_buffer = [] # Interactive, buffered motion: Vertices not yet plotted
+        self.async_commands = False # Interactive: Queue commands to a background thread
+        self.queue_size = 1000 # Interactive, async commands: Max. commands queued at once
+        self._command_queue = None
+        self.keep_open = False # Plot context: Keep USB port open between plot_run() calls
+        self.session = session.Session() # Port kept open with keep_open, and its settings
+        self.pen = session.SessionPen()
 
     def set_up_pause_transmitter(self):
         """ intercept ctrl-C (keyboard interrupt) and redefine as "pause" command """
@@ -122,22 +208,136 @@ class AxiDraw(axidraw.AxiDraw):
         self.enable_motors()         # Set plot resolution & speed & enable motors
         return True
 
-    def plot_setup(self, svg_input=None, argstrings=None):
-        """Python module plot context: Begin plot context & parse SVG file"""
+    def disconnect(self):
+        '''End serial session; disconnect from AxiDraw '''
+        command_ref = None
+        if self._command_queue is not None and not self._on_command_thread():
+            command_ref = self._command_queue
+        try:
+            if command_ref is not None: # Finish queued commands, then buffered motion
+                command_ref.call(self._flush_buffered)
+            else:
+                self._flush_buffered()
+        finally:
+            if command_ref is not None:
+                command_ref.close()
+                self._command_queue = None
+            super().disconnect()
+            self.session.close() # Also end a keep_open session
+
+    def _flush_buffered(self):
+        '''Buffered motion: Plot any segments still buffered, before the port is closed'''
+        if self.plot_status.port and self._motion_buffer:
+            self.flush_motion()
+
+    def _command_queue_ref(self):
+        '''Interactive context, async commands: Command queue, started on first use'''
+        if self._command_queue is None:
+            self._command_queue = command_queue.CommandQueue(self.queue_size)
+        return self._command_queue
+
+    def _on_command_thread(self):
+        return self._command_queue is not None and self._command_queue.on_thread()
+
+    def serial_connect(self):
+        """
+        Connect to AxiDraw over USB, finding its port through the port cache.
+        Ports given as open serial port objects are used as-is.
+        With keep_open, in the plot context, keep the port open at the end of the plot,
+        and reuse it in later plots for as long as it remains connected.
+        """
+        if not self.keep_open or self.options.mode == "interactive" or\
+                (self.options.port and not isinstance(self.options.port, str)):
+            self.session.close()
+            self._open_port()
+            return
+        request = (self.options.port, self.options.port_config)
+        port = self.session.reuse(request)
+        if port is not None: # Still connected from an earlier plot
+            self.plot_status.port = port
+            self.plot_status.fw_version = self.session.fw_version
+            self.connected = True
+        else:
+            self._open_port()
+            if self.plot_status.port is None:
+                return
+            self.session.open(self.plot_status.port, request, self.plot_status.fw_version)
+        self.options.port = self.plot_status.port # An open port is not closed after the plot
+
+    def _open_port(self):
+        '''Open the USB serial port, finding it through the port cache if possible'''
+        if self.port_cache is None or (self.options.port and\
+                not isinstance(self.options.port, str)):
+            super().serial_connect()
+            return
+        port_name = None
+        if self.options.port_config != 1 and self.options.port:
+            port_name = str(self.options.port).strip('\"')
+        port = self.port_cache.open_port(port_name)
+        if port is None: # Not found among EBBs; search as usual, reporting any failure
+            super().serial_connect()
+            return
+        port_config = self.options.port_config
+        self.options.port = port
+        self.options.port_config = 0
+        super().serial_connect()
+        self.options.port = None # Opened here: close the port at the end of the plot
+        self.options.port_config = port_config
+
+    def enable_motors(self):
+        """
+        Enable motors, set native motor resolution, and set speed scales.
+        With keep_open, skip querying the motors when this resolution was already set
+        through the kept port, and only set the speed scales.
+        """
+        session_port = self.session.port is not None and\
+            self.plot_status.port is self.session.port and not self.options.preview
+        if session_port and self.options.mode in session.PLOT_MODES and\
+                self.session.applied.get('motors') == self.options.resolution:
+            self.options.preview = True # Skip EBB commands; speed scales only
+            try:
+                super().enable_motors()
+            finally:
+                self.options.preview = False
+            return
+        super().enable_motors()
+        if session_port:
+            self.session.applied['motors'] = self.options.resolution
+
+    def plot_setup(self, svg_input=None, argstrings=None, copy_input=False):
+        """
+        Python module plot context: Begin plot context & parse SVG file.
+        svg_input may be an SVG file name or string, an lxml element or element tree,
+        or a path_objects.DocDigest of paths to plot, in inches. A tree is used as
+        given, and receives the plot's output (e.g., plot data and preview layers),
+        unless copy_input is set. A DocDigest is plotted without SVG processing;
+        it is not modified, as each plot_run() works on a copy of it.
+        """
         file_ok = False
         inkex.localize()
         self.getoptions([] if argstrings is None else argstrings)
 
         self.original_dist = self.options.dist # Remove in v 4.0
         self.old_walk_dist = None # Remove in v 4.0
-
+        self.input_digest = None
+
+        if isinstance(svg_input, path_objects.DocDigest):
+            self.input_digest = svg_input
+            svg_input = self._digest_page(svg_input)
+        if isinstance(svg_input, etree._ElementTree) or etree.iselement(svg_input):
+            if copy_input:
+                svg_input = copy.deepcopy(svg_input)
+            if etree.iselement(svg_input):
+                svg_input = svg_input.getroottree()
+            self._set_document(svg_input)
+            self.getdocids()
+            return
         if svg_input is None:
             svg_input = plot_utils.trivial_svg
         try: # Parse input file or SVG string
             file_ref = open(svg_input, encoding='utf8')
             parse_ref = etree.XMLParser(huge_tree=True)
-            self.document = etree.parse(file_ref, parser=parse_ref)
-            self.original_document = copy.deepcopy(self.document)
+            self._set_document(etree.parse(file_ref, parser=parse_ref))
             file_ref.close()
             file_ok = True
         except IOError:
@@ -146,8 +346,8 @@ class AxiDraw(axidraw.AxiDraw):
             try:
                 svg_string = svg_input.encode('utf8') # Need consistent encoding.
                 parse_ref = etree.XMLParser(huge_tree=True, encoding='utf8')
-                self.document = etree.ElementTree(etree.fromstring(svg_string, parser=parse_ref))
-                self.original_document = copy.deepcopy(self.document)
+                self._set_document(etree.ElementTree(etree.fromstring(svg_string,\
+                    parser=parse_ref)))
                 file_ok = True
             except:
                 logger.error("Unable to open SVG input file.")
@@ -156,6 +356,38 @@ class AxiDraw(axidraw.AxiDraw):
             self.getdocids()
         # self.suppress_standard_output_stream()
 
+    def _set_document(self, document):
+        '''Use document as the input document, and keep its state to revert to after plots'''
+        self.document = document
+        self._doc_state = doc_state.DocumentState(document)
+        self._original_document = None
+        self._original_pending = True # Copy the input document only if it is asked for
+
+    @property
+    def original_document(self):
+        '''Copy of the input document, as given to plot_setup(); made on first use'''
+        if self._original_pending:
+            self._original_pending = False
+            if self._doc_state is not None:
+                self._original_document = self._doc_state.pristine_copy()
+        return self._original_document
+
+    @original_document.setter
+    def original_document(self, document):
+        self._original_document = document
+        self._original_pending = False
+
+    @staticmethod
+    def _digest_page(digest):
+        '''Empty SVG document, with the page size of a DocDigest, to plot it within'''
+        if digest.width <= 0 or digest.height <= 0:
+            return etree.fromstring(plot_utils.trivial_svg.encode('utf8'))
+        page = etree.Element(inkex.addNS('svg', 'svg'), nsmap={None: inkex.NSS['svg']})
+        page.set('width', f"{digest.width:f}in")
+        page.set('height', f"{digest.height:f}in")
+        page.set('viewBox', f"0 0 {digest.width:f} {digest.height:f}")
+        return page
+
     def plot_run(self, output=False):
         '''Python module plot context: Plot document'''
 
@@ -201,7 +433,17 @@ class AxiDraw(axidraw.AxiDraw):
 
         self.set_defaults() # Re-initialize some items normally set at __init__
         self.set_up_pause_receiver(self.software_initiated_pause_event)
-        self.effect()
+        port_option = self.options.port
+        try:
+            self.effect()
+        finally:
+            if self.session.port is not None:
+                self.options.port = port_option # Port option as given, not the kept port
+        if self.session.port is not None:
+            if abs(self.plot_status.stopped) == 104: # Lost USB connectivity
+                self.session.close()
+            elif self.options.mode not in session.PLOT_MODES:
+                self.session.applied = {} # e.g., align mode disables the motors
         self.clear_pause_request()
         #self.fw_version_string is a public string made available to Python API:
         self.fw_version_string = self.plot_status.fw_version
@@ -225,6 +467,287 @@ class AxiDraw(axidraw.AxiDraw):
             return self.get_output()
         return None
 
+    def prepare_document(self):
+        """
+        Prepare the SVG document for plotting: Create the plot digest, join nearby ends,
+        and perform supersampling. If not using randomization, then optimize the digest as well.
+        """
+        if not self.get_doc_props():
+            logger.error(gettext.gettext('This document does not have valid dimensions.'))
+            logger.error(gettext.gettext(
+                'The page size should be in either millimeters (mm) or inches (in).\r\r'))
+            logger.error(gettext.gettext(
+                'Consider starting with the Letter landscape or '))
+            logger.error(gettext.gettext('the A4 landscape template.\r\r'))
+            logger.error(gettext.gettext('The page size may also be set in Inkscape,\r'))
+            logger.error(gettext.gettext('using File > Document Properties.'))
+            return False
+
+        if self._doc_state is None or self._doc_state.document is not self.document:
+            self._doc_state = doc_state.DocumentState(self.document) # Document set directly
+        self.backup_original = self._doc_state # Reverted in place by plot_cleanup()
+
+        v_b = self.svg.get('viewBox')
+        if v_b:
+            p_a_r = self.svg.get('preserveAspectRatio')
+            s_x, s_y, o_x, o_y = plot_utils.vb_scale(v_b, p_a_r, self.svg_width, self.svg_height)
+        else:
+            s_x = 1.0 / float(plot_utils.PX_PER_INCH) # Handle case of no viewbox
+            s_y = s_x
+            o_x = 0.0
+            o_y = 0.0
+        self.vb_stash = s_x, s_y, o_x, o_y
+
+        # Initial transform of document is based on viewbox, if present:
+        self.svg_transform = simpletransform.parseTransform(\
+                f'scale({s_x:.6E},{s_y:.6E}) translate({o_x:.6E},{o_y:.6E})')
+
+        if self.input_digest is not None: # DocDigest given to plot_setup(); no SVG to process
+            self.digest = copy_digest(self.input_digest)
+            if self.rotate_page:
+                self.digest.rotate(self.params.auto_rotate_ccw)
+            if self.options.hiding and not self.digest.flat:
+                self.clip_hidden_lines()
+            else:
+                self.digest.layer_filter(self.plot_status.resume.new.layer)
+                self.clip_to_bounds()
+            allow_reverse = self.options.reordering in [2, 3]
+            if self.options.reordering < 3: # Set reordering to 4 to disable path joining
+                plot_optimizations.connect_nearby_ends(self.digest, allow_reverse,\
+                    self.params.min_gap)
+            plot_optimizations.supersample(self.digest,\
+                self.params.segment_supersample_tolerance)
+            self.randomize_optimize(True)
+            return True
+
+        if self.shared_digest is not None: # Digest prepared once, e.g., for multiple units
+            self.digest = self.shared_digest
+            self.shared_digest = None
+            if self.options.random_start: # Prepared with defer_optimize; not yet reordered
+                self.randomize_optimize(True) # Randomize & reorder with this unit's seed
+            return True
+
+        valid_plob = False
+        if self.plot_status.resume.old.plob_version:
+            logger.debug('Checking Plob')
+            valid_plob = digest_svg.verify_plob(self.svg, self.options.model)
+        if valid_plob:
+            logger.debug('Valid plob found; skipping standard pre-processing.')
+            self.digest = path_objects.DocDigest()
+            self.digest.from_plob(self.svg)
+            self.plot_status.resume.new.plob_version = str(path_objects.PLOB_VERSION)
+            return True
+
+        digester = digest_svg.DigestSVG() # Process the input SVG into a DocDigest object
+        if self.options.hiding: # Process all visible layers
+            digest_params = [self.svg_width, self.svg_height, s_x, s_y,\
+                -2, self.params.curve_tolerance]
+        else: # Process only selected layer, if in layers mode
+            digest_params = [self.svg_width, self.svg_height, s_x, s_y,\
+                self.plot_status.resume.new.layer, self.params.curve_tolerance]
+        self.digest = digester.process_svg(self.svg, self.warnings,
+            digest_params, self.svg_transform,)
+
+        if self.rotate_page: # Rotate digest
+            self.digest.rotate(self.params.auto_rotate_ccw)
+
+        if self.options.hiding:
+            self.clip_hidden_lines()
+        else:
+            self.clip_to_bounds()
+
+        allow_reverse = self.options.reordering in [2, 3]
+
+        if self.options.reordering < 3: # Set reordering to 4 to disable path joining
+            plot_optimizations.connect_nearby_ends(self.digest, allow_reverse,\
+                self.params.min_gap)
+
+        plot_optimizations.supersample(self.digest,\
+            self.params.segment_supersample_tolerance)
+
+        if not self.defer_optimize:
+            self.randomize_optimize(True) # Do plot randomization & optimizations
+        return True
+
+    def clip_hidden_lines(self):
+        """
+        Perform hidden-line clipping, based on object fills, clipping masks,
+            and document and plotting bounds, via self.bounds
+        """
+        # clipping involves a non-pure Python dependency (pyclipper), so only import
+        # when necessary
+        from pyaxidraw import hidden_lines
+        if self.hiding_tiles > 1:
+            clip_process = hidden_lines.TiledClipPathsProcess(self.hiding_tiles,\
+                self.hiding_workers)
+        else:
+            clip_process = hidden_lines.IndexedClipPathsProcess()
+        bounds = clip_process.calculate_bounds(self.bounds, self.svg_height,\
+            self.svg_width, self.params.clip_to_page, self.rotate_page)
+        # flattening removes essential information for the clipping process
+        assert not self.digest.flat
+        self.digest.layers = clip_process.run(self.digest.layers, bounds, clip_on=True)
+        self.digest.layer_filter(self.plot_status.resume.new.layer) # For Layers mode
+        self.digest.remove_unstroked() # Only stroked objects can plot
+        self.digest.flatten() # Flatten digest before optimizations and plotting
+
+    def clip_to_bounds(self):
+        """ Clip digest at plot bounds """
+        if self.rotate_page:
+            doc_bounds = [self.svg_height + 1e-9, self.svg_width + 1e-9]
+        else:
+            doc_bounds = [self.svg_width + 1e-9, self.svg_height + 1e-9]
+        out_of_bounds_flag = fastclip.clip_at_bounds(self.digest, self.bounds,\
+            doc_bounds, self.params.bounds_tolerance, self.params.clip_to_page)
+        if out_of_bounds_flag:
+            self.warnings.add_new('bounds')
+
+    def randomize_optimize(self, first_copy=False):
+        """
+        Randomize start points & perform reordering.
+        When plotting additional copies with random_start, keep the tour from the
+        first copy and only repair transitions adjacent to paths with new start points.
+        """
+        incremental = self.incremental_reorder and self.options.random_start and\
+            self.options.reordering in [1, 2, 3] and\
+            self.plot_status.resume.new.plob_version == "n/a"
+
+        if first_copy or not incremental or self.tour_cache is None or\
+                not self.tour_cache.valid_for(self.digest):
+            super().randomize_optimize(first_copy and not self.options.digest)
+            if first_copy and self.options.digest and\
+                    self.plot_status.resume.new.plob_version == "n/a": # Will return Plob
+                self.backup_original = doc_state.DocumentState(self.digest.to_plob())
+            self.tour_cache = incremental_reorder.TourCache(self.digest) if incremental else None
+            return
+
+        if self.options.mode != "res_plot": # Use old rand seed when resuming a plot.
+            self.plot_status.resume.new.rand_seed = int(time.time()*100)
+        plot_optimizations.randomize_start(self.digest, self.plot_status.resume.new.rand_seed)
+        self.tour_cache.repair()
+
+    def plot_cleanup(self):
+        """
+        Perform standard actions after a plot or the last copy from a set of plots:
+        Revert file, render previews, print time reports, run webhook.
+
+        When backup_original is a DocumentState, the document is reverted in place,
+        rather than replaced with a deep copy of the backup.
+        """
+        if not isinstance(self.backup_original, doc_state.DocumentState):
+            super().plot_cleanup()
+            return
+        self.document = self.backup_original.restore()
+        self.svg = doc_state.document_root(self.document)
+
+        if self.options.digest:
+            self.options.rendering = 0 # Turn off rendering
+
+        if self.options.digest > 1: # Save Plob file only and exit.
+            elapsed_time = time.time() - self.start_time
+            self.time_elapsed = elapsed_time # Available for use by python API
+            if self.options.report_time and not self.called_externally: # Print time only
+                self.user_message_fun("Elapsed time: " + text_utils.format_hms(elapsed_time))
+            return
+
+        self.preview.render(self) # Render preview on the page, if enabled and in preview mode
+
+        if self.plot_status.progress.enable and self.plot_status.stopped == 0:
+            self.user_message_fun("\nAxiCLI plot complete.\n") # If sequence ended normally.
+        elapsed_time = time.time() - self.start_time
+        self.time_elapsed = elapsed_time # Available for use by python API
+
+        if not self.called_externally: # Compile time estimates & print time reports
+            self.plot_status.stats.report(self.options, self.user_message_fun, elapsed_time)
+            self.pen.status.report(self, self.user_message_fun)
+            if self.options.report_time and self.plot_status.resume.new.plob_version != "n/a":
+                self.user_message_fun("Document printed from valid Plob digest.")
+
+        if self.options.webhook and not self.options.preview:
+            if self.options.webhook_url is not None:
+                payload = {'value1': str(self.digest.name),
+                    'value2': str(text_utils.format_hms(elapsed_time)),
+                    'value3': str(self.options.port),
+                    }
+                try:
+                    requests.post(self.options.webhook_url, data=payload, timeout=7)
+                except (TimeoutError, urllib3.exceptions.ConnectTimeoutError,\
+                    urllib3.exceptions.MaxRetryError, requests.exceptions.ConnectTimeout):
+                    self.user_message_fun("Webhook notification failed (Timed out).\n")
+                except (urllib3.exceptions.NewConnectionError,\
+                    socket.gaierror, requests.exceptions.ConnectionError):
+                    self.user_message_fun("An error occurred while posting webhook. " +
+                        "Check your internet connection and webhook URL.\n")
+
+    def plot_document(self):
+        """
+        Plot the prepared SVG document. In preview mode with fast_estimate set, estimate
+        plot time and distance analytically instead, without rendering the preview.
+        """
+        self._estimating = bool(self.options.preview and self.fast_estimate)
+        if self._estimating:
+            self.options.rendering = 0
+            self.preview.v_chart.enable = False
+        self.plot_stats = stats_collector.StatsCollector() if self.collect_stats else None
+        try:
+            super().plot_document()
+        finally:
+            self._estimating = False
+
+    def plot_doc_digest(self, digest):
+        """ Plot the document digest, collecting per-layer and per-path stats if enabled """
+        if self.plot_stats is None or not digest:
+            super().plot_doc_digest(digest)
+            return
+        self.plot_stats.begin(digest)
+        try:
+            super().plot_doc_digest(digest)
+        finally:
+            self.plot_stats.end(self)
+
+    def eval_layer_props(self, layer_props):
+        """ Act upon properties encoded in the layer name, at the start of each layer """
+        if self.plot_stats is not None:
+            self.plot_stats.layer_start(self, layer_props)
+        super().eval_layer_props(layer_props)
+
+    def plot_polyline(self, vertex_list):
+        """ Plot a polyline object; a single pen-down XY movement. """
+        if self.plot_stats is not None:
+            self.plot_stats.path_start(self, vertex_list)
+        if self.plot_status.stopped or not vertex_list or len(vertex_list) < 2:
+            return
+        if not self._estimating:
+            self.pen.pen_raise(self) # Raise, if necessary, prior to pen-up travel to first vertex
+            vertex_arrays.clamp(vertex_list, *self.bounds[1]) # Truncate at travel bounds
+            # Pen up straight move, zero velocity at endpoints, to first vertex location
+            self.go_to_position(vertex_list[0][0], vertex_list[0][1])
+            # Plan and feed trajectory, including lowering and raising pen before and after:
+            the_trajectory = motion.trajectory(self, vertex_list)
+            if the_trajectory is not None:
+                dripfeed.feed(self, the_trajectory[0])
+            if self.progress_fun is not None:
+                self.progress_fun(self)
+            return
+        self.pause_check()
+        self.pen.pen_raise(self)
+        vertex_arrays.clamp(vertex_list, *self.bounds[1]) # Truncate at travel bounds
+        estimate.travel(self, vertex_list[0][0], vertex_list[0][1])
+        self.pen.pen_lower(self)
+        estimate.polyline(self, vertex_list)
+        self.pen.pen_raise(self)
+        self.plot_status.progress.update_auto(self.plot_status.stats)
+
+    def go_to_position(self, x_dest, y_dest, ignore_limits=False, xyz_pos=None):
+        '''
+        Immediate XY move to destination, using normal motion planning,
+        assuming zero initial and final velocities.
+        '''
+        if not self._estimating or ignore_limits or xyz_pos is not None:
+            super().go_to_position(x_dest, y_dest, ignore_limits, xyz_pos)
+            return
+        estimate.travel(self, x_dest, y_dest)
+
     def load_config(self, config_ref):
         '''
         Plot or Interactive context: Load settings from a configuration file.
@@ -273,19 +796,23 @@ class AxiDraw(axidraw.AxiDraw):
             raise RuntimeError("Not connected to AxiDraw")
         return True
 
+    @queued
     def update(self):
         '''Python Interactive context: Apply optional parameters'''
         if not self._verify_interactive(True):
             return
+        self.flush_motion()
         self.update_options()
         self.pen.servo_init(self)
         if self.plot_status.port:
             self.enable_motors()  # Set plotting resolution & speed
 
+    @queued
     def delay(self, time_ms):
         '''Interactive context: Execute timed delay'''
         if not self._verify_interactive(True):
             return
+        self.flush_motion()
         if time_ms is None:
             self.user_message_fun(gettext.gettext("No delay time given.\n"))
             return
@@ -331,6 +858,22 @@ class AxiDraw(axidraw.AxiDraw):
         segment = [turtle, target]
         accept, seg = plot_utils.clip_segment(segment, self.bounds)
 
+        if self.buffered_motion and accept and self.plot_status.port and\
+                not self.pen.turtle.z_up and plot_utils.points_near(seg[0], turtle, 1e-9) and\
+                plot_utils.points_near(seg[1], target, 1e-9):
+            # Unclipped pen-down segment: Queue it, to plan with the segments that follow
+            if not self._motion_buffer:
+                self.pen.pen_lower(self)
+                self._motion_buffer.append([self.pen.phys.xpos, self.pen.phys.ypos])
+            self._motion_buffer.append(seg[1])
+            if len(self._motion_buffer) > self.lookahead:
+                self.flush_motion()
+            self.pen.turtle.xpos = x_value
+            self.pen.turtle.ypos = y_value
+            self.handle_errors()
+            return
+
+        self.flush_motion()
         if accept and self.plot_status.port: # Segment is at least partially within bounds
             if not plot_utils.points_near(seg[0], turtle, 1e-9): # if initial point clipped
                 if self.params.auto_clip_lift and not self.pen.turtle.z_up:
@@ -351,6 +894,25 @@ class AxiDraw(axidraw.AxiDraw):
 
         self.handle_errors()
 
+    @queued
+    def flush_motion(self):
+        """
+        Interactive context, buffered motion: Plot any queued pen-down segments
+        as a single trajectory, with cornering between segments rather than
+        stopping at each vertex. The pen is left down.
+        """
+        vertex_list = self._motion_buffer
+        self._motion_buffer = []
+        if len(vertex_list) < 2 or self.plot_status.stopped:
+            return
+        xyz_pos = copy.copy(self.pen.phys)
+        xyz_pos.z_up = False
+        move_list, _data_list = motion.plan_trajectory(self, vertex_list, xyz_pos)
+        if move_list:
+            dripfeed.feed(self, move_list)
+        self.handle_errors()
+
+    @queued
     def draw_path(self, vertex_list):
         '''
         Interactive context function to plot path data.
@@ -359,23 +921,25 @@ class AxiDraw(axidraw.AxiDraw):
         * Move along the path
         * Raise pen
         Input pathdata is an iterable of at least two 2-element items,
-            typically a list of 2-element lists or tuples.
+            typically a list of 2-element lists or tuples, or an array: either
+            an (N, 2) NumPy array, or a flat array.array of x, y values.
         Motion is clipped at hardware travel bounds; no document bounds are
             defined in interactive context. The auto_clip_lift parameter is
             ignored; draw_path always raises the pen at the edges of travel.
         '''
         if not self._verify_interactive(True):
             return
-        if len(vertex_list) < 2:
-            return # At least two vertices are required.
+        self.flush_motion()
         if self.plot_status.stopped: # If this plot is already stopped
             return
         if self.options.units == 1 : # Centimeter units
-            scaled_vertices = [[vertex[0] / 2.54, vertex[1] / 2.54] for vertex in vertex_list]
+            scaled_vertices = vertex_arrays.to_vertex_list(vertex_list, 1 / 2.54)
         elif self.options.units == 2: # Millimeter units
-            scaled_vertices = [[vertex[0] / 25.4, vertex[1] / 25.4] for vertex in vertex_list]
+            scaled_vertices = vertex_arrays.to_vertex_list(vertex_list, 1 / 25.4)
         else: # Assume self.options.units == 0; use default inch units
-            scaled_vertices = vertex_list
+            scaled_vertices = vertex_arrays.to_vertex_list(vertex_list)
+        if len(scaled_vertices) < 2:
+            return # At least two vertices are required.
         new_path = path_objects.PathItem()
         new_path.item_id = "draw_path_item"
         new_path.stroke = 'Black'
@@ -392,7 +956,7 @@ class AxiDraw(axidraw.AxiDraw):
         digest.flat = True
 
         # Clip at physical travel. Interactive mode does not define a document size.
-        boundsclip.clip_at_bounds(digest, self.bounds, self.bounds,\
+        fastclip.clip_at_bounds(digest, self.bounds, self.bounds,\
             self.params.bounds_tolerance, doc_clip=False)
 
         for path_item in digest.layers[0].paths:
@@ -406,6 +970,131 @@ class AxiDraw(axidraw.AxiDraw):
             self.pen.turtle = copy.copy(self.pen.phys)
             self.pen.turtle.z_up = True
 
+    @queued
+    def draw_paths(self, path_list):
+        '''
+        Interactive context function to plot many paths at once.
+        Given an iterable of paths, each a list or array of coordinates as for draw_path(),
+        clip them at hardware travel bounds, join and reorder them as in the plot
+        context (according to the reordering option), and plot them in turn.
+        Return a list of the paths, or remaining parts of paths, that were not
+        plotted because the plot was stopped (e.g., by the pause button); pass it
+        to draw_paths() again to resume. Return [] once all paths are plotted.
+        '''
+        if not self._verify_interactive(True):
+            return None
+        self.flush_motion()
+        return self._plot_path_batch(path_list)
+
+    @queued
+    def draw_stream(self, path_iter, window=100):
+        '''
+        Interactive context function to plot paths as they arrive, from an
+        iterable (e.g., a generator) of paths of unknown length. Paths are taken
+        from it window at a time, and each window is clipped, joined and reordered
+        as by draw_paths(), so that no more than window paths are held at once.
+        Pause requests (transmit_pause_request(), or ctrl-C if keyboard_pause was
+        set at connect()) and the pause button stop the plot, as in the plot context.
+        Return [] once the iterable is exhausted. If stopped, return the paths of
+        the current window that were not plotted; paths not yet taken from the
+        iterable remain in it. To resume, pass itertools.chain(remaining, path_iter).
+        '''
+        if not self._verify_interactive(True):
+            return None
+        self.flush_motion()
+        window = max(1, int(window))
+        path_iter = iter(path_iter)
+        if self.software_initiated_pause_event is None: # Not connected through connect()
+            self.software_initiated_pause_event = threading.Event()
+        self.set_up_pause_receiver(self.software_initiated_pause_event)
+        try:
+            while not self.plot_status.stopped:
+                path_batch = list(itertools.islice(path_iter, window))
+                if not path_batch:
+                    break
+                remaining = self._plot_path_batch(path_batch)
+                if self.plot_status.stopped:
+                    return remaining
+        finally:
+            self.software_initiated_pause_event.clear() # Handled; do not stop later commands
+            self._interrupted = False
+        return []
+
+    def _unit_scale(self):
+        '''Scale factor from user units to inches, in the interactive context'''
+        if self.options.units == 1: # Centimeter units
+            return 1 / 2.54
+        if self.options.units == 2: # Millimeter units
+            return 1 / 25.4
+        return 1 # Assume self.options.units == 0; use default inch units
+
+    def _plot_path_batch(self, path_list):
+        '''
+        Clip, join, reorder and plot a batch of paths given in user units, for
+        draw_paths() and draw_stream(). Return the paths, or remaining parts of
+        paths, in user units, not plotted because the plot was stopped.
+        '''
+        scale = self._unit_scale()
+        new_layer = path_objects.LayerItem()
+        for index, vertex_list in enumerate(path_list):
+            scaled_vertices = vertex_arrays.to_vertex_list(vertex_list, scale)
+            if len(scaled_vertices) < 2:
+                continue # At least two vertices are required.
+            new_path = path_objects.PathItem()
+            new_path.item_id = f"draw_paths_item{index}"
+            new_path.stroke = 'Black'
+            new_path.subpaths = [scaled_vertices if scaled_vertices is not vertex_list else
+                [[vertex[0], vertex[1]] for vertex in vertex_list]] # Do not modify caller's data
+            new_layer.paths.append(new_path)
+        digest = path_objects.DocDigest()
+        digest.layers.append(new_layer)
+        digest.flat = True
+
+        # Clip at physical travel. Interactive mode does not define a document size.
+        fastclip.clip_at_bounds(digest, self.bounds, self.bounds,\
+            self.params.bounds_tolerance, doc_clip=False)
+
+        allow_reverse = self.options.reordering in [2, 3]
+        if self.options.reordering < 3: # Set reordering to 4 to disable path joining
+            plot_optimizations.connect_nearby_ends(digest, allow_reverse, self.params.min_gap)
+        plot_optimizations.supersample(digest, self.params.segment_supersample_tolerance)
+        if self.options.reordering in [1, 2, 3]:
+            self._reorder_from_turtle(digest, allow_reverse)
+
+        start_dist = self.plot_status.stats.down_travel_inch
+        for path_item in digest.layers[0].paths:
+            if self.plot_status.stopped:
+                break
+            self.plot_polyline(path_item.subpaths[0])
+            self.handle_errors()
+        self.pen.pen_raise(self)
+        self.pen.turtle = copy.copy(self.pen.phys)
+        self.pen.turtle.z_up = True
+
+        if not self.plot_status.stopped:
+            return []
+        digest.crop(self.plot_status.stats.down_travel_inch - start_dist)
+        return [[[vertex[0] / scale, vertex[1] / scale] for vertex in path_item.subpaths[0]]
+            for path_item in digest.layers[0].paths if len(path_item.subpaths[0]) > 1]
+
+    def _reorder_from_turtle(self, digest, allow_reverse):
+        '''
+        Reorder the paths of a flat digest, starting from the current pen position
+        rather than from (0,0). plot_optimizations.reorder() always starts its tour
+        at the origin, so shift the paths to put the pen there while sorting.
+        '''
+        x_shift, y_shift = self.pen.turtle.xpos, self.pen.turtle.ypos
+        if x_shift == 0 and y_shift == 0:
+            plot_optimizations.reorder(digest, allow_reverse)
+            return
+        for path_item in digest.layers[0].paths:
+            path_item.subpaths = [[[vertex[0] - x_shift, vertex[1] - y_shift]
+                for vertex in path_item.subpaths[0]]]
+        plot_optimizations.reorder(digest, allow_reverse)
+        for path_item in digest.layers[0].paths:
+            path_item.subpaths = [[[vertex[0] + x_shift, vertex[1] + y_shift]
+                for vertex in path_item.subpaths[0]]]
+
     def handle_errors(self):
         '''Raise keyboard interrupts and runtime errors if thus configured'''
 
@@ -429,51 +1118,63 @@ class AxiDraw(axidraw.AxiDraw):
             if self.errors.code == 0:
                 self.plot_status.stopped = -103 # Assert keyboard interrupt
 
+    @queued
     def goto(self,x_target,y_target):
         '''Interactive context: absolute position move'''
         self._xy_plot_segment(False, x_target, y_target)
 
+    @queued
     def moveto(self,x_target,y_target):
         '''Interactive context: absolute position move, pen-up'''
         if not self._verify_interactive(True):
             return
+        self.flush_motion()
         self.pen.pen_raise(self)
         self.pen.turtle.z_up = True
         self._xy_plot_segment(False, x_target, y_target)
 
+    @queued
     def lineto(self,x_target,y_target):
         '''Interactive context: absolute position move, pen-down'''
         self.pen.turtle.z_up = False
         self._xy_plot_segment(False, x_target, y_target)
 
+    @queued
     def go(self,x_delta,y_delta):
         '''Interactive context: relative position move'''
         self._xy_plot_segment(True, x_delta, y_delta)
 
+    @queued
     def move(self,x_delta,y_delta):
         '''Interactive context: relative position move, pen-up'''
         if not self._verify_interactive(True):
             return
+        self.flush_motion()
         self.pen.pen_raise(self)
         self.pen.turtle.z_up = True
         self._xy_plot_segment(True, x_delta, y_delta)
 
+    @queued
     def line(self,x_delta,y_delta):
         '''Interactive context: relative position move, pen-down'''
         self.pen.turtle.z_up = False
         self._xy_plot_segment(True, x_delta, y_delta)
 
+    @queued
     def penup(self):
         '''Interactive context: raise pen'''
         if not self._verify_interactive(True):
             return
+        self.flush_motion()
         self.pen.pen_raise(self)
         self.pen.turtle.z_up = True
 
+    @queued
     def pendown(self):
         '''Interactive context: lower pen'''
         if not self._verify_interactive(True):
             return
+        self.flush_motion()
         self.pen.turtle.z_up = False
         if self.params.auto_clip_lift and not\
                 plot_utils.point_in_bounds([self.pen.turtle.xpos, \
@@ -481,39 +1182,50 @@ class AxiDraw(axidraw.AxiDraw):
             return # Skip out-of-bounds pen lowering
         self.pen.pen_lower(self)
 
+    @synchronous
     def usb_query(self, query):
         '''Interactive context: Low-level USB query'''
         if not self._verify_interactive(True):
             return None
+        self.flush_motion()
         return ebb_serial.query(self.plot_status.port, query).strip()
 
+    @queued
     def usb_command(self, command):
         '''Interactive context: Low-level USB command; use with great care '''
         if not self._verify_interactive(True):
             return
+        self.flush_motion()
         ebb_serial.command(self.plot_status.port, command)
 
+    @synchronous
     def block(self):
         '''Interactive context: Wait until all current motion commands have completed '''
         if not self._verify_interactive(True):
             return
+        self.flush_motion()
         serial_utils.exhaust_queue(self)
 
+    @synchronous
     def turtle_pos(self):
         '''Interactive context: Report last known "turtle" position'''
         return plot_utils.position_scale(self.pen.turtle.xpos, self.pen.turtle.ypos,\
             self.options.units)
 
+    @synchronous
     def turtle_pen(self):
         '''Interactive context: Report last known "turtle" pen state'''
         return self.pen.turtle.z_up
 
+    @synchronous
     def current_pos(self):
         '''Interactive context: Report last known physical position '''
         self._verify_interactive(True)
+        self.flush_motion()
         return plot_utils.position_scale(self.pen.phys.xpos, self.pen.phys.ypos,\
             self.options.units)
 
+    @synchronous
     def current_pen(self):
         '''Interactive context: Report last known physical pen state '''
         return self.pen.phys.z_up
@@ -0,0 +1,136 @@
+# coding=utf-8
+#
+# Copyright 2023 Windell H. Oskay, Evil Mad Scientist Laboratories
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+
+"""
+pyaxidraw/command_queue.py
+
+Background execution of interactive-context commands.
+
+Interactive commands normally return only once their motion commands have
+been sent over USB, including any waits for the AxiDraw's motion queue.
+A CommandQueue runs queued calls, in order, on a single background thread
+that owns the serial port, so that the caller may compute the next strokes
+while the AxiDraw is moving. Each call returns a Future right away. The
+queue is bounded; once it is full, adding a call waits for space.
+
+If a queued call raises an error, the error is set on its Future, and the
+calls already queued after it are cancelled. Unless it has been retrieved
+from that Future, the error is raised, once, in the caller's thread when it
+next adds a call, waits for a result, or waits for the queue to empty.
+"""
+
+import concurrent.futures
+import queue
+import threading
+
+
+class CommandFuture(concurrent.futures.Future):
+    '''Future of a queued call; retrieving its error reports it to the queue'''
+
+    def __init__(self, commands):
+        super().__init__()
+        self.commands = commands
+
+    def result(self, timeout=None):
+        try:
+            return super().result(timeout)
+        except BaseException as err:
+            self.commands.reported(err)
+            raise
+
+    def exception(self, timeout=None):
+        error = super().exception(timeout)
+        if error is not None:
+            self.commands.reported(error)
+        return error
+
+
+class CommandQueue:
+    '''Bounded queue of calls, run in order on a background thread'''
+
+    def __init__(self, maxsize=1000):
+        self.queue = queue.Queue(maxsize)
+        self.lock = threading.Lock()
+        self.error = None # Error raised by a queued call, not yet reported
+        self.cancelling = 0 # Number of calls, queued after the failed one, left to cancel
+        self.thread = threading.Thread(target=self._run, name='axidraw-commands', daemon=True)
+        self.thread.start()
+
+    def on_thread(self):
+        '''True if called from the background thread'''
+        return threading.current_thread() is self.thread
+
+    def submit(self, function, *args, **kwargs):
+        '''Queue a call; return its Future. Raise any error from an earlier call.'''
+        self.raise_error()
+        future = CommandFuture(self)
+        self.queue.put((future, function, args, kwargs))
+        return future
+
+    def call(self, function, *args, **kwargs):
+        '''Queue a call, after any already queued, and wait for its result'''
+        future = self.submit(function, *args, **kwargs)
+        try:
+            return future.result()
+        except concurrent.futures.CancelledError:
+            self.raise_error() # Cancelled because an earlier call failed
+            raise
+
+    def join(self):
+        '''Wait until all queued calls have finished; raise any error from them'''
+        self.queue.join()
+        self.raise_error()
+
+    def raise_error(self):
+        '''Raise, once, the error from a failed call, if not already reported'''
+        with self.lock:
+            error, self.error = self.error, None
+        if error is not None:
+            raise error
+
+    def reported(self, error):
+        '''Mark error as reported, once retrieved from the Future of its call'''
+        with self.lock:
+            if self.error is error:
+                self.error = None
+
+    def close(self):
+        '''Finish queued calls, then stop the background thread'''
+        self.queue.put(None)
+        self.thread.join()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            future, function, args, kwargs = item
+            if self.cancelling > 0:
+                self.cancelling -= 1
+                future.cancel() # An earlier call failed; skip the rest
+            elif future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(function(*args, **kwargs))
+                except BaseException as err: # pylint: disable=broad-except
+                    self.cancelling = self.queue.qsize() # Calls queued after this one
+                    with self.lock:
+                        self.error = err # Until retrieved from the Future, or raised
+                    future.set_exception(err)
+            self.queue.task_done()
@@ -0,0 +1,97 @@
+# coding=utf-8
+#
+# Copyright 2023 Windell H. Oskay, Evil Mad Scientist Laboratories
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+
+"""
+pyaxidraw/doc_state.py
+
+Copy-on-write handling of the SVG document being plotted.
+
+The plot context keeps the input document as it was given, so that the output
+document is the input plus only the plot data and preview layers of the last
+plot. This used to be done by deep-copying the whole tree: once when it was
+parsed, once again before plotting, and once more to revert it afterwards.
+
+Plotting does not otherwise change the document: the SVG is only read while it
+is digested, and the plot adds (or replaces) just a "plotdata" element and a
+preview layer. DocumentState instead records which elements are in the root of
+the document, plus the plotdata elements and their attributes. Restoring that
+small state reverts the document in place, with no copy of the tree.
+"""
+
+import copy
+
+from axidrawinternal.plot_utils_import import from_dependency_import # plotink
+inkex = from_dependency_import('ink_extensions.inkex')
+
+PLOTDATA_XPATH = "//*[self::svg:plotdata|self::plotdata]"
+
+
+def document_root(document):
+    '''Root element of an lxml element tree, or the element itself'''
+    try:
+        return document.getroot()
+    except AttributeError:
+        return document
+
+
+class DocumentState:
+    '''
+    Revertible state of an SVG document: the root element's attributes, text and
+    children, and each plotdata element, with its parent, position and attributes.
+    '''
+
+    def __init__(self, document):
+        self.document = document
+        root = document_root(document)
+        self.attrib = dict(root.attrib)
+        self.text = root.text
+        self.children = list(root)
+        self.plotdata = []
+        for node in root.xpath(PLOTDATA_XPATH, namespaces=inkex.NSS):
+            parent = node.getparent()
+            self.plotdata.append((node, parent, parent.index(node), dict(node.attrib)))
+
+    def restore(self):
+        '''Revert the document in place to the recorded state; return the document'''
+        root = document_root(self.document)
+        recorded = set(self.children)
+        for child in list(root):
+            if child not in recorded:
+                root.remove(child) # Added, e.g., a preview layer
+        for index, child in enumerate(self.children):
+            if child.getparent() is not root:
+                root.insert(index, child) # Removed; put back. Others are not moved.
+        root.text = self.text
+        root.attrib.clear()
+        root.attrib.update(self.attrib)
+        for node, parent, index, attrib in self.plotdata:
+            if parent is not root and node.getparent() is not parent:
+                parent.insert(index, node) # Restore nested plotdata element
+            node.attrib.clear()
+            node.attrib.update(attrib)
+        return self.document
+
+    def pristine_copy(self):
+        '''Deep copy of the document in the recorded state, leaving the document as it is'''
+        current = DocumentState(self.document)
+        self.restore()
+        try:
+            return copy.deepcopy(self.document)
+        finally:
+            current.restore()
@@ -0,0 +1,185 @@
+# coding=utf-8
+#
+# Copyright 2023 Windell H. Oskay, Evil Mad Scientist Laboratories
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+"""
+pyaxidraw/fastclip.py
+
+Bounds clipping with a fast path for paths that lie entirely within bounds.
+
+A drop-in replacement for boundsclip.clip_at_bounds(). The bounding box of
+each path is found with a single tight pass over its coordinates, and paths
+inside the clip bounds are passed through untouched. Only paths that cross
+the bounds are clipped, segment by segment, using the Liang-Barsky algorithm.
+"""
+
+
+def clip_at_bounds(digest, phy_bounds, doc_bounds, warn_tol, doc_clip=True):
+    """
+    Step through subpaths in the digest, clipping them at plot
+    boundaries, splitting them into additional subpaths if necessary.
+    Return True if the requested travel exceeds the bounds by more than
+    the tolerance, warn_tol.
+
+    Inputs and warning semantics are as for boundsclip.clip_at_bounds():
+    Warn only if the requested motion exceeds the physical bounds by
+    at least warn_tol, in the positive direction, and when it is clipped
+    by physical limits rather than by the page size.
+    """
+    clip_warn_x = True # Enable warnings about X clipping
+    clip_warn_y = True # Enable warnings about Y clipping
+
+    out_of_bounds_flag = False # No warning yet generated
+
+    [x_min, y_min] = phy_bounds[0]
+    [x_max, y_max] = phy_bounds[1]
+
+    if doc_clip:
+        [page_max_x, page_max_y] = doc_bounds
+        if x_max >= page_max_x:
+            clip_warn_x = False # Limited by page size, not travel size
+            x_max = page_max_x
+        if y_max >= page_max_y:
+            clip_warn_y = False # Limited by page size, not travel size
+            y_max = page_max_y
+
+    clip_bounds = (x_min, y_min, x_max, y_max)
+
+    # Loose tolerance bounds for generating warning messages:
+    x_max_warn = x_max + warn_tol
+    y_max_warn = y_max + warn_tol
+
+    digest.flatten()
+
+    for layer in digest.layers:
+        clipped = False
+        for path in layer.paths:
+            subpath = path.subpaths[0]
+            if not subpath:
+                continue
+            path_x_min, path_y_min, path_x_max, path_y_max = path_bounds(subpath)
+            if path_x_min >= x_min and path_x_max <= x_max and\
+                    path_y_min >= y_min and path_y_max <= y_max:
+                continue # Entirely within bounds; no change.
+
+            if (clip_warn_x and path_x_max > x_max_warn) or\
+                    (clip_warn_y and path_y_max > y_max_warn):
+                out_of_bounds_flag = True
+
+            path.subpaths = clip_subpath(subpath, clip_bounds)
+            clipped = True
+        if clipped:
+            layer.flatten() # Re-flatten layer
+    return out_of_bounds_flag
+
+
+def path_bounds(subpath):
+    """ Bounding box (x_min, y_min, x_max, y_max) of a non-empty list of vertices """
+    x_min = x_max = subpath[0][0]
+    y_min = y_max = subpath[0][1]
+    for v_x, v_y in subpath:
+        if v_x < x_min:
+            x_min = v_x
+        elif v_x > x_max:
+            x_max = v_x
+        if v_y < y_min:
+            y_min = v_y
+        elif v_y > y_max:
+            y_max = v_y
+    return x_min, y_min, x_max, y_max
+
+
+def clip_subpath(subpath, clip_bounds):
+    """
+    Clip a single subpath (list of [x, y] vertices) to clip_bounds,
+    (x_min, y_min, x_max, y_max). Return a list of the resulting subpaths.
+    Vertices within bounds are kept as-is; new vertices are added where
+    segments cross the bounds.
+    """
+    x_min, y_min, x_max, y_max = clip_bounds
+    new_subpaths = []
+    a_subpath = []
+    prev_vertex = None
+    prev_in_bounds = False
+
+    for vertex in subpath:
+        v_x, v_y = vertex
+        in_bounds = x_min <= v_x <= x_max and y_min <= v_y <= y_max
+        if prev_vertex is None:
+            if in_bounds:
+                a_subpath.append(vertex)
+        elif in_bounds and prev_in_bounds:
+            a_subpath.append(vertex)
+        else:
+            seg = liang_barsky(prev_vertex[0], prev_vertex[1], v_x, v_y, clip_bounds)
+            if seg is None:
+                in_bounds = False
+            else:
+                if not prev_in_bounds: # Segment enters bounds: start new subpath
+                    if a_subpath:
+                        new_subpaths.append(a_subpath)
+                    a_subpath = [[seg[0], seg[1]]]
+                if in_bounds:
+                    a_subpath.append(vertex)
+                else: # Segment leaves bounds: end subpath
+                    a_subpath.append([seg[2], seg[3]])
+                    new_subpaths.append(a_subpath)
+                    a_subpath = []
+        prev_vertex = vertex
+        prev_in_bounds = in_bounds
+
+    if a_subpath:
+        new_subpaths.append(a_subpath)
+    return new_subpaths
+
+
+def liang_barsky(x_1, y_1, x_2, y_2, clip_bounds):
+    """
+    Clip the segment (x_1, y_1)-(x_2, y_2) to clip_bounds, (x_min, y_min, x_max, y_max),
+    using the Liang-Barsky algorithm. Return the clipped segment as a tuple
+    (x_1', y_1', x_2', y_2'), or None if no part of the segment is within bounds.
+    """
+    x_min, y_min, x_max, y_max = clip_bounds
+    d_x = x_2 - x_1
+    d_y = y_2 - y_1
+    t_0, t_1 = 0.0, 1.0
+
+    for p_val, q_val in ((-d_x, x_1 - x_min), (d_x, x_max - x_1),
+                         (-d_y, y_1 - y_min), (d_y, y_max - y_1)):
+        if p_val == 0:
+            if q_val < 0:
+                return None # Parallel to this edge, and outside of it
+            continue
+        t_val = q_val / p_val
+        if p_val < 0:
+            if t_val > t_1:
+                return None
+            t_0 = max(t_0, t_val)
+        else:
+            if t_val < t_0:
+                return None
+            t_1 = min(t_1, t_val)
+
+    if t_0 == 0.0:
+        start = (x_1, y_1)
+    else:
+        start = (x_1 + t_0 * d_x, y_1 + t_0 * d_y)
+    if t_1 == 1.0:
+        end = (x_2, y_2)
+    else:
+        end = (x_1 + t_1 * d_x, y_1 + t_1 * d_y)
+    return start + end
@@ -0,0 +1,296 @@
+# coding=utf-8
+#
+# Copyright 2023 Windell H. Oskay, Evil Mad Scientist Laboratories
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+
+"""
+pyaxidraw/fleet.py
+
+Job scheduling for a fleet of AxiDraw units.
+
+A Fleet holds a queue of jobs, each an SVG document with its own options,
+and a set of units. Each unit runs in its own thread, taking the next job
+from the queue whenever it becomes idle, so that units plotting different
+jobs never wait on one another. Jobs are prepared (digested, clipped, and
+optimized) ahead of time on a pool of worker processes, so that a unit
+can begin plotting as soon as it takes a job.
+
+Units are found by name, as with the "list_names" manual command.
+SimulatedUnit stands in for an AxiDraw in preview mode, for testing a
+fleet without hardware.
+"""
+
+import collections
+import concurrent.futures
+import itertools
+import logging
+import os
+import threading
+import time
+
+from axidrawinternal.plot_utils_import import from_dependency_import # plotink
+ebb_serial = from_dependency_import('plotink.ebb_serial')
+
+from axicli import utils as axicli_utils
+from pyaxidraw import axidraw
+
+logger = logging.getLogger(__name__)
+
+UnitReport = collections.namedtuple('UnitReport', ['name', 'jobs', 'failed', 'busy_time',
+    'utilization', 'online'])
+UnitReport.__doc__ = '''
+Jobs completed and failed by one unit, time spent plotting (s), and the fraction
+of the fleet's run time spent plotting.
+'''
+
+_job_ids = itertools.count(1)
+
+
+class Job: # pylint: disable=too-few-public-methods
+    '''An SVG document (file name or string) to plot, with option values for it'''
+
+    def __init__(self, svg_input, option_values=None):
+        self.job_id = next(_job_ids)
+        self.svg_input = svg_input
+        self.option_values = dict(option_values or {})
+        self.status = "queued" # One of: queued, running, done, failed
+        self.unit = None       # Name of the unit that plotted the job
+        self.error_code = 0    # AxiDraw errors.code of the plot
+        self.time_elapsed = 0  # Duration of the plot, s
+        self.prepared = None   # Future for prepared DocDigest, if preparing ahead
+
+
+def configure(ad, svg_input, config_dict, option_values):
+    '''Load an SVG document into an AxiDraw instance, and apply configured and job options'''
+    ad.plot_setup(svg_input)
+    axicli_utils.assign_option_values(ad.options, None, [config_dict],
+        axicli_utils.OPTION_NAMES)
+    for name, value in option_values.items():
+        setattr(ad.options, name, value)
+
+
+def prepare_digest(svg_input, option_values, config=None):
+    '''
+    Parse, digest, clip and optimize an SVG document for plotting with the
+    given options; return the DocDigest (or None, if it could not be prepared).
+    With random_start, randomizing and reordering are left to the unit that plots it.
+    '''
+    config_dict = axicli_utils.load_configs([config, 'axidrawinternal.axidraw_conf'])
+    ad = axidraw.AxiDraw(params=axicli_utils.FakeConfigModule(config_dict))
+    configure(ad, svg_input, config_dict, option_values)
+    ad.defer_optimize = ad.options.random_start # Randomized with the plotting unit's seed
+    ad.options.digest = 2 # Generate digest only; do not plot
+    ad.options.report_time = False
+    ad.plot_run()
+    return ad.digest
+
+
+class Unit:
+    '''A single AxiDraw, selected by name (or port), that plots one job at a time'''
+
+    def __init__(self, name):
+        self.name = name
+        self.online = True
+        self.jobs = 0
+        self.failed = 0
+        self.busy_time = 0.0
+
+    def new_axidraw(self, fleet):
+        '''New AxiDraw instance for a job on this unit'''
+        return axidraw.AxiDraw(params=fleet.params)
+
+    def plot(self, fleet, job, digest):
+        '''
+        Plot a job, from its prepared digest if available. Return the AxiDraw
+        errors.code of the plot: 0 on success.
+        '''
+        ad = self.new_axidraw(fleet)
+        configure(ad, job.svg_input, fleet.config_dict, job.option_values)
+        ad.options.port = self.name
+        ad.options.port_config = 2 # Use the AxiDraw specified by port
+        ad.shared_digest = digest
+        ad.plot_run()
+        job.time_elapsed = ad.time_elapsed
+        return ad.errors.code
+
+
+class SimulatedUnit(Unit):
+    '''
+    A unit that previews jobs rather than plotting them, optionally sleeping
+    for time_scale times the estimated plot time, for testing without hardware.
+    '''
+
+    def __init__(self, name, time_scale=0.0):
+        super().__init__(name)
+        self.time_scale = time_scale
+
+    def plot(self, fleet, job, digest):
+        ad = self.new_axidraw(fleet)
+        configure(ad, job.svg_input, fleet.config_dict, job.option_values)
+        ad.options.preview = True
+        ad.options.rendering = 0
+        ad.shared_digest = digest
+        ad.plot_run()
+        if self.time_scale:
+            time.sleep(self.time_scale * ad.time_estimate)
+        job.time_elapsed = ad.time_estimate
+        return ad.errors.code
+
+
+def discover_units():
+    '''List of Unit objects, one for each AxiDraw found on USB, by name'''
+    return [Unit(name) for name in ebb_serial.list_named_ebbs() or []]
+
+
+class Fleet:
+    '''
+    Queue of jobs, plotted on a set of units; each idle unit takes the next job.
+    Jobs are prepared ahead on prepare_workers processes (default: one per CPU
+    core), or, if prepare_workers is 0, by each unit just before it plots.
+    Only jobs within one per online unit of the head of the queue are prepared
+    ahead, so that a long queue does not hold a digest for every job.
+    '''
+
+    def __init__(self, units=None, config=None, prepare_workers=None):
+        self.units = discover_units() if units is None else list(units)
+        self.config = config
+        self.config_dict = axicli_utils.load_configs([config, 'axidrawinternal.axidraw_conf'])
+        self.params = axicli_utils.FakeConfigModule(self.config_dict)
+        if prepare_workers is None:
+            prepare_workers = os.cpu_count() or 1
+        self.executor = None
+        if prepare_workers:
+            self.executor = concurrent.futures.ProcessPoolExecutor(prepare_workers)
+        self.queue = collections.deque() # Jobs waiting for a unit, in order
+        self.running = 0 # Jobs taken from the queue and not yet finished
+        self.condition = threading.Condition() # Guards queue and running
+        self.jobs = [] # All jobs submitted, in order
+        self.run_time = 0.0
+
+    def submit(self, svg_input, **option_values):
+        '''Add a job to the queue; return the Job'''
+        job = Job(svg_input, option_values)
+        with self.condition:
+            self.jobs.append(job)
+            self.queue.append(job)
+            self._prepare_ahead()
+            self.condition.notify_all()
+        return job
+
+    def run(self):
+        '''
+        Plot queued jobs until the queue is empty, or no units are online.
+        Jobs that could not be plotted because no units were left online fail,
+        with error code 101.
+        '''
+        start_time = time.time()
+        threads = [threading.Thread(target=self._unit_loop, args=(unit,),
+            name=f"fleet-{unit.name}") for unit in self.units if unit.online]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.run_time += time.time() - start_time
+        with self.condition:
+            while self.queue: # No units online
+                job = self.queue.popleft()
+                job.status = "failed"
+                job.error_code = 101
+                job.prepared = None
+                logger.error('Job %s failed: no units online', job.job_id)
+
+    def close(self):
+        '''Shut down the pool of preparation processes'''
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def _prepare_ahead(self):
+        '''Begin preparing the jobs nearest the head of the queue; call with condition held'''
+        if self.executor is None:
+            return
+        ahead = max(1, sum(1 for unit in self.units if unit.online))
+        for job in itertools.islice(self.queue, ahead):
+            if job.prepared is None:
+                job.prepared = self.executor.submit(prepare_digest, job.svg_input,
+                    job.option_values, self.config)
+
+    def _next_job(self, unit):
+        '''
+        Wait for the next job for a unit. Return None once the unit is offline, or
+        when no jobs are queued or running (as a running job may yet be requeued).
+        '''
+        with self.condition:
+            while unit.online:
+                if self.queue:
+                    job = self.queue.popleft()
+                    self.running += 1
+                    self._prepare_ahead()
+                    return job
+                if not self.running:
+                    return None
+                self.condition.wait()
+            return None
+
+    def _finish_job(self, job, requeue):
+        '''Count a job as finished, or put it back at the head of the queue'''
+        with self.condition:
+            self.running -= 1
+            if requeue:
+                self.queue.appendleft(job)
+                self._prepare_ahead()
+            self.condition.notify_all()
+
+    def _unit_loop(self, unit):
+        while True:
+            job = self._next_job(unit)
+            if job is None:
+                return
+            job.status = "running"
+            job.unit = unit.name
+            digest = None
+            if job.prepared is not None:
+                try:
+                    digest = job.prepared.result()
+                except Exception as err: # pylint: disable=broad-except
+                    logger.error('Unable to prepare job %s: %s', job.job_id, err)
+            start_time = time.time()
+            try:
+                job.error_code = unit.plot(self, job, digest)
+            except Exception as err: # pylint: disable=broad-except
+                logger.error('Job %s failed on unit %s: %s', job.job_id, unit.name, err)
+                job.error_code = -1
+            unit.busy_time += time.time() - start_time
+
+            if job.error_code == 101: # Failed to connect: Take unit offline, requeue job
+                unit.online = False
+                job.status = "queued"
+                job.unit = None
+                logger.error('Unit %s is offline; job %s requeued', unit.name, job.job_id)
+            elif job.error_code:
+                job.status = "failed"
+                unit.failed += 1
+            else:
+                job.status = "done"
+                unit.jobs += 1
+            self._finish_job(job, job.error_code == 101)
+
+    def report(self):
+        '''List of UnitReport rows, one per unit'''
+        return [UnitReport(unit.name, unit.jobs, unit.failed, unit.busy_time,
+            unit.busy_time / self.run_time if self.run_time else 0.0, unit.online)
+            for unit in self.units]
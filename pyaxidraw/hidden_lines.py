@@ -0,0 +1,345 @@
+# coding=utf-8
+#
+# Copyright 2023 Windell H. Oskay, Evil Mad Scientist Laboratories
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+"""
+pyaxidraw/hidden_lines.py
+
+Hidden-line removal with a bounding-box spatial index.
+
+The standard ClipPathsProcess clips every path against every filled path
+above it, which is quadratic in the number of paths. IndexedClipPathsProcess
+produces the same plotted geometry, but only passes a path to pyclipper when
+its bounding box overlaps that of the filled path above it. (As with
+ClipPathsProcess, the direction of strokes is not preserved.)
+
+TiledClipPathsProcess partitions the clipping bounds into tiles, and clips
+each tile separately, optionally in a pool of worker processes. Stroked
+fragments are stitched back together across tile boundaries afterwards.
+
+Requires pyclipper, via axidrawinternal.clipping; import only when needed.
+"""
+
+import bisect
+import collections
+import concurrent.futures
+import copy
+import logging
+import math
+
+from axidrawinternal.clipping import ClipPathsProcess, _HorizontalLineWorkaround
+
+logger = logging.getLogger(__name__)
+
+
+def bounding_box(subpaths):
+    '''Bounding box (x_min, y_min, x_max, y_max) of a list of subpaths, or None if empty'''
+    x_min = y_min = math.inf
+    x_max = y_max = -math.inf
+    for subpath in subpaths:
+        for x_pos, y_pos in subpath:
+            x_min = min(x_min, x_pos)
+            x_max = max(x_max, x_pos)
+            y_min = min(y_min, y_pos)
+            y_max = max(y_max, y_pos)
+    if x_min > x_max:
+        return None
+    return x_min, y_min, x_max, y_max
+
+
+def boxes_overlap(box_a, box_b):
+    '''True if two bounding boxes overlap or touch. Empty (None) boxes never overlap.'''
+    if box_a is None or box_b is None:
+        return False
+    return box_a[0] <= box_b[2] and box_b[0] <= box_a[2] and\
+        box_a[1] <= box_b[3] and box_b[1] <= box_a[3]
+
+
+class BoxGrid:
+    '''
+    Uniform grid index of bounding boxes. Each box is registered in every
+    cell that it covers; boxes covering a large part of the grid are kept
+    in a separate list that is returned by every query.
+    '''
+
+    def __init__(self, boxes):
+        '''boxes: list of bounding boxes (or None), indexed by item number'''
+        filled = [box for box in boxes if box is not None]
+        self.bins = max(1, math.ceil(math.sqrt(len(filled))))
+        self.cells = collections.defaultdict(list)
+        self.large = []
+        if not filled:
+            self.x_min = self.y_min = 0
+            self.cell_w = self.cell_h = 1
+            return
+        self.x_min = min(box[0] for box in filled)
+        self.y_min = min(box[1] for box in filled)
+        x_max = max(box[2] for box in filled)
+        y_max = max(box[3] for box in filled)
+        self.cell_w = max(x_max - self.x_min, 1) / self.bins
+        self.cell_h = max(y_max - self.y_min, 1) / self.bins
+        max_cells = max(4, len(filled) // 8)
+
+        for index_i, box in enumerate(boxes):
+            if box is None:
+                continue
+            x_0, y_0, x_1, y_1 = self._cell_range(box)
+            if (x_1 - x_0 + 1) * (y_1 - y_0 + 1) > max_cells:
+                self.large.append(index_i)
+                continue
+            for x_cell in range(x_0, x_1 + 1):
+                for y_cell in range(y_0, y_1 + 1):
+                    self.cells[(x_cell, y_cell)].append(index_i)
+
+    def _cell_range(self, box):
+        max_bin = self.bins - 1
+        x_0 = max(min(math.floor((box[0] - self.x_min) / self.cell_w), max_bin), 0)
+        y_0 = max(min(math.floor((box[1] - self.y_min) / self.cell_h), max_bin), 0)
+        x_1 = max(min(math.floor((box[2] - self.x_min) / self.cell_w), max_bin), 0)
+        y_1 = max(min(math.floor((box[3] - self.y_min) / self.cell_h), max_bin), 0)
+        return x_0, y_0, x_1, y_1
+
+    def query(self, box):
+        '''Set of item numbers whose cells may overlap the given box'''
+        found = set(self.large)
+        if box is None:
+            return found
+        x_0, y_0, x_1, y_1 = self._cell_range(box)
+        for x_cell in range(x_0, x_1 + 1):
+            for y_cell in range(y_0, y_1 + 1):
+                found.update(self.cells.get((x_cell, y_cell), ()))
+        return found
+
+
+class IndexedClipPathsProcess(ClipPathsProcess):
+    '''
+    ClipPathsProcess that skips clipping for pairs of paths whose bounding
+    boxes do not overlap. After each call to clip(), pairs_tested is the
+    number of path fragments that the grid index proposed for clipping, and
+    pairs_clipped the number of those actually passed to pyclipper.
+    '''
+
+    def __init__(self, clipping_path_cls=None):
+        super().__init__(clipping_path_cls)
+        self.pairs_tested = 0
+        self.pairs_clipped = 0
+
+    def clip(self, paths):
+        '''
+        paths are AbstractClippingPathItems, ordered bottom to top.
+
+        Each filled path clips every path below it. Clipping only removes
+        material, so the original bounding box of each path remains valid for
+        everything derived from it; those boxes are indexed once. Each path
+        is tracked as a "slot" holding its current list of fragments.
+        '''
+        self.pairs_tested = 0
+        self.pairs_clipped = 0
+
+        boxes = [bounding_box(path.subpaths) for path in paths]
+        slots = [[[path, box]] for path, box in zip(paths, boxes)] # [fragment, box or None]
+        grid = BoxGrid(boxes)
+
+        # Paths that are both filled and stroked are split into a filled part and
+        #   a stroked part once any filled path lies above them, clipped or not.
+        #   Paths that are neither filled nor stroked are dropped at that point.
+        unsplit = collections.deque(index_i for index_i, path in enumerate(paths)
+            if path.is_filled == path.is_stroked)
+
+        for index_k, clipper in enumerate(paths):
+            if index_k == 0 or not clipper.is_filled:
+                continue
+            clip_box = boxes[index_k]
+            for index_i in sorted(grid.query(clip_box)):
+                if index_i >= index_k or not boxes_overlap(boxes[index_i], clip_box):
+                    continue
+                new_fragments = []
+                for fragment, frag_box in slots[index_i]:
+                    self.pairs_tested += 1
+                    if frag_box is None:
+                        frag_box = bounding_box(fragment.subpaths)
+                    if boxes_overlap(frag_box, clip_box):
+                        self.pairs_clipped += 1
+                        new_fragments.extend([result, None] for result in
+                            clipper.clip_many([fragment]))
+                    else:
+                        new_fragments.extend([part, frag_box] for part in self._split(fragment))
+                slots[index_i] = new_fragments
+
+            while unsplit and unsplit[0] < index_k:
+                index_i = unsplit.popleft()
+                slots[index_i] = [[part, frag_box] for fragment, frag_box in slots[index_i]
+                    for part in self._split(fragment)]
+
+        logger.debug('Hidden-line removal: %d pairs tested, %d pairs clipped.',
+            self.pairs_tested, self.pairs_clipped)
+        return [fragment for slot in slots for fragment, _box in slot]
+
+    def _split(self, fragment):
+        '''
+        Separate the filled and stroked parts of an unclipped path, as
+        clip_many() would do for a path that is not actually cut.
+        '''
+        if not fragment.is_filled and not fragment.is_stroked:
+            return []
+        if not (fragment.is_filled and fragment.is_stroked):
+            return [fragment]
+        cls = self.clipping_path_cls
+        return [cls.from_cpath(fragment, fragment.subpaths, is_stroked=False, is_filled=True),
+                cls.from_cpath(fragment, fragment.subpaths, is_stroked=True, is_filled=False)]
+
+
+class TiledClipPathsProcess(ClipPathsProcess):
+    '''
+    ClipPathsProcess that divides the bounds into tiles_per_side x tiles_per_side
+    tiles. Each tile is clipped with IndexedClipPathsProcess, using only the
+    paths whose bounding boxes touch that tile. Tiles are distributed to a pool
+    of `workers` processes; with workers=0, tiles are clipped in this process.
+    '''
+
+    def __init__(self, tiles_per_side=4, workers=None, clipping_path_cls=None):
+        super().__init__(clipping_path_cls)
+        self.tiles_per_side = max(1, int(tiles_per_side))
+        self.workers = workers # None: one process per CPU core
+
+    def run(self, layers, bounds=None, clip_on=True):
+        '''
+        layers: a list of layers, ordered bottom to top
+        bounds: [[x_min, y_min], [x_max, y_max]]  (a rectangle)
+        clip_on: if True, perform clipping; else pass through and do nothing
+        '''
+        if not clip_on:
+            return super().run(layers, bounds, clip_on)
+
+        entries = [] # (z-order, layer_id, PathItem, bounding box)
+        for layer in layers:
+            for path_item in layer.paths:
+                entries.append((len(entries), layer.item_id, path_item,
+                    bounding_box(path_item.subpaths)))
+        if bounds is None:
+            boxes = [entry[3] for entry in entries if entry[3] is not None]
+            if not boxes:
+                return self._reconstruct_tiles([], layers)
+            bounds = [[min(box[0] for box in boxes), min(box[1] for box in boxes)],
+                [max(box[2] for box in boxes), max(box[3] for box in boxes)]]
+
+        x_coords = sorted({vertex[0] for entry in entries for subpath in entry[2].subpaths
+            for vertex in subpath})
+        y_coords = sorted({vertex[1] for entry in entries for subpath in entry[2].subpaths
+            for vertex in subpath})
+        jobs = []
+        for tile in self.tiles(bounds, x_coords, y_coords):
+            tile_box = (tile[0][0], tile[0][1], tile[1][0], tile[1][1])
+            tile_entries = [(z_order, layer_id, path_item) for z_order, layer_id, path_item, box
+                in entries if boxes_overlap(box, tile_box)]
+            if tile_entries:
+                jobs.append((tile, tile_entries))
+
+        if self.workers == 0 or len(jobs) < 2:
+            results = [clip_tile(tile, tile_entries) for tile, tile_entries in jobs]
+        else:
+            with concurrent.futures.ProcessPoolExecutor(self.workers) as executor:
+                results = list(executor.map(clip_tile, *zip(*jobs)))
+
+        fragments = [fragment for tile_result in results for fragment in tile_result]
+        return self._reconstruct_tiles(fragments, layers)
+
+    def tiles(self, bounds, x_coords=(), y_coords=()):
+        '''
+        Split bounds into a list of tile bounds, in the same format. Interior tile
+        edges are moved slightly if necessary, so that they do not coincide with any
+        of the sorted vertex coordinates given: A stroke lying exactly along a tile
+        edge would otherwise be dropped from both neighboring tiles.
+        '''
+        (x_min, y_min), (x_max, y_max) = bounds
+        count = self.tiles_per_side
+        x_edges = [x_min] + [self._free_edge(x_min + (x_max - x_min) * index_i / count,
+            x_coords) for index_i in range(1, count)] + [x_max]
+        y_edges = [y_min] + [self._free_edge(y_min + (y_max - y_min) * index_i / count,
+            y_coords) for index_i in range(1, count)] + [y_max]
+        return [[[x_edges[col], y_edges[row]], [x_edges[col + 1], y_edges[row + 1]]]
+            for row in range(count) for col in range(count)]
+
+    @staticmethod
+    def _free_edge(edge, coords, tolerance=1e-6):
+        '''Nudge edge position until it is not within tolerance of any value in sorted coords'''
+        index_i = bisect.bisect_left(coords, edge - tolerance)
+        while index_i < len(coords) and coords[index_i] <= edge + tolerance:
+            edge = coords[index_i] + 2 * tolerance
+            index_i = bisect.bisect_left(coords, edge - tolerance)
+        return edge
+
+    def _reconstruct_tiles(self, fragments, layers):
+        '''
+        Gather fragments from all tiles by source path, in z-order. Join stroked
+        fragments that meet at tile boundaries, and rebuild the layers.
+        '''
+        stroked = collections.defaultdict(list)
+        filled = collections.defaultdict(list)
+        sources = {}
+        for z_order, layer_id, path_item in fragments:
+            if str(path_item.stroke).lower() != "none":
+                sources[z_order] = (layer_id, path_item) # Stroked fragment as template
+                stroked[z_order].extend(path_item.subpaths)
+            else:
+                sources.setdefault(z_order, (layer_id, path_item))
+                filled[z_order].append(path_item)
+
+        layer_dict = {layer.item_id: [] for layer in layers}
+        path_id_counts = collections.Counter()
+        for z_order in sorted(sources):
+            layer_id, path_item = sources[z_order]
+            new_items = list(filled[z_order])
+            if stroked[z_order]:
+                new_item = copy.copy(path_item)
+                new_item.subpaths = self.clipping_path_cls._rejoin(stroked[z_order])
+                new_items.append(new_item)
+            base_id = new_items[0].item_id
+            for new_item in new_items:
+                path_id_counts[base_id] += 1
+                if path_id_counts[base_id] > 1:
+                    new_item.item_id = f"{base_id}_{path_id_counts[base_id]}"
+                layer_dict[layer_id].append(new_item)
+
+        for layer in layers:
+            layer.paths = layer_dict[layer.item_id]
+        return layers
+
+
+def clip_tile(tile, entries):
+    '''
+    Clip one tile: Intersect each path with the tile bounds, then perform
+    hidden-line clipping within the tile. Input entries are a list of
+    (z-order, layer_id, PathItem). Returns a list of (z-order, layer_id, PathItem)
+    for the resulting fragments. Runs in a worker process.
+    '''
+    process = IndexedClipPathsProcess()
+    cls = process.clipping_path_cls
+
+    paths = []
+    for z_order, layer_id, path_item in entries:
+        cpath = cls.from_path_item(path_item, (z_order, layer_id))
+        if cpath is not None:
+            paths.append(cpath)
+    paths = _HorizontalLineWorkaround.prepare(paths)
+    paths = process._flatten_nonfilled_paths(paths) # pylint: disable=protected-access
+
+    paths = cls.from_bounds(tile).clip_many(paths)
+    paths = process.clip(paths)
+
+    return [(cpath.layer_id[0], cpath.layer_id[1], cpath.to_path_item())
+        for cpath in paths]
@@ -0,0 +1,231 @@
+# coding=utf-8
+#
+# Copyright 2023 Windell H. Oskay, Evil Mad Scientist Laboratories
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+"""
+pyaxidraw/incremental_reorder.py
+
+Incremental re-optimization of plot order between copies.
+
+When plotting multiple copies with random_start enabled, closed paths are
+given new start points before each copy. Rather than re-sorting every path
+in the document for each copy, TourCache keeps the tour found for the first
+copy along with a grid index of path ends, and only revisits the pen-up
+transitions into and out of paths whose start point has moved.
+
+The functions here operate upon a "flat" DocDigest object, that has
+already been sorted by plot_optimizations.reorder().
+"""
+
+import collections
+import math
+
+ORIGIN = (0.0, 0.0) # Reordering assumes that each layer starts at (0,0)
+
+
+class TourCache:
+    '''Plot order and path-end spatial index, retained between copies of a plot'''
+
+    def __init__(self, digest):
+        self.digest = digest
+        self.layers = [LayerTour(layer_item.paths) for layer_item in digest.layers]
+        self.rotated = 0 # Number of paths found with new start points, at last repair
+        self.moved = 0   # Number of paths relocated within the tour, at last repair
+
+    def valid_for(self, digest):
+        '''Check that this cache was built for the given digest, and that it is unchanged'''
+        if digest is not self.digest or len(digest.layers) != len(self.layers):
+            return False
+        for layer_tour, layer_item in zip(self.layers, digest.layers):
+            if layer_tour.count != len(layer_item.paths):
+                return False
+        return True
+
+    def repair(self):
+        '''
+        Update the tour of each layer after randomize_start(), and write
+        the new path order back into the digest.
+        '''
+        self.rotated = 0
+        self.moved = 0
+        for layer_tour, layer_item in zip(self.layers, self.digest.layers):
+            rotated, moved = layer_tour.repair()
+            self.rotated += rotated
+            self.moved += moved
+            if moved:
+                layer_item.paths = layer_tour.ordered_paths()
+
+
+class LayerTour:
+    '''
+    Tour of a single layer, as a doubly linked list over the layer's PathItem
+    objects, plus a uniform grid index of path start and end points.
+    '''
+
+    def __init__(self, paths):
+        self.paths = list(paths)
+        self.count = len(self.paths)
+        self.head = 0 if self.count else None
+        self.succ = list(range(1, self.count)) + [None]
+        self.pred = [None] + list(range(self.count - 1))
+        self.entry = [tuple(path.first_point()) for path in self.paths]
+        self.exit = [tuple(path.last_point()) for path in self.paths]
+
+        self.bins = max(4, math.ceil(math.sqrt(self.count))) # About two path ends per cell
+        self.xmin, self.ymin = math.inf, math.inf
+        xmax, ymax = -math.inf, -math.inf
+        for x_pos, y_pos in self.entry + self.exit:
+            self.xmin = min(self.xmin, x_pos)
+            self.ymin = min(self.ymin, y_pos)
+            xmax = max(xmax, x_pos)
+            ymax = max(ymax, y_pos)
+        shim = 1e-6 # Avoid zero-size cells for degenerate layers
+        self.bin_size_x = max(xmax - self.xmin, shim) / self.bins
+        self.bin_size_y = max(ymax - self.ymin, shim) / self.bins
+
+        self.grid = {} # Cell: set of (path index, is_exit) entries
+        for index_i in range(self.count):
+            self._index_path(index_i)
+
+    def _cell(self, vertex):
+        '''Grid cell containing a vertex; vertices outside the grid go to edge cells'''
+        max_bin = self.bins - 1
+        x_bin = max(min(math.floor((vertex[0] - self.xmin) / self.bin_size_x), max_bin), 0)
+        y_bin = max(min(math.floor((vertex[1] - self.ymin) / self.bin_size_y), max_bin), 0)
+        return x_bin, y_bin
+
+    def _index_path(self, index_i):
+        self.grid.setdefault(self._cell(self.entry[index_i]), set()).add((index_i, False))
+        self.grid.setdefault(self._cell(self.exit[index_i]), set()).add((index_i, True))
+
+    def _unindex_path(self, index_i):
+        self.grid[self._cell(self.entry[index_i])].discard((index_i, False))
+        self.grid[self._cell(self.exit[index_i])].discard((index_i, True))
+
+    def _neighbors(self, vertex):
+        '''Path ends in the grid cell containing vertex, and the (up to) 8 around it'''
+        x_bin, y_bin = self._cell(vertex)
+        for x_cell in range(x_bin - 1, x_bin + 2):
+            for y_cell in range(y_bin - 1, y_bin + 2):
+                yield from self.grid.get((x_cell, y_cell), ())
+
+    def _gap(self, index_a, index_b):
+        '''Pen-up travel from the end of path a (None: origin) to the start of path b'''
+        if index_b is None:
+            return 0.0 # No travel after the last path of the layer
+        start = ORIGIN if index_a is None else self.exit[index_a]
+        return math.dist(start, self.entry[index_b])
+
+    def repair(self):
+        '''
+        Find paths with new start points, update the grid index for them,
+        and try to relocate each within the tour. Return counts of paths
+        rotated and of paths moved.
+        '''
+        rotated = []
+        for index_i, path in enumerate(self.paths):
+            first_point = tuple(path.first_point())
+            if first_point == self.entry[index_i]:
+                continue
+            self._unindex_path(index_i)
+            self.entry[index_i] = first_point
+            self.exit[index_i] = tuple(path.last_point())
+            self._index_path(index_i)
+            rotated.append(index_i)
+
+        # Relocating a path changes the transitions around its old position,
+        #   so its former neighbors are then revisited as well, within a budget.
+        moved = 0
+        work_list = collections.deque(rotated)
+        queued = set(rotated)
+        budget = 4 * len(rotated)
+        while work_list and budget > 0:
+            budget -= 1
+            index_i = work_list.popleft()
+            queued.discard(index_i)
+            prev_i, next_i = self.pred[index_i], self.succ[index_i]
+            if not self._relocate(index_i):
+                continue
+            moved += 1
+            for index_j in (prev_i, next_i):
+                if index_j is not None and index_j not in queued:
+                    work_list.append(index_j)
+                    queued.add(index_j)
+        return len(rotated), moved
+
+    def _relocate(self, index_i):
+        '''
+        Compare the cost of the two transitions adjacent to path i against
+        insertion next to nearby path ends; move path i if that is shorter.
+        '''
+        prev_i = self.pred[index_i]
+        next_i = self.succ[index_i]
+        best_cost = self._gap(prev_i, index_i) + self._gap(index_i, next_i) -\
+            self._gap(prev_i, next_i)
+        best_after = prev_i
+
+        candidates = set()
+        for index_j, is_exit in self._neighbors(self.entry[index_i]):
+            if index_j != index_i:
+                candidates.add(index_j if is_exit else self.pred[index_j])
+        candidates.discard(index_i) # Position already held by path i
+        candidates.discard(prev_i)
+
+        for after in candidates:
+            before = self.head if after is None else self.succ[after]
+            if before == index_i:
+                before = next_i
+            cost = self._gap(after, index_i) + self._gap(index_i, before) -\
+                self._gap(after, before)
+            if cost < best_cost - 1e-9:
+                best_cost = cost
+                best_after = after
+
+        if best_after == prev_i:
+            return False
+        self._unlink(index_i)
+        self._link_after(index_i, best_after)
+        return True
+
+    def _unlink(self, index_i):
+        prev_i, next_i = self.pred[index_i], self.succ[index_i]
+        if prev_i is None:
+            self.head = next_i
+        else:
+            self.succ[prev_i] = next_i
+        if next_i is not None:
+            self.pred[next_i] = prev_i
+
+    def _link_after(self, index_i, after):
+        before = self.head if after is None else self.succ[after]
+        if after is None:
+            self.head = index_i
+        else:
+            self.succ[after] = index_i
+        if before is not None:
+            self.pred[before] = index_i
+        self.pred[index_i] = after
+        self.succ[index_i] = before
+
+    def ordered_paths(self):
+        '''List of PathItem objects, in tour order'''
+        output = []
+        index_i = self.head
+        while index_i is not None:
+            output.append(self.paths[index_i])
+            index_i = self.succ[index_i]
+        return output
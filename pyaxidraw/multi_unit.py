@@ -0,0 +1,203 @@
+# coding=utf-8
+#
+# Copyright 2023 Windell H. Oskay, Evil Mad Scientist Laboratories
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+
+"""
+pyaxidraw/multi_unit.py
+
+Prepare the document once when plotting to multiple AxiDraw units.
+
+AxiDrawWrapperClass extends the class of the same name in
+axidrawinternal.axidraw_control. When plotting to all attached units
+(port_config 3), each unit normally parses, digests, clips, and optimizes
+the same document. Here, the document is instead prepared once, before the
+units are launched. The finished DocDigest is pickled into a block of
+shared memory, from which each unit, whether a thread or a process,
+loads its own copy.
+
+Each secondary unit also plots its own copy of the SVG document, parsed from
+a snapshot taken before the units are launched, since plotting reverts the
+document and adds plot data to it in place.
+"""
+
+import copy
+import logging
+import pickle
+from multiprocessing import shared_memory
+
+from lxml import etree
+
+from axidrawinternal import axidraw_control
+
+from pyaxidraw import axidraw, port_cache
+
+logger = logging.getLogger(__name__)
+
+UNIT_OPTIONS = ['mode', 'speed_pendown', 'speed_penup', 'accel', 'pen_pos_up', 'pen_pos_down',
+    'pen_rate_raise', 'pen_rate_lower', 'pen_delay_up', 'pen_delay_down',
+    'no_rotate', 'const_speed', 'report_time', 'manual_cmd', 'dist',
+    'layer', 'copies', 'page_delay', 'preview', 'rendering', 'model', 'penlift',
+    'setup_type', 'resume_type', 'auto_rotate', 'resolution', 'hiding', 'reordering',
+    'random_start', 'webhook', 'webhook_url', 'digest', 'progress',]
+
+
+class SharedDigest:
+    '''A pickled DocDigest, held in shared memory (or, if unavailable, in a bytes object)'''
+
+    def __init__(self, digest):
+        data = pickle.dumps(digest, pickle.HIGHEST_PROTOCOL)
+        self.size = len(data)
+        self.data = None
+        try:
+            self.memory = shared_memory.SharedMemory(create=True, size=max(self.size, 1))
+            self.memory.buf[:self.size] = data
+        except OSError: # e.g., no shared memory support on this system
+            self.memory = None
+            self.data = data
+
+    def load(self):
+        ''' Return a new copy of the DocDigest '''
+        if self.memory is None:
+            return pickle.loads(self.data)
+        return pickle.loads(self.memory.buf[:self.size])
+
+    def release(self):
+        ''' Free the shared memory; call once, from the process that created it '''
+        if self.memory is not None:
+            self.memory.close()
+            self.memory.unlink()
+            self.memory = None
+
+
+class AxiDrawWrapperClass(axidraw_control.AxiDrawWrapperClass):
+    """ Wrapper class for operating multiple AxiDraw units, preparing the document once """
+
+    def __init__(self, default_logging=True, params=None):
+        super().__init__(default_logging, params)
+        self.shared_digest = None # SharedDigest, while plotting to multiple units
+        self.document_data = None # Serialized document, while plotting to multiple units
+
+    def effect(self):
+        '''
+        Main entry point. When plotting to all attached units, prepare the
+        document once, before launching the units.
+        '''
+        self.options.mode = self.options.mode.strip("\"")
+        if self.share_digest():
+            digest = self.prepare_digest()
+            if digest is not None:
+                self.shared_digest = SharedDigest(digest)
+        if self.options.port_config == 3:
+            self.document_data = etree.tostring(self.document) # Before any unit starts
+        try:
+            super().effect()
+        finally:
+            self.document_data = None
+            if self.shared_digest is not None:
+                self.shared_digest.release()
+                self.shared_digest = None
+
+    def share_digest(self):
+        ''' True if the same prepared digest can be plotted on multiple AxiDraw units '''
+        if self.options.port_config != 3 or self.options.preview or self.options.digest:
+            return False
+        if self.options.mode not in ("plot", "layers"):
+            return False
+        port_cache.default_cache.invalidate() # New session: scan once; units use the cache
+        return len(port_cache.default_cache.ebb_ports()) > 1
+
+    def unit_options(self, ad):
+        ''' Copy options to the AxiDraw instance for a single unit '''
+        if not hasattr(self.options, 'progress'): # CLI only option; not part of regular options.
+            self.options.progress = False
+        ad.options.__dict__.update({item: self.options.__dict__[item] for item in UNIT_OPTIONS})
+
+    def unit_document(self):
+        ''' A separate copy of the document for a secondary unit '''
+        parse_ref = etree.XMLParser(huge_tree=True)
+        root = etree.fromstring(self.document_data, parser=parse_ref)
+        if etree.iselement(self.document):
+            return root
+        return etree.ElementTree(root)
+
+    def prepare_digest(self):
+        '''
+        Parse, digest, clip and optimize the document; return the DocDigest or None.
+        With random_start, randomizing and reordering are left to each unit.
+        '''
+        ad = axidraw.AxiDraw(params=self.params, default_logging=self.default_logging)
+        self.unit_options(ad)
+        ad.options.digest = 2 # Generate digest only; do not plot
+        ad.options.report_time = False
+        ad.options.port = None
+        ad.options.port_config = 1
+        ad.defer_optimize = ad.options.random_start # Each unit randomizes with its own seed
+        ad.document = copy.deepcopy(self.document)
+        ad.original_document = ad.document
+        ad.effect()
+        return ad.digest
+
+    def plot_to_axidraw(self, port, primary):
+        """
+        Delegate the plot to a particular AxiDraw, using the shared digest if present.
+        Secondary units plot their own copies of the document.
+        """
+        if not primary and self.document_data is not None:
+            unit = copy.copy(self) # Same options and shared digest; its own document
+            unit.document = self.unit_document()
+            unit.document_data = None
+            unit.plot_to_axidraw(port, primary)
+            return
+        if self.shared_digest is None:
+            super().plot_to_axidraw(port, primary)
+            return
+
+        ad = axidraw.AxiDraw(params=self.params, default_logging=self.default_logging)
+        ad.set_up_pause_receiver(self.software_initiated_pause_event)
+
+        prim = "primary" if primary else "secondary"
+        logger.info("plot_to_axidraw started, at port %s (%s)", port, prim)
+
+        self.unit_options(ad)
+        ad.options.port = port
+        if port is None:
+            ad.options.port_config = 1 # Use first available AxiDraw
+        else:
+            ad.options.port_config = 2 # Use AxiDraw specified by port
+
+        ad.document = self.document
+        ad.original_document = self.document
+        ad.shared_digest = self.shared_digest.load()
+
+        if hasattr(self, 'cli_api'):
+            ad.plot_status.cli_api = True # Set flag that software called by API
+
+        if not primary:
+            ad.set_secondary() # Suppress general message reporting; suppress time reporting
+
+        ad.effect() # Plot the document using axidraw.py
+
+        if primary:
+            self.document = ad.document
+            self.outdoc = ad.get_output() # Collect output from axidraw.py
+            self.status_code = ad.plot_status.stopped
+        elif ad.error_out:
+            if port is not None:
+                logger.error('Error on AxiDraw at port "' + port + '":' + ad.error_out)
+            else:
+                logger.error('Error on secondary AxiDraw: ' + ad.error_out)
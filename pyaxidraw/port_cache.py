@@ -0,0 +1,192 @@
+# coding=utf-8
+#
+# Copyright 2023 Windell H. Oskay, Evil Mad Scientist Laboratories
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+
+"""
+pyaxidraw/port_cache.py
+
+Cached discovery of AxiDraw USB ports and names.
+
+Finding an AxiDraw by name normally enumerates all serial ports on each
+connection, and plotting to all units enumerates them again for each unit.
+A PortCache keeps the ports, names, and hardware IDs found by one scan.
+Cached entries are checked cheaply when used: the port must still exist,
+it must open, and, when found by name, its name tag must still match.
+The ports are scanned again only on a cache miss or a failed check.
+
+Names are normally read from USB descriptors, without opening the port.
+EBBs that do not report a name in their descriptors are queried for their
+name tags in parallel, rather than one after another.
+"""
+
+import collections
+import concurrent.futures
+import os
+import threading
+
+from axidrawinternal.plot_utils_import import from_dependency_import # plotink
+ebb_serial = from_dependency_import('plotink.ebb_serial')
+
+PROBE_WORKERS = 8 # Maximum number of ports to query for name tags at once
+
+PortEntry = collections.namedtuple('PortEntry', ['name', 'device', 'description', 'hwid'])
+PortEntry.__doc__ = 'An EBB found on USB: name (or device, if unnamed), port device, and IDs'
+
+
+def descriptor_name(port_info):
+    '''
+    Name of an EBB from its USB port information (device, description, hwid),
+    following ebb_serial.list_named_ebbs(); None if no name is given there.
+    '''
+    _device, description, hwid = port_info[0], port_info[1], port_info[2]
+    if description.startswith("EiBotBoard") and description[11:]:
+        return description[11:]
+    if 'SER=' in hwid and ' LOCAT' in hwid: # Pyserial 3
+        index1 = hwid.find('SER=') + len('SER=')
+        name = hwid[index1:hwid.find(' LOCAT', index1)]
+        if len(name) >= 3:
+            return name
+    if 'SNR=' in hwid: # Pyserial 2.7 on Windows
+        name = hwid[hwid.find('SNR=') + len('SNR='):]
+        if len(name) >= 3:
+            return name
+    return None
+
+
+def probe_name(device):
+    '''Open a port and query the EBB name tag; None if unavailable'''
+    port = ebb_serial.testPort(device)
+    if port is None:
+        return None
+    try:
+        return ebb_serial.query_nickname(port, False)
+    finally:
+        ebb_serial.closePort(port)
+
+
+class PortCache:
+    '''Cache of the EBB ports found on USB, by name and by port device'''
+
+    def __init__(self):
+        self.entries = [] # PortEntry list, in USB enumeration order
+        self.scanned = False
+        self.scans = 0 # Number of full scans performed
+        self._lookup = {}
+        self._lock = threading.RLock()
+
+    def refresh(self):
+        '''Scan USB ports for EBBs, querying unnamed ones for name tags in parallel'''
+        port_list = ebb_serial.listEBBports() or []
+        names = [descriptor_name(port_info) for port_info in port_list]
+        unnamed = [index for index, name in enumerate(names) if name is None]
+        if unnamed:
+            workers = min(len(unnamed), PROBE_WORKERS)
+            with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+                probed = executor.map(probe_name, [port_list[index][0] for index in unnamed])
+                for index, name in zip(unnamed, probed):
+                    names[index] = name
+        entries = [PortEntry(name or port_info[0], port_info[0], port_info[1], port_info[2])
+            for port_info, name in zip(port_list, names)]
+        lookup = {}
+        for entry in reversed(entries): # First-enumerated entry wins, for duplicate names
+            for key in (entry.name, entry.device, os.path.basename(entry.device)):
+                lookup[key.lower()] = entry
+        with self._lock:
+            self.entries = entries
+            self._lookup = lookup
+            self.scanned = True
+            self.scans += 1
+
+    def invalidate(self):
+        '''Discard cached entries; the next lookup will scan the ports again'''
+        with self._lock:
+            self.scanned = False
+
+    @staticmethod
+    def valid(entry):
+        '''Cheap check that a cached port still exists'''
+        if entry.device.startswith('/'):
+            return os.path.exists(entry.device)
+        return True # No cheap check for, e.g., Windows COM ports; checked when opened
+
+    def ebb_ports(self):
+        '''List of (device, description, hwid) for each EBB, as ebb_serial.listEBBports()'''
+        with self._lock:
+            if not self.scanned or not all(self.valid(entry) for entry in self.entries):
+                self.refresh()
+            return [(entry.device, entry.description, entry.hwid) for entry in self.entries]
+
+    def names(self):
+        '''List of EBB names (or port devices, for unnamed EBBs)'''
+        self.ebb_ports()
+        return [entry.name for entry in self.entries]
+
+    def find(self, port_name=None):
+        '''
+        PortEntry of the EBB with the given name or port device, or of the first
+        EBB found if port_name is None. Scan the ports only on a miss.
+        '''
+        with self._lock:
+            scanned_now = not self.scanned
+            if scanned_now:
+                self.refresh()
+            entry = self._match(port_name)
+            if entry is None and not scanned_now: # Miss, or port no longer present
+                self.refresh()
+                entry = self._match(port_name)
+            return entry
+
+    def _match(self, port_name):
+        if port_name is None:
+            entry = self.entries[0] if self.entries else None
+        else:
+            entry = self._lookup.get(str(port_name).lower())
+        if entry is not None and self.valid(entry):
+            return entry
+        return None
+
+    def open_port(self, port_name=None):
+        '''
+        Open a serial port to the EBB with the given name or port device, or to
+        the first EBB found if port_name is None. If the cached port does not
+        open, or now has a different name tag, scan and try once more.
+        Return the open port, or None.
+        '''
+        for _attempt in (0, 1):
+            entry = self.find(port_name)
+            if entry is None:
+                return None
+            port = ebb_serial.testPort(entry.device)
+            if port is not None and self.name_matches(port, entry, port_name):
+                return port
+            if port is not None:
+                ebb_serial.closePort(port)
+            self.invalidate()
+        return None
+
+    @staticmethod
+    def name_matches(port, entry, port_name):
+        '''True unless the EBB was found by name and now reports a different name tag'''
+        if port_name is None or str(port_name).lower() != entry.name.lower() or\
+                entry.name == entry.device:
+            return True
+        name = ebb_serial.query_nickname(port, False)
+        return name is None or name.lower() == entry.name.lower()
+
+
+default_cache = PortCache() # Shared by AxiDraw instances within this process
@@ -0,0 +1,166 @@
+# coding=utf-8
+#
+# Copyright 2023 Windell H. Oskay, Evil Mad Scientist Laboratories
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+
+"""
+pyaxidraw/preview_raster.py
+
+Raster (PNG) rendering of plot previews.
+
+The pen-up and pen-down moves recorded by preview_recorder.Preview are
+drawn directly into an RGB pixel buffer and saved as a PNG file, without
+first writing preview layers into the SVG document and rasterizing that.
+Lines are drawn one pixel wide, in the preview_color_up and
+preview_color_down colors. NumPy is used for drawing, if it is available;
+otherwise, drawing and PNG encoding are pure Python.
+"""
+
+import math
+import struct
+import zlib
+
+from axidrawinternal.plot_utils_import import from_dependency_import
+simplestyle = from_dependency_import('ink_extensions.simplestyle')
+
+try:
+    import numpy
+except ImportError: # NumPy is optional
+    numpy = None
+
+
+class Raster:
+    '''
+    RGB image buffer, with a white background, for drawing traces of
+    recorded preview moves
+    '''
+
+    def __init__(self, width, height, use_numpy=True):
+        self.width = width
+        self.height = height
+        if numpy is not None and use_numpy:
+            self.pixels = numpy.full((height, width, 3), 255, dtype=numpy.uint8)
+        else:
+            self.pixels = bytearray(b'\xff' * (width * height * 3))
+
+    def draw_trace(self, trace, x_page, y_page, scale, color):
+        '''
+        Draw the subpaths of a MoveTrace, given its vertex coordinates on the page
+        (x_page, y_page; inches), at scale pixels per inch, in an (r, g, b) color.
+        '''
+        if len(x_page) < 2:
+            return
+        if isinstance(self.pixels, bytearray):
+            self._draw_python(trace, x_page, y_page, scale, bytes(color))
+        else:
+            self._draw_numpy(trace, x_page, y_page, scale, color)
+
+    def _draw_python(self, trace, x_page, y_page, scale, color):
+        ''' Draw line segments, one pixel at a time, into a bytearray '''
+        pixels = self.pixels
+        x_max, y_max = self.width - 1, self.height - 1
+        row_length = 3 * self.width
+        floor = math.floor
+        for start, end in trace.subpaths():
+            x_1, y_1 = x_page[start] * scale, y_page[start] * scale
+            offset = min(max(floor(y_1 + 0.5), 0), y_max) * row_length +\
+                3 * min(max(floor(x_1 + 0.5), 0), x_max)
+            pixels[offset:offset + 3] = color
+            for index_i in range(start + 1, end):
+                x_0, y_0 = x_1, y_1
+                x_1, y_1 = x_page[index_i] * scale, y_page[index_i] * scale
+                d_x, d_y = x_1 - x_0, y_1 - y_0
+                span = max(abs(d_x), abs(d_y))
+                if span < 1: # Short segment: Only the end pixel is new
+                    offset = min(max(floor(y_1 + 0.5), 0), y_max) * row_length +\
+                        3 * min(max(floor(x_1 + 0.5), 0), x_max)
+                    pixels[offset:offset + 3] = color
+                    continue
+                steps = math.ceil(span)
+                for step in range(1, steps + 1):
+                    t_val = step / steps
+                    offset = min(max(floor(y_0 + t_val * d_y + 0.5), 0), y_max) * row_length +\
+                        3 * min(max(floor(x_0 + t_val * d_x + 0.5), 0), x_max)
+                    pixels[offset:offset + 3] = color
+
+    def _draw_numpy(self, trace, x_page, y_page, scale, color):
+        ''' Draw all line segments at once, into a NumPy array '''
+        x_pix = numpy.frombuffer(x_page, dtype=numpy.float64) * scale
+        y_pix = numpy.frombuffer(y_page, dtype=numpy.float64) * scale
+        segments = numpy.ones(len(x_pix) - 1, dtype=bool) # Segment i: vertex i to i + 1
+        starts = numpy.frombuffer(trace.starts, dtype=numpy.uint64 if\
+            trace.starts.itemsize == 8 else numpy.uint32).astype(numpy.int64)
+        segments[starts[starts > 0] - 1] = False # No segments between subpaths
+        x_0, y_0 = x_pix[:-1][segments], y_pix[:-1][segments]
+        d_x, d_y = x_pix[1:][segments] - x_0, y_pix[1:][segments] - y_0
+        steps = numpy.ceil(numpy.maximum(numpy.abs(d_x), numpy.abs(d_y))).astype(numpy.int64) + 1
+        segment_i = numpy.repeat(numpy.arange(len(steps)), steps)
+        step = numpy.arange(len(segment_i)) - numpy.repeat(numpy.cumsum(steps) - steps, steps)
+        t_val = step / numpy.maximum(steps - 1, 1)[segment_i]
+        x_out = numpy.floor(x_0[segment_i] + t_val * d_x[segment_i] + 0.5).astype(numpy.int64)
+        y_out = numpy.floor(y_0[segment_i] + t_val * d_y[segment_i] + 0.5).astype(numpy.int64)
+        numpy.clip(x_out, 0, self.width - 1, out=x_out)
+        numpy.clip(y_out, 0, self.height - 1, out=y_out)
+        self.pixels[y_out, x_out] = color
+
+    def rgb_bytes(self):
+        ''' Image as bytes, three per pixel, row by row from the top '''
+        if isinstance(self.pixels, bytearray):
+            return bytes(self.pixels)
+        return self.pixels.tobytes()
+
+    def png(self):
+        ''' Image, encoded as a PNG file '''
+        data = self.rgb_bytes()
+        row_length = 3 * self.width
+        scanlines = b''.join(b'\x00' + data[offset:offset + row_length] # Filter type 0
+            for offset in range(0, len(data), row_length))
+
+        def chunk(chunk_type, chunk_data):
+            return struct.pack('>I', len(chunk_data)) + chunk_type + chunk_data +\
+                struct.pack('>I', zlib.crc32(chunk_type + chunk_data))
+
+        return b'\x89PNG\r\n\x1a\n' +\
+            chunk(b'IHDR', struct.pack('>IIBBBBB', self.width, self.height, 8, 2, 0, 0, 0)) +\
+            chunk(b'IDAT', zlib.compress(scanlines, 6)) + chunk(b'IEND', b'')
+
+    def save(self, filename):
+        ''' Write the image to a PNG file '''
+        with open(filename, 'wb') as png_file:
+            png_file.write(self.png())
+
+
+def render(preview_ref, ad_ref, size):
+    '''
+    Render the recorded moves of a preview_recorder.Preview object into a
+    Raster whose longer side is size pixels, following the rendering option
+    for pen-up and pen-down moves. Return the Raster.
+    '''
+    page_width, page_height = ad_ref.svg_width, ad_ref.svg_height
+    scale = size / max(page_width, page_height) # Pixels per inch
+    raster = Raster(max(round(page_width * scale), 1), max(round(page_height * scale), 1))
+
+    rendering = ad_ref.options.rendering
+    if rendering > 1:
+        x_page, y_page = preview_ref.trace_pu.page_coords(ad_ref)
+        raster.draw_trace(preview_ref.trace_pu, x_page, y_page, scale,
+            simplestyle.parseColor(ad_ref.params.preview_color_up))
+    if rendering in (1, 3):
+        x_page, y_page = preview_ref.trace_pd.page_coords(ad_ref)
+        raster.draw_trace(preview_ref.trace_pd, x_page, y_page, scale,
+            simplestyle.parseColor(ad_ref.params.preview_color_down))
+    return raster
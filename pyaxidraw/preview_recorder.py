@@ -0,0 +1,431 @@
+# coding=utf-8
+#
+# Copyright 2023 Windell H. Oskay, Evil Mad Scientist Laboratories
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+
+"""
+pyaxidraw/preview_recorder.py
+
+Array-backed recording of plot preview data.
+
+Preview and VelocityChart extend the classes of the same names in
+axidrawinternal.preview. Rather than formatting an SVG path data string
+for every simulated move, as it is made, the pen positions and velocities
+are recorded into typed arrays. Page rotation is applied and path data is
+formatted only once, when the preview is rendered; the rendered output is
+the same.
+
+With a vertex budget, the rendered preview is decimated to keep its size
+bounded: collinear moves are merged and subpaths smaller than 1/1000 of the
+page size are dropped. If a preview path is still over budget, moves are
+merged with a coarser tolerance, and then only its largest subpaths are kept.
+Velocity charts are downsampled to the budget.
+"""
+
+import math
+from array import array
+
+from lxml import etree
+
+from axidrawinternal import preview
+from pyaxidraw import preview_raster
+from axidrawinternal.plot_utils_import import from_dependency_import
+simpletransform = from_dependency_import('ink_extensions.simpletransform')
+simplestyle = from_dependency_import('ink_extensions.simplestyle')
+inkex = from_dependency_import('ink_extensions.inkex')
+
+
+def simplify(x_pos, y_pos, start, end, tolerance):
+    """
+    Indices of the vertices to keep, from the polyline of vertices
+    start through end - 1 of the x_pos and y_pos arrays, such that no
+    removed vertex is farther than tolerance from the simplified polyline.
+    Douglas-Peucker algorithm; the first and last vertices are always kept.
+    """
+    if end - start < 3:
+        return list(range(start, end))
+    keep = bytearray(end - start)
+    keep[0] = keep[-1] = 1
+    tol_squared = tolerance * tolerance
+    stack = [(start, end - 1)]
+    while stack:
+        first, last = stack.pop()
+        x_0, y_0 = x_pos[first], y_pos[first]
+        d_x, d_y = x_pos[last] - x_0, y_pos[last] - y_0
+        length_squared = d_x * d_x + d_y * d_y
+        farthest, max_dist = 0, tol_squared
+        for index_i in range(first + 1, last):
+            p_x, p_y = x_pos[index_i] - x_0, y_pos[index_i] - y_0
+            if length_squared == 0: # Closed loop: Distance from end point
+                dist = p_x * p_x + p_y * p_y
+            else: # Distance from the segment between first and last
+                t_val = min(max((p_x * d_x + p_y * d_y) / length_squared, 0), 1)
+                p_x -= t_val * d_x
+                p_y -= t_val * d_y
+                dist = p_x * p_x + p_y * p_y
+            if dist > max_dist:
+                farthest, max_dist = index_i, dist
+        if farthest:
+            keep[farthest - start] = 1
+            if farthest - first > 1:
+                stack.append((first, farthest))
+            if last - farthest > 1:
+                stack.append((farthest, last))
+    return [start + index_i for index_i, kept in enumerate(keep) if kept]
+
+
+class MoveTrace:
+    '''
+    Pen positions along a series of moves, stored as arrays of X and Y
+    coordinates, and the indices at which each new subpath begins.
+    '''
+
+    def __init__(self):
+        self.x_pos = array('d')
+        self.y_pos = array('d')
+        self.starts = array('L') # Index of the first vertex of each subpath
+
+    def clear(self):
+        ''' Remove all recorded moves '''
+        del self.x_pos[:]
+        del self.y_pos[:]
+        del self.starts[:]
+
+    def __len__(self):
+        return len(self.x_pos)
+
+    def move_to(self, x_pos, y_pos):
+        ''' Begin a new subpath at (x_pos, y_pos) '''
+        self.starts.append(len(self.x_pos))
+        self.x_pos.append(x_pos)
+        self.y_pos.append(y_pos)
+
+    def line_to(self, x_pos, y_pos):
+        ''' Extend the current subpath to (x_pos, y_pos) '''
+        self.x_pos.append(x_pos)
+        self.y_pos.append(y_pos)
+
+    def subpaths(self):
+        ''' Yield (start, end) index ranges of each subpath '''
+        count = len(self.starts)
+        for index_i in range(count):
+            end = self.starts[index_i + 1] if index_i + 1 < count else len(self.x_pos)
+            yield self.starts[index_i], end
+
+    def simplified(self, tolerance, min_extent):
+        """
+        New MoveTrace with collinear moves merged, to within tolerance, and without
+        subpaths whose extent is less than min_extent in both X and Y.
+        """
+        trace = MoveTrace()
+        x_pos, y_pos = self.x_pos, self.y_pos
+        for start, end in self.subpaths():
+            x_sub, y_sub = x_pos[start:end], y_pos[start:end]
+            if max(x_sub) - min(x_sub) < min_extent and max(y_sub) - min(y_sub) < min_extent:
+                continue # Sub-pixel subpath
+            kept = simplify(x_pos, y_pos, start, end, tolerance)
+            trace.move_to(x_pos[kept[0]], y_pos[kept[0]])
+            for index_i in kept[1:]:
+                trace.line_to(x_pos[index_i], y_pos[index_i])
+        return trace
+
+    def largest(self, budget):
+        """
+        New MoveTrace with the largest subpaths that fit within budget vertices, in
+        order. A subpath too large to fit is thinned, by keeping evenly spaced
+        vertices, to the number left, if there are at least two.
+        """
+        x_pos, y_pos = self.x_pos, self.y_pos
+        ranges = list(self.subpaths())
+        extents = [max(max(x_pos[start:end]) - min(x_pos[start:end]),
+            max(y_pos[start:end]) - min(y_pos[start:end])) for start, end in ranges]
+        selected = {} # Subpath index: number of vertices kept
+        for index_i in sorted(range(len(ranges)), key=extents.__getitem__, reverse=True):
+            start, end = ranges[index_i]
+            count = min(end - start, budget)
+            if count == end - start or count >= 2:
+                budget -= count
+                selected[index_i] = count
+        trace = MoveTrace()
+        for index_i in sorted(selected):
+            start, end = ranges[index_i]
+            count = selected[index_i]
+            if count < end - start: # Thinned; first and last vertices are kept
+                kept = [start + (end - start - 1) * step // (count - 1) for step in range(count)]
+            else:
+                kept = range(start, end)
+            trace.move_to(x_pos[kept[0]], y_pos[kept[0]])
+            for index_v in kept[1:]:
+                trace.line_to(x_pos[index_v], y_pos[index_v])
+        return trace
+
+    def decimated(self, tolerance, budget):
+        """
+        MoveTrace with at most budget (but at least two) vertices. Merge collinear
+        moves and drop subpaths smaller than tolerance. While over budget, merge
+        moves with up to 16 times that tolerance, and then keep only the largest
+        subpaths, thinning one if needed. Any moves give a non-empty trace.
+        """
+        budget = max(budget, 2)
+        trace = self.simplified(tolerance, tolerance)
+        coarse = tolerance
+        while len(trace) > budget and coarse < 16 * tolerance:
+            coarse *= 2
+            trace = trace.simplified(coarse, tolerance)
+        if not trace:
+            trace = self # All subpaths smaller than tolerance; keep the largest
+        if len(trace) > budget:
+            trace = trace.largest(budget)
+        return trace
+
+    def page_coords(self, ad_ref):
+        '''
+        X and Y coordinate arrays on the page, with any page rotation applied
+        (as in Preview.log_sm_move of axidrawinternal.preview)
+        '''
+        if not ad_ref.rotate_page:
+            return self.x_pos, self.y_pos
+        if ad_ref.params.auto_rotate_ccw: # Rotate counterclockwise 90 degrees
+            width = ad_ref.svg_width
+            return array('d', [width - y for y in self.y_pos]), self.x_pos
+        height = ad_ref.svg_height
+        return self.y_pos, array('d', [height - x for x in self.x_pos])
+
+    def path_data(self, ad_ref):
+        ''' SVG path data string for the recorded moves '''
+        x_page, y_page = self.page_coords(ad_ref)
+        line_to = ' {:0.3f} {:0.3f}'.format
+        path_data = []
+        for start, end in self.subpaths():
+            path_data.append(f'M{x_page[start]:0.3f} {y_page[start]:0.3f}')
+            path_data.extend(map(line_to, x_page[start + 1:end], y_page[start + 1:end]))
+        return " ".join(path_data)
+
+
+class VelocityChart(preview.VelocityChart):
+    """
+    Velocity chart data, recorded as arrays of times and chart values
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.chart_time = array('d')  # Time of each chart point, s
+        self.chart_1 = array('d')     # Chart values, Motor 1
+        self.chart_2 = array('d')     # Chart values, Motor 2
+        self.chart_tot = array('d')   # Chart values, Total V
+
+    def reset(self):
+        """ Clear data; reset for a new plot. """
+        super().reset()
+        del self.chart_time[:]
+        del self.chart_1[:]
+        del self.chart_2[:]
+        del self.chart_tot[:]
+
+    def rest(self, ad_ref, v_time):
+        """
+        Update velocity charts and plot time estimate with a zero-velocity segment for
+        given time duration; typically used after raising or lowering the pen.
+        """
+        if not ad_ref.options.preview:
+            return
+        ad_ref.plot_status.stats.pt_estimate += v_time
+        if not self.enable:
+            return
+        self.step(ad_ref, 0, 0, 0, v_time)
+
+    def update(self, ad_ref, v_1, v_2, v_tot):
+        """ Update velocity charts, using some appropriate scaling for X and Y display."""
+        if not (ad_ref.options.preview and self.enable):
+            return
+        scale_factor = 10.0 / ad_ref.options.resolution
+        self.chart_time.append(self.vel_data_time / 1000.0)
+        self.chart_1.append(8.5 - v_1 / scale_factor)
+        self.chart_2.append(8.5 - v_2 / scale_factor)
+        self.chart_tot.append(8.5 - v_tot / scale_factor)
+
+    def step(self, ad_ref, v_1, v_2, v_tot, duration):
+        """ Record constant velocities over a given duration (ms), as two chart points """
+        self.update(ad_ref, v_1, v_2, v_tot)
+        self.vel_data_time += duration
+        self.update(ad_ref, v_1, v_2, v_tot)
+
+    def path_data(self, values, budget=0):
+        """
+        SVG path data string for one chart: chart_1, chart_2 or chart_tot.
+        If budget is nonzero, the chart is downsampled to at most budget points,
+        keeping the minimum and maximum values within each of budget/2 intervals.
+        """
+        chart_time = self.chart_time
+        if not budget or len(values) <= budget:
+            kept = range(len(values))
+        else:
+            kept = []
+            intervals = max(budget // 2, 1)
+            for interval in range(intervals):
+                start = interval * len(values) // intervals
+                end = (interval + 1) * len(values) // intervals
+                span = values[start:end]
+                low = start + span.index(min(span))
+                high = start + span.index(max(span))
+                kept.extend(sorted({low, high}))
+        return " ".join(["M"] + [f' {chart_time[index_i]:0.3f} {values[index_i]:0.3f}'
+            for index_i in kept])
+
+
+class Preview(preview.Preview):
+    """
+    Preview: Main class for organizing preview and rendering, recording
+    preview moves into arrays.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.v_chart = VelocityChart()
+        self.trace_pu = MoveTrace()  # pen-up moves for preview layers
+        self.trace_pd = MoveTrace()  # pen-down moves for preview layers
+
+    def reset(self):
+        """ Clear all data; reset for a new plot. """
+        super().reset()
+        self.trace_pu.clear()
+        self.trace_pd.clear()
+
+    def log_sm_move(self, ad_ref, move):
+        """ Log data from single "SM" move for rendering that move in preview rendering """
+
+        rendering = ad_ref.options.rendering
+        if not rendering:
+            return
+
+        # 'SM' move is formatted as:
+        # ['SM', (move_steps2, move_steps1, move_time), seg_data]
+        # where seg_data begins with final x position, final y position.
+        if self.v_chart.enable:
+            move_steps2, move_steps1, move_time = move[1]
+            self.v_chart.step(ad_ref, move_steps1 / float(move_time),
+                move_steps2 / float(move_time),
+                math.sqrt(move_steps1 * move_steps1 + move_steps2 * move_steps2) /\
+                    float(move_time), move_time)
+
+        seg_data = move[2]
+        pen_status = ad_ref.pen.status
+        if ad_ref.pen.phys.z_up:
+            if rendering > 1: # Render pen-up movement
+                if pen_status.preview_pen_state != 1:
+                    self.trace_pu.move_to(ad_ref.pen.phys.xpos, ad_ref.pen.phys.ypos)
+                    pen_status.preview_pen_state = 1
+                self.trace_pu.line_to(seg_data[0], seg_data[1])
+        else:
+            if rendering in [1, 3]: # Render pen-down movement
+                if pen_status.preview_pen_state != 0:
+                    self.trace_pd.move_to(ad_ref.pen.phys.xpos, ad_ref.pen.phys.ypos)
+                    pen_status.preview_pen_state = 0
+                self.trace_pd.line_to(seg_data[0], seg_data[1])
+
+    def render(self, ad_ref):
+        """ Render preview layers in the SVG document """
+
+        if not ad_ref.options.preview:
+            return
+
+        # Remove old preview layers, whenever preview mode is enabled
+        for node in ad_ref.svg:
+            if node.tag in ('{http://www.w3.org/2000/svg}g', 'g'):
+                if node.get('{http://www.inkscape.org/namespaces/inkscape}groupmode') == 'layer':
+                    layer_name = node.get('{http://www.inkscape.org/namespaces/inkscape}label')
+                    if layer_name == '% Preview':
+                        ad_ref.svg.remove(node)
+
+        if ad_ref.preview_png: # Raster preview, directly from the recorded moves
+            preview_raster.render(self, ad_ref, ad_ref.preview_png_size).save(ad_ref.preview_png)
+
+        if ad_ref.options.rendering == 0: # If preview rendering is disabled
+            return
+
+        s_x, s_y, o_x, o_y = ad_ref.vb_stash
+
+        preview_transform = simpletransform.parseTransform(
+            f'translate({-o_x:.6E},{-o_y:.6E}) scale({1.0/s_x:.6E},{1.0/s_y:.6E})')
+        path_attrs = { 'transform': simpletransform.formatTransform(preview_transform)}
+        preview_layer = etree.Element(inkex.addNS('g', 'svg'),
+            path_attrs, nsmap=inkex.NSS)
+
+        preview_sl_u = etree.SubElement(preview_layer, inkex.addNS('g', 'svg'))
+        preview_sl_d = etree.SubElement(preview_layer, inkex.addNS('g', 'svg'))
+
+        preview_layer.set(inkex.addNS('groupmode', 'inkscape'), 'layer')
+        preview_layer.set(inkex.addNS('label', 'inkscape'), '% Preview')
+        preview_sl_d.set(inkex.addNS('groupmode', 'inkscape'), 'layer')
+        preview_sl_d.set(inkex.addNS('label', 'inkscape'), 'Pen-down movement')
+        preview_sl_u.set(inkex.addNS('groupmode', 'inkscape'), 'layer')
+        preview_sl_u.set(inkex.addNS('label', 'inkscape'), 'Pen-up movement')
+
+        ad_ref.svg.append(preview_layer)
+
+        # Preview stroke width: Lesser of 1/1000 of page width or height:
+        width_du = min(ad_ref.svg_width , ad_ref.svg_height) / 1000.0
+
+        # Stroke-width cannot accept scientific notation; use log10 of the width
+        #   to determine the precision needed.
+        log_ten = math.log10(width_du)
+        if log_ten > 0:  # For width_du > 1
+            width_string = f'{width_du:.3f}'
+        else:
+            prec = int(math.ceil(-log_ten) + 3)
+            width_string = f'{width_du:.{prec}f}'
+
+        p_style = {'stroke-width': width_string, 'fill': 'none',
+            'stroke-linejoin': 'round', 'stroke-linecap': 'round'}
+
+        # With a vertex budget, decimate paths; initial tolerance of 1/1000 page size
+        budget = ad_ref.preview_budget
+        trace_pu, trace_pd = self.trace_pu, self.trace_pd
+        if budget:
+            trace_pu = trace_pu.decimated(width_du, budget)
+            trace_pd = trace_pd.decimated(width_du, budget)
+
+        ns_prefix = "plot"
+        if ad_ref.options.rendering > 1 and trace_pu:
+            p_style.update({'stroke': ad_ref.params.preview_color_up})
+            path_attrs = {
+                'style': simplestyle.formatStyle(p_style),
+                'd': trace_pu.path_data(ad_ref),
+                inkex.addNS('desc', ns_prefix): "pen-up transit"}
+            etree.SubElement(preview_sl_u,
+                             inkex.addNS('path', 'svg '), path_attrs, nsmap=inkex.NSS)
+
+        if ad_ref.options.rendering in (1, 3) and trace_pd:
+            p_style.update({'stroke': ad_ref.params.preview_color_down})
+            path_attrs = {
+                'style': simplestyle.formatStyle(p_style),
+                'd': trace_pd.path_data(ad_ref),
+                inkex.addNS('desc', ns_prefix): "pen-down drawing"}
+            etree.SubElement(preview_sl_d,
+                             inkex.addNS('path', 'svg '), path_attrs, nsmap=inkex.NSS)
+
+        if self.v_chart.enable: # Preview enabled w/ velocity
+            for color, values, desc in (('black', self.v_chart.chart_tot, "Total V"),
+                    ('red', self.v_chart.chart_1, "Motor 1 V"),
+                    ('green', self.v_chart.chart_2, "Motor 2 V")):
+                p_style.update({'stroke': color})
+                path_attrs = {
+                    'style': simplestyle.formatStyle(p_style),
+                    'd': self.v_chart.path_data(values, budget),
+                    inkex.addNS('desc', ns_prefix): desc}
+                etree.SubElement(preview_layer,
+                                 inkex.addNS('path', 'svg '), path_attrs, nsmap=inkex.NSS)
@@ -0,0 +1,114 @@
+# coding=utf-8
+#
+# Copyright 2023 Windell H. Oskay, Evil Mad Scientist Laboratories
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+
+"""
+pyaxidraw/session.py
+
+Persistent USB connection for successive plot_run() calls, when the AxiDraw
+keep_open attribute is set.
+
+Ordinarily each plot_run() locates and opens the serial port, queries the
+firmware version, sends the full set of servo configuration commands and
+checks the motor resolution, and then closes the port at the end of the plot.
+For a stream of small jobs, that setup can take a large share of each job.
+
+A Session keeps the port open between plots, and remembers which servo and
+motor settings have already been sent through it, so that they are only sent
+again when changed. The port is checked with a single query before it is
+reused. If the USB link has been lost, a new connection is made instead.
+"""
+
+from axidrawinternal.plot_utils_import import from_dependency_import # plotink
+ebb_serial = from_dependency_import('plotink.ebb_serial')
+pen_handling = from_dependency_import('axidrawinternal.pen_handling')
+
+PLOT_MODES = ("plot", "layers", "res_plot") # Modes in which unchanged settings are skipped
+
+
+class Session:
+    '''Serial port kept open between plots, and the settings applied through it'''
+
+    def __init__(self):
+        self.port = None # Open serial port object, or None
+        self.request = None # Port option values (port, port_config) that it was opened for
+        self.fw_version = None
+        self.applied = {} # Settings sent through this port: Name -> value
+
+    def open(self, port, request, fw_version):
+        '''Keep a newly-opened port for later plots'''
+        self.port = port
+        self.request = request
+        self.fw_version = fw_version
+        self.applied = {}
+
+    def alive(self):
+        '''Check, with a single query, that the kept port still reaches the EBB'''
+        if self.port is None:
+            return False
+        try:
+            return bool(ebb_serial.query(self.port, 'V\r', False).strip())
+        except Exception: # pylint: disable=broad-except
+            return False # e.g., USB link lost
+
+    def reuse(self, request):
+        '''Return the kept port if it was opened for request and is still connected'''
+        if self.port is not None and self.request == request and self.alive():
+            return self.port
+        self.close() # Different port requested, or the link was lost
+        return None
+
+    def forget(self):
+        '''Drop the kept port, e.g., after it was closed elsewhere'''
+        self.port = None
+        self.request = None
+        self.applied = {}
+
+    def close(self):
+        '''Close the kept port, if any'''
+        if self.port is not None:
+            ebb_serial.closePort(self.port)
+        self.forget()
+
+
+def servo_settings(ad_ref, pen_pos_down):
+    '''Everything that servo_init() sends to the EBB, for detecting changes'''
+    params = ad_ref.params
+    return (ad_ref.options.penlift, ad_ref.options.pen_pos_up, pen_pos_down,
+        ad_ref.options.pen_rate_raise, ad_ref.options.pen_rate_lower,
+        params.servo_max, params.servo_min, params.servo_sweep_time, params.servo_pin,
+        params.nb_servo_max, params.nb_servo_min, params.nb_servo_sweep_time,
+        params.nb_servo_pin, params.use_b3_out, params.servo_timeout)
+
+
+class SessionPen(pen_handling.PenHandler):
+    '''Pen handler that skips re-initializing the servo with unchanged settings'''
+
+    def servo_init(self, ad_ref):
+        session = ad_ref.session
+        if session.port is None or ad_ref.plot_status.port is not session.port or\
+                ad_ref.options.preview:
+            super().servo_init(ad_ref)
+            return
+        self.heights.update(ad_ref) # Ensure heights and transit times are known
+        settings = servo_settings(ad_ref, self.heights.pen_pos_down)
+        if ad_ref.options.mode in PLOT_MODES and self.phys.z_up is not None and\
+                session.applied.get('servo') == settings:
+            return # Already sent through this port; pen state is known
+        super().servo_init(ad_ref)
+        session.applied['servo'] = settings
@@ -0,0 +1,126 @@
+# coding=utf-8
+#
+# Copyright 2023 Windell H. Oskay, Evil Mad Scientist Laboratories
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+
+"""
+pyaxidraw/stats_collector.py
+
+Per-layer and per-path breakdown of plot time, distance, and pen lifts.
+
+StatsCollector samples the document totals kept in PlotStats, and the pen
+lift counter, at the start of each layer and each path, and attributes the
+change since the previous sample to the layer or path that was then being
+plotted. The time and pen-up travel to reach a path, and any pen raise
+before it, are counted with that path. Time at the start of a layer, from
+layer delays and the like, is counted in a row for the layer itself, if
+nonzero. Layers and paths are identified by their DocDigest item_id.
+
+Motion after the last path, such as the return home, is not attributed to
+any row; row totals may therefore be less than the document totals.
+"""
+
+import collections
+
+PathStats = collections.namedtuple('PathStats', ['layer_id', 'layer_name', 'path_id',
+    'time_estimate', 'distance_pendown', 'distance_total', 'pen_lifts'])
+PathStats.__doc__ = '''
+Time (s), distances (m) and pen lifts of one path, or of the start of a layer
+if path_id is None. Units are as for the AxiDraw time_estimate, distance_pendown,
+distance_total, and pen_lifts attributes.
+'''
+
+
+class StatsCollector:
+    '''Breakdown of plot statistics by layer and by path, as a table of PathStats rows'''
+
+    def __init__(self):
+        self.rows = []      # PathStats rows, in plot order
+        self._layers = {}   # id() of LayerProperties: LayerItem
+        self._paths = {}    # id() of vertex list: PathItem
+        self._layer = None  # LayerItem being plotted
+        self._path = None   # PathItem being plotted
+        self._sample = None # Totals at start of current row
+
+    def begin(self, digest):
+        ''' Start collecting for a flat DocDigest that is about to be plotted '''
+        self._layers = {id(layer.props): layer for layer in digest.layers}
+        self._paths = {id(path.subpaths[0]): path for layer in digest.layers
+            for path in layer.paths if path.subpaths}
+
+    def end(self, ad_ref):
+        ''' Finish the last row, after the DocDigest has been plotted '''
+        self._finish_row(ad_ref)
+        self._layers, self._paths = {}, {}
+        self._layer = self._path = self._sample = None
+
+    def layer_start(self, ad_ref, layer_props):
+        ''' Start a new row, at the beginning of a layer '''
+        layer = self._layers.get(id(layer_props))
+        if layer is None:
+            return
+        self._finish_row(ad_ref)
+        self._layer, self._path = layer, None
+        self._sample = self._totals(ad_ref)
+
+    def path_start(self, ad_ref, vertex_list):
+        ''' Start a new row, at the beginning of a path '''
+        path = self._paths.get(id(vertex_list))
+        if path is None:
+            return
+        self._finish_row(ad_ref)
+        self._path = path
+        self._sample = self._totals(ad_ref)
+
+    @staticmethod
+    def _totals(ad_ref):
+        ''' Time (ms), pen-down and pen-up distances (inch) and pen lifts, to date '''
+        stats = ad_ref.plot_status.stats
+        return (stats.pt_estimate, stats.down_travel_tot + stats.down_travel_inch,
+            stats.up_travel_tot + stats.up_travel_inch, ad_ref.pen.status.lifts)
+
+    def _finish_row(self, ad_ref):
+        if self._sample is None or self._layer is None:
+            return
+        time_ms, down_inch, up_inch, lifts = (new - old for new, old in
+            zip(self._totals(ad_ref), self._sample))
+        if self._path is None and not (time_ms or down_inch or up_inch or lifts):
+            self._sample = None
+            return # Omit empty rows for layer starts
+        self.rows.append(PathStats(self._layer.item_id, self._layer.name,
+            None if self._path is None else self._path.item_id, time_ms / 1000.0,
+            0.0254 * down_inch, 0.0254 * (down_inch + up_inch), lifts))
+        self._sample = None
+
+    def layers(self):
+        '''
+        Totals of the rows for each layer, as PathStats rows with path_id None,
+        in plot order. Layers plotted more than once (e.g., on multiple copies)
+        are combined.
+        '''
+        totals = {}
+        for row in self.rows:
+            total = totals.get(row.layer_id)
+            if total is None:
+                totals[row.layer_id] = row._replace(path_id=None)
+            else:
+                totals[row.layer_id] = total._replace(
+                    time_estimate=total.time_estimate + row.time_estimate,
+                    distance_pendown=total.distance_pendown + row.distance_pendown,
+                    distance_total=total.distance_total + row.distance_total,
+                    pen_lifts=total.pen_lifts + row.pen_lifts)
+        return list(totals.values())
@@ -0,0 +1,310 @@
+# coding=utf-8
+#
+# Copyright 2023 Windell H. Oskay, Evil Mad Scientist Laboratories
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+"""
+pyaxidraw/svg_reorder.py
+
+Element-level SVG reordering, for the deprecated "reorder" mode.
+
+ReorderEffect extends axidraw_svg_reorder.ReorderEffect, replacing its
+greedy search -- which compares the pen position against every remaining
+element, for every element placed -- with nearest-neighbor lookups in the
+same plotink.spatial_grid index that plot_optimizations.reorder() uses.
+The SVG output, including the optional pen-up preview, is otherwise unchanged.
+
+First and last points of elements and groups are memoized, so that each
+path is parsed only once, and each group is only rescanned when its
+contents have been reordered or broken apart.
+"""
+
+import itertools
+import math
+
+from lxml import etree
+
+IDENTITY = [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]]
+NO_POINT = (False, (-1.0, -1.0))
+
+from axidrawinternal import axidraw_svg_reorder
+from axidrawinternal.plot_utils_import import from_dependency_import # plotink
+inkex = from_dependency_import('ink_extensions.inkex')
+simplestyle = from_dependency_import('ink_extensions.simplestyle')
+simplepath = from_dependency_import('ink_extensions.simplepath')
+simpletransform = from_dependency_import('ink_extensions.simpletransform')
+spatial_grid = from_dependency_import('plotink.spatial_grid')
+
+
+class ReorderEffect(axidraw_svg_reorder.ReorderEffect):
+    """
+    Inkscape effect extension.
+    Re-order the objects in the SVG document for faster plotting, using
+    a spatial index to find the nearest element at each step.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._reset_caches()
+
+    def _reset_caches(self):
+        self._transforms = {}   # transform attribute: parsed matrix
+        self._path_ends = {}    # (node, transform, matrix): first and last point results
+        self._group_points = {} # group node: {(transform, matrix, is_last): result}
+        self._ids = None        # id: element, for resolving <use> references
+
+    def effect(self):
+        self._reset_caches()
+        try:
+            super().effect()
+        finally:
+            self._reset_caches() # Release references to the document
+
+    def parse_svg(self, input_node, mat_current=None, parent_vis='visible'):
+        output = super().parse_svg(input_node, mat_current, parent_vis)
+        self._invalidate(input_node) # Contents have been reordered
+        return output
+
+    def group2NodeDict(self, group, mat_current=None):
+        # Transforms of the flattened nodes are modified, and they are moved out of the group.
+        nodes_in_group = super().group2NodeDict(group, mat_current)
+        for element in group.iter():
+            self._group_points.pop(element, None)
+        self._invalidate(group)
+        return nodes_in_group
+
+    def _invalidate(self, node):
+        '''Discard cached group points for a node whose contents changed, and its ancestors'''
+        for element in itertools.chain((node,), node.iterancestors()):
+            self._group_points.pop(element, None)
+
+    def _compose(self, mat_current, node):
+        '''Compose the matrix mat_current with the transform attribute of node'''
+        transform = node.get("transform")
+        matrix = self._transforms.get(transform)
+        if matrix is None:
+            matrix = self._transforms[transform] = simpletransform.parseTransform(transform)
+        return simpletransform.composeTransform(mat_current, matrix)
+
+    def getFirstPoint(self, node, matCurrent):
+        """
+        Input: (non-group) node and parent transformation matrix
+        Output: Boolean value to indicate if the svg element is plottable and
+            two floats stored in a list representing the x and y coordinates we plot first
+        """
+        return self._end_point(node, matCurrent, False)
+
+    def getLastPoint(self, node, matCurrent):
+        """
+        Input: XML tree node and transformation matrix
+        Output: Boolean value to indicate if the svg element is plottable or not and
+                two floats stored in a list representing the x and y coordinates we plot last
+        """
+        return self._end_point(node, matCurrent, True)
+
+    def _end_point(self, node, mat_current, is_last):
+        if node.tag == inkex.addNS('path', 'svg'):
+            key = (node, node.get("transform"), matrix_key(mat_current))
+            ends = self._path_ends.get(key)
+            if ends is None:
+                ends = self._path_ends[key] = self._path_end_points(node, mat_current)
+            plottable, point = ends[is_last]
+            return plottable, list(point)
+        if node.tag in (inkex.addNS('use', 'svg'), 'use'):
+            return self._use_point(node, mat_current, is_last)
+        if is_last:
+            return super().getLastPoint(node, mat_current)
+        return super().getFirstPoint(node, mat_current)
+
+    def _path_end_points(self, node, mat_current):
+        '''
+        First and last point results for a path element, from a single parse
+        of its path data; as plot_utils.pathdata_first_point and pathdata_last_point.
+        '''
+        try:
+            mat_new = self._compose(mat_current, node)
+            parsed_path = simplepath.parsePath2(node.get('d'))
+        except Exception: # pylint: disable=broad-except
+            return NO_POINT, NO_POINT
+
+        first = NO_POINT
+        for command, params in parsed_path:
+            if command == 'M':
+                first = (True, (params[0], params[1]))
+                break
+
+        last = NO_POINT
+        if parsed_path:
+            command, params = parsed_path[-1]
+            if command.upper() != 'Z':
+                last = (True, (params[-2], params[-1]))
+            else: # Z returns to the start of the last subpath
+                for command, params in reversed(parsed_path[:-1]):
+                    if command == 'M':
+                        last = (True, (params[0], params[1]))
+                        break
+
+        ends = []
+        for plottable, point in (first, last):
+            if plottable:
+                point = list(point)
+                simpletransform.applyTransformToPoint(mat_new, point)
+            ends.append((plottable, tuple(point)))
+        return tuple(ends)
+
+    def _use_point(self, node, mat_current, is_last):
+        '''
+        First or last point of the element referenced by a <use> element,
+        found through an id lookup rather than a search of the document.
+        '''
+        try:
+            mat_new = self._compose(mat_current, node)
+            refid = node.get(inkex.addNS('href', 'xlink'))
+            if refid is None:
+                return False, list(NO_POINT[1])
+            refnode = self._find_id(node, refid[1:])
+            if refnode is None:
+                return False, list(NO_POINT[1])
+            x = float(node.get('x', '0'))
+            y = float(node.get('y', '0'))
+            if x != 0 or y != 0:
+                mat_new = simpletransform.composeTransform(mat_new, simpletransform.parseTransform(
+                    'translate({0:f},{1:f})'.format(x, y)))
+            if is_last:
+                return self.group_last_pt(refnode, mat_new)
+            return self.group_first_pt(refnode, mat_new)
+        except Exception: # pylint: disable=broad-except
+            return False, list(NO_POINT[1])
+
+    def _find_id(self, node, element_id):
+        '''The first element in document order with the given id, or None'''
+        root = node.getroottree().getroot()
+        if self._ids is None:
+            self._ids = {}
+            for element in root.iter():
+                self._ids.setdefault(element.get('id'), element)
+        element = self._ids.get(element_id)
+        if element is not None and element.getroottree().getroot() is root:
+            return element
+        # Not indexed, or removed from the document since; search the document.
+        found = root.xpath('//*[@id="{0}"]'.format(element_id))
+        return found[0] if found else None
+
+    def group_first_pt(self, group, matCurrent=IDENTITY):
+        """
+            Input: A Node which we have found to be a group
+            Output: Boolean value to indicate if a point is plottable
+                    float values for first x,y coordinates of svg element
+        """
+        return self._group_point(group, matCurrent, False)
+
+    def group_last_pt(self, group, matCurrent=IDENTITY):
+        """
+        Input: A Node which we have found to be a group
+        Output: The last node within the group which can be plotted
+        """
+        return self._group_point(group, matCurrent, True)
+
+    def _group_point(self, group, mat_current, is_last):
+        if len(group) == 0: # Empty group -- The object may not be a group.
+            return self._end_point(group, mat_current, is_last)
+        key = (group.get("transform"), matrix_key(mat_current), is_last)
+        entries = self._group_points.setdefault(group, {})
+        result = entries.get(key)
+        if result is None:
+            if is_last:
+                plottable, point = super().group_last_pt(group, mat_current)
+            else:
+                plottable, point = super().group_first_pt(group, mat_current)
+            result = entries[key] = (plottable, tuple(point))
+        return result[0], list(result[1])
+
+    def ReorderNodeList(self, coord_dict, group_dict):
+        '''
+        Re-order the given set of SVG elements with the greedy algorithm:
+        Starting at the current pen position, repeatedly choose the element
+        whose first point is nearest to the last point of the previous choice.
+
+        Non-plottable elements are placed as in the original implementation;
+        each is output as soon as the element chosen next would otherwise be
+        one that precedes it in the input.
+        '''
+        keys = list(group_dict)
+        idle = []         # Input positions of non-plottable elements
+        plottable = []    # Input positions of plottable elements
+        endpoints = []    # [first_point, last_point] for each plottable element
+        for position, key in enumerate(keys):
+            coords = coord_dict[key]
+            if coords[0]:
+                plottable.append(position)
+                endpoints.append([[coords[1], coords[2]], [coords[3], coords[4]]])
+            else:
+                idle.append(position)
+
+        grid_index = None
+        if len(endpoints) > 1:
+            x_values = [vertex[0] for pair in endpoints for vertex in pair]
+            y_values = [vertex[1] for pair in endpoints for vertex in pair]
+            if max(x_values) > min(x_values) or max(y_values) > min(y_values):
+                grid_bins = 4 + math.floor(math.sqrt(len(endpoints) / 50))
+                grid_index = spatial_grid.Index(endpoints, grid_bins, False)
+        # Without an index (zero or one element, or all ends coincident), every
+        #   remaining element is equally near; take them last-first, as before.
+        remaining = list(range(len(endpoints)))
+        remaining_count = len(endpoints)
+
+        ordered_layer_element_list = []
+        while remaining_count or idle:
+            nearest_index = None
+            if remaining_count:
+                if grid_index is None:
+                    nearest_index = remaining.pop()
+                else:
+                    nearest_index = grid_index.nearest([self.x_last, self.y_last])
+
+            if idle and (nearest_index is None or idle[-1] > plottable[nearest_index]):
+                if nearest_index is not None and grid_index is None:
+                    remaining.append(nearest_index) # Not chosen this time
+                ordered_layer_element_list.append(group_dict[keys[idle.pop()]])
+                continue
+
+            if grid_index is not None:
+                grid_index.remove_path(nearest_index)
+            remaining_count -= 1
+
+            [[start_x, start_y], [end_x, end_y]] = endpoints[nearest_index]
+            if self.preview_rendering:
+                # Draw line indicating that we've found a new point.
+                preview_path = []    # pen-up path data for preview
+                preview_path.append("M{0:.3f} {1:.3f}".format(self.x_last, self.y_last))
+                preview_path.append("{0:.3f} {1:.3f}".format(start_x, start_y))
+                self.p_style.update({'stroke': self.color_index(self.layer_index)})
+                path_attrs = {
+                    'style': simplestyle.formatStyle( self.p_style ),
+                    'd': " ".join(preview_path)}
+                etree.SubElement( self.preview_layer,
+                    inkex.addNS( 'path', 'svg '), path_attrs, nsmap=inkex.NSS )
+
+            self.x_last = end_x
+            self.y_last = end_y
+            ordered_layer_element_list.append(group_dict[keys[plottable[nearest_index]]])
+
+        return ordered_layer_element_list
+
+
+def matrix_key(matrix):
+    '''Hashable form of a 2x3 transform matrix'''
+    return tuple(matrix[0]) + tuple(matrix[1])
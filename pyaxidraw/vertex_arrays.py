@@ -0,0 +1,84 @@
+# coding=utf-8
+#
+# Copyright 2023 Windell H. Oskay, Evil Mad Scientist Laboratories
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+
+"""
+pyaxidraw/vertex_arrays.py
+
+Vertex input from arrays, for draw_path() and draw_paths().
+
+Vertex lists may be given as lists of [x, y] pairs, as NumPy arrays of
+shape (N, 2), or as flat buffers of alternating x and y values, such as
+array.array('d'). Array input is scaled and converted to the [x, y] lists
+used by the motion planner in a single step, with array operations where
+NumPy is available, rather than vertex by vertex. The caller's data is
+never modified.
+"""
+
+import array
+
+try:
+    import numpy
+except ImportError: # NumPy is optional
+    numpy = None
+
+
+def is_array(data):
+    '''True if data is a NumPy array or a buffer (e.g., array.array), not a list'''
+    if numpy is not None and isinstance(data, numpy.ndarray):
+        return True
+    return isinstance(data, (array.array, memoryview))
+
+
+def to_vertex_list(data, scale=1.0):
+    '''
+    List of [x, y] vertices from an (N, 2) NumPy array, a flat buffer of
+    x, y values, or a sequence of pairs, with coordinates multiplied by scale.
+    Lists are returned as-is if scale is 1.
+    '''
+    if not is_array(data):
+        if scale == 1:
+            return data
+        return [[vertex[0] * scale, vertex[1] * scale] for vertex in data]
+    if numpy is not None:
+        values = numpy.asarray(data, dtype=float).reshape(-1, 2)
+        if scale != 1:
+            values = values * scale
+        return values.tolist()
+    values = memoryview(data)
+    if values.ndim != 1:
+        values = values.cast('B').cast(values.format) # Flatten C-contiguous buffer
+    x_values, y_values = values[0::2].tolist(), values[1::2].tolist()
+    if scale == 1:
+        return [list(vertex) for vertex in zip(x_values, y_values)]
+    return [[x_value * scale, y_value * scale] for x_value, y_value in zip(x_values, y_values)]
+
+
+def clamp(vertex_list, x_max, y_max):
+    '''
+    Limit vertices to 0 <= x <= x_max, 0 <= y <= y_max, in place, as in
+    AxiDraw.plot_polyline(). A single bounds check passes most lists unchanged.
+    '''
+    x_values = [vertex[0] for vertex in vertex_list]
+    y_values = [vertex[1] for vertex in vertex_list]
+    if min(x_values) >= 0 and min(y_values) >= 0 and\
+            max(x_values) <= x_max and max(y_values) <= y_max:
+        return
+    for vertex, x_value, y_value in zip(vertex_list, x_values, y_values):
+        vertex[0] = min(max(x_value, 0), x_max)
+        vertex[1] = min(max(y_value, 0), y_max)
@@ -0,0 +1,113 @@
+import asyncio
+import copy
+import unittest
+
+from pyaxidraw import async_axidraw
+
+# python -m unittest discover in top-level package dir
+
+LINES_SVG = """<svg xmlns="http://www.w3.org/2000/svg" width="8in" height="6in" viewBox="0 0 8 6">
+{0}
+</svg>"""
+
+def many_lines(count):
+    ''' SVG of count short zigzag paths '''
+    paths = [f'<path d="M {1 + (index_i % 60) * 0.1} {1 + index_i // 60 * 0.1} l 0.05 0.05 '
+        f'l 0.05 -0.05" fill="none" stroke="black"/>' for index_i in range(count)]
+    return LINES_SVG.format("\n".join(paths))
+
+async def preview_unit():
+    ''' AsyncAxiDraw in interactive context, "connected" in preview mode '''
+    unit = async_axidraw.AsyncAxiDraw()
+    unit.interactive()
+
+    def fake_connect(ad):
+        ad.options.preview = True # Feed motion to the preview rather than over USB
+        ad.plot_status.port = 'preview'
+        ad.connected = True
+        ad.update_options()
+        ad.pen.turtle = copy.copy(ad.pen.phys)
+        ad.pen.turtle.z_up = True
+        ad.pen.servo_init(ad)
+        ad.enable_motors()
+    await unit.run(fake_connect, unit.ad)
+    return unit
+
+
+class AsyncAxiDrawTestCase(unittest.TestCase):
+
+    def test_plot_run(self):
+        """ plot_run previews a document without blocking the event loop """
+        async def main():
+            async with async_axidraw.AsyncAxiDraw() as unit:
+                await unit.plot_setup(many_lines(10))
+                unit.options.preview = True
+                ticks = 0
+                task = asyncio.ensure_future(unit.plot_run(True))
+                while not task.done():
+                    ticks += 1
+                    await asyncio.sleep(0)
+                return unit, await task, ticks
+        unit, output, ticks = asyncio.run(main())
+        self.assertIn('<svg', output)
+        self.assertGreater(unit.ad.time_estimate, 0)
+        self.assertGreater(ticks, 1)
+
+    def test_many_units(self):
+        """ one event loop drives several units in interactive context at once """
+        async def draw(unit, offset):
+            await unit.moveto(1 + offset, 1)
+            for index_i in range(20):
+                await unit.lineto(1 + offset + index_i * 0.05, 1 + (index_i % 2) * 0.1)
+            await unit.penup()
+            await unit.block()
+            return await unit.current_pos()
+
+        async def main():
+            units = [await preview_unit() for _ in range(3)]
+            positions = await asyncio.gather(*(draw(unit, offset)
+                for offset, unit in enumerate(units)))
+            for unit in units:
+                await unit.close()
+            return positions
+        positions = asyncio.run(main())
+        for offset, (x_pos, y_pos) in enumerate(positions):
+            self.assertAlmostEqual(x_pos, 1 + offset + 0.95, places=3)
+            self.assertAlmostEqual(y_pos, 1.1, places=3)
+
+    def test_error_then_success(self):
+        """ an awaited call that fails does not make the next call fail """
+        async def main():
+            unit = await preview_unit()
+            await unit.moveto(1, 1)
+            unit.ad.connected = False # Commands now raise RuntimeError
+            with self.assertRaises(RuntimeError):
+                await unit.move(1, 0)
+            unit.ad.connected = True
+            await unit.move(1, 0)
+            await unit.block()
+            position = await unit.current_pos()
+            await unit.close()
+            return position
+        x_pos, y_pos = asyncio.run(main())
+        self.assertAlmostEqual(x_pos, 2, places=3)
+        self.assertAlmostEqual(y_pos, 1, places=3)
+
+    def test_cancel_pauses(self):
+        """ cancelling plot_run pauses the plot through the software pause event """
+        async def main():
+            unit = async_axidraw.AsyncAxiDraw()
+            await unit.plot_setup(many_lines(2000))
+            unit.options.preview = True
+            unit.options.reordering = 4
+            task = asyncio.ensure_future(unit.plot_run())
+            while unit.ad.plot_status.stats.down_travel_inch == 0:
+                await asyncio.sleep(0.01) # Wait until plotting has begun
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            await unit.close()
+            return unit
+        unit = asyncio.run(main())
+        self.assertEqual(unit.errors.code, 103)
+        self.assertFalse(unit.commands.thread.is_alive())
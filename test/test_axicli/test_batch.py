@@ -0,0 +1,81 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from mock import patch
+
+from axicli import batch
+from pyaxidraw import axidraw
+
+# python -m unittest discover in top-level package dir
+
+SVG = """<svg xmlns="http://www.w3.org/2000/svg" width="8in" height="6in" viewBox="0 0 8 6">
+<path d="M 1 1 L {0} 1 L {0} 5 Z" fill="none" stroke="black"/>
+</svg>"""
+
+
+class BatchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.temp_dir, 'sub'))
+        self.svg_files = []
+        for index_i, name in enumerate(['a.svg', 'b.svg', os.path.join('sub', 'c.SVG')]):
+            self.svg_files.append(os.path.join(self.temp_dir, name))
+            with open(self.svg_files[-1], 'w', encoding='utf8') as svg_file:
+                svg_file.write(SVG.format(3 + index_i))
+        with open(os.path.join(self.temp_dir, 'notes.txt'), 'w', encoding='utf8') as text_file:
+            text_file.write('not an SVG')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def expected(self, svg_file):
+        ''' results of a single preview of svg_file '''
+        ad = axidraw.AxiDraw()
+        ad.plot_setup(svg_file)
+        ad.options.preview = True
+        ad.plot_run()
+        return ad
+
+    def test_find_svgs(self):
+        """ directories are searched for SVG files """
+        self.assertEqual([str(path) for path in batch.find_svgs([self.temp_dir])],
+            self.svg_files)
+
+    def test_results(self):
+        """ in-process and pooled results match individual previews """
+        for jobs in (0, 2):
+            with self.subTest(jobs=jobs):
+                results = list(batch.run_batch(self.svg_files, jobs=jobs))
+                self.assertEqual(sorted(result['file'] for result in results), self.svg_files)
+                for result in results:
+                    ad = self.expected(result['file'])
+                    self.assertAlmostEqual(result['time_estimate'], ad.time_estimate, places=3)
+                    self.assertAlmostEqual(result['distance_pendown'], ad.distance_pendown,
+                        places=4)
+                    self.assertAlmostEqual(result['distance_total'], ad.distance_total, places=4)
+                    self.assertEqual(result['pen_lifts'], ad.pen_lifts)
+                    self.assertEqual(result['warnings'], [])
+
+    def test_errors(self):
+        """ a file that cannot be read gives an error result, and later files still run """
+        bad_file = os.path.join(self.temp_dir, 'notes.txt')
+        results = list(batch.run_batch([bad_file, self.svg_files[0]], jobs=0))
+        self.assertIn('error', results[0])
+        self.assertNotIn('error', results[1])
+
+    def test_cli(self):
+        """ command line writes one JSON line per file """
+        out_file = os.path.join(self.temp_dir, 'out.jsonl')
+        with patch.object(sys, 'argv', ['axibatch', self.temp_dir, '-j', '0', '-F', '-o', out_file]):
+            with self.assertRaises(SystemExit) as context:
+                batch.batch_CLI()
+        self.assertEqual(context.exception.code, 0)
+        with open(out_file, encoding='utf8') as result_file:
+            results = [json.loads(line) for line in result_file]
+        self.assertEqual([result['file'] for result in results], self.svg_files)
+        self.assertTrue(all(result['time_estimate'] > 0 for result in results))
@@ -0,0 +1,75 @@
+import copy
+import math
+import unittest
+
+from pyaxidraw import axidraw
+
+# python -m unittest discover in top-level package dir
+
+def interactive_preview(buffered):
+    ''' AxiDraw in interactive context, "connected" in preview mode, pen up at (3, 2) '''
+    ad = axidraw.AxiDraw()
+    ad.interactive()
+    ad.options.preview = True # Feed motion to the preview rather than over USB
+    ad.plot_status.port = 'preview'
+    ad.connected = True
+    ad.update_options()
+    ad.pen.turtle = copy.copy(ad.pen.phys)
+    ad.pen.turtle.z_up = True
+    ad.pen.servo_init(ad)
+    ad.enable_motors()
+    ad.buffered_motion = buffered
+    ad.moveto(3, 2)
+    return ad
+
+def draw_circle(ad, count=100):
+    ''' circle of radius 1 inch about (3, 2), drawn with lineto calls '''
+    for index_i in range(count + 1):
+        angle = 2 * math.pi * index_i / count
+        ad.lineto(3 + math.cos(angle), 2 + math.sin(angle))
+
+
+class BufferedMotionTestCase(unittest.TestCase):
+
+    def test_faster_same_path(self):
+        """ buffered lineto sequences take less time and end at the same place """
+        results = []
+        for buffered in (False, True):
+            ad = interactive_preview(buffered)
+            draw_circle(ad)
+            ad.penup()
+            results.append((ad.plot_status.stats.pt_estimate, ad.current_pos(),
+                ad.plot_status.stats.down_travel_inch))
+        (time_plain, pos_plain, dist_plain), (time_buffered, pos_buffered, dist_buffered) =\
+            results
+        self.assertLess(time_buffered, time_plain / 2)
+        for value_a, value_b in zip(pos_plain, pos_buffered):
+            self.assertAlmostEqual(value_a, value_b, places=6)
+        self.assertAlmostEqual(dist_plain, dist_buffered, places=2)
+
+    def test_flush(self):
+        """ queued moves are plotted on pen state change and at the look-ahead limit """
+        ad = interactive_preview(True)
+        ad.lineto(4, 2)
+        ad.lineto(4, 3)
+        self.assertAlmostEqual(ad.pen.phys.xpos, 3) # Still queued
+        self.assertAlmostEqual(ad.pen.phys.ypos, 2)
+        self.assertEqual(ad.turtle_pos(), (4, 3))
+        ad.penup()
+        self.assertAlmostEqual(ad.pen.phys.xpos, 4)
+        self.assertAlmostEqual(ad.pen.phys.ypos, 3)
+        self.assertTrue(ad.pen.phys.z_up)
+
+        ad.lookahead = 10
+        draw_circle(ad, 25)
+        self.assertLessEqual(len(ad._motion_buffer), 11)
+        self.assertGreater(math.dist((ad.pen.phys.xpos, ad.pen.phys.ypos), (4, 3)), 0.1)
+
+    def test_clipped_not_buffered(self):
+        """ segments clipped at travel bounds are plotted as usual """
+        ad = interactive_preview(True)
+        ad.lineto(4, 2)
+        ad.lineto(-1, 2) # Clipped at the travel limit
+        self.assertEqual(ad._motion_buffer, [])
+        self.assertAlmostEqual(ad.pen.phys.xpos, 0)
+        self.assertEqual(ad.turtle_pos(), (-1, 2))
@@ -0,0 +1,130 @@
+import concurrent.futures
+import threading
+import time
+import unittest
+
+from mock import patch
+
+from test.test_axicli.test_buffered_motion import draw_circle, interactive_preview
+
+from pyaxidraw import command_queue
+
+# python -m unittest discover in top-level package dir
+
+
+class CommandQueueTestCase(unittest.TestCase):
+
+    def test_order_and_results(self):
+        """ calls run in order on the background thread, and futures give their results """
+        commands = command_queue.CommandQueue(maxsize=2)
+        gate = threading.Event()
+        calls = []
+        first = commands.submit(gate.wait)
+        futures = [commands.submit(calls.append, index) for index in range(2)]
+        self.assertFalse(first.done()) # Caller was not blocked by the waiting call
+        gate.set()
+        self.assertEqual(commands.call(lambda: threading.current_thread()), commands.thread)
+        self.assertEqual(calls, [0, 1])
+        self.assertTrue(all(future.done() for future in futures))
+        commands.close()
+        self.assertFalse(commands.thread.is_alive())
+
+    def test_error_propagation(self):
+        """ a failed call cancels later calls, and its error is raised once in the caller """
+        commands = command_queue.CommandQueue()
+        gate = threading.Event()
+        commands.submit(gate.wait)
+        failing = commands.submit(lambda: 1 / 0)
+        skipped = commands.submit(lambda: 'skipped')
+        gate.set()
+        with self.assertRaises(ZeroDivisionError):
+            commands.join()
+        self.assertIsInstance(failing.exception(), ZeroDivisionError)
+        self.assertTrue(skipped.cancelled())
+        self.assertEqual(commands.call(lambda: 'ok'), 'ok') # Error reported only once
+        with self.assertRaises(ZeroDivisionError):
+            commands.call(lambda: 1 / 0)
+        commands.submit(lambda: None).result() # Reported by call(); not raised again
+        commands.close()
+
+    def test_error_reported_once(self):
+        """ an error delivered through its call's Future is not raised by later calls """
+        commands = command_queue.CommandQueue()
+        failing = commands.submit(lambda: 1 / 0)
+        with self.assertRaises(ZeroDivisionError):
+            failing.result()
+        self.assertEqual(commands.submit(lambda: 'ok').result(), 'ok')
+        with self.assertRaises(ZeroDivisionError):
+            commands.call(lambda: 1 / 0)
+        self.assertEqual(commands.call(lambda: 'ok'), 'ok')
+        commands.join()
+        commands.close()
+
+    def test_unobserved_error(self):
+        """ an error not retrieved from its Future is raised once by the next call """
+        commands = command_queue.CommandQueue()
+        failing = commands.submit(lambda: 1 / 0)
+        while not failing.done():
+            time.sleep(0.01)
+        with self.assertRaises(ZeroDivisionError):
+            commands.call(lambda: 'not run')
+        self.assertEqual(commands.call(lambda: 'ok'), 'ok')
+        commands.submit(lambda: 1 / 0)
+        with self.assertRaises(ZeroDivisionError):
+            commands.join()
+        commands.join()
+        commands.close()
+
+    def test_async_interactive(self):
+        """ interactive commands queued to the command thread give the same result """
+        results = []
+        for async_commands in (False, True):
+            ad = interactive_preview(False)
+            ad.async_commands = async_commands
+            draw_circle(ad, 50)
+            future = ad.penup()
+            ad.block()
+            if async_commands:
+                self.assertIsInstance(future, concurrent.futures.Future)
+                self.assertTrue(future.done())
+            results.append((ad.current_pos(), ad.turtle_pen(),
+                ad.plot_status.stats.pt_estimate))
+            ad.plot_status.port = None # Not a real port; do not close it
+            ad.disconnect()
+            self.assertIsNone(ad._command_queue)
+        self.assertEqual(results[0], results[1])
+
+    def test_disconnect_flushes(self):
+        """ disconnect plots buffered motion on the command thread before closing the port """
+        ad = interactive_preview(True)
+        ad.async_commands = True
+        ad.lineto(4, 3)
+        ad.lineto(5, 2)
+        commands = ad._command_queue
+        flushed = []
+        def close_port(port):
+            flushed.append((ad._motion_buffer, round(ad.pen.phys.xpos, 3),
+                round(ad.pen.phys.ypos, 3)))
+        with patch('axidrawinternal.axidraw.ebb_serial.closePort', close_port):
+            ad.disconnect()
+        self.assertEqual(flushed, [([], 5, 2)])
+        self.assertFalse(commands.thread.is_alive())
+        self.assertIsNone(ad._command_queue)
+        self.assertEqual([thread.name for thread in threading.enumerate()
+            if thread.name == 'axidraw-commands'], [])
+
+    def test_async_error(self):
+        """ errors raised on the command thread are raised by the next command """
+        ad = interactive_preview(False)
+        ad.async_commands = True
+        ad.connected = False # Commands now raise RuntimeError
+        future = ad.lineto(4, 3)
+        with self.assertRaises(RuntimeError):
+            future.result()
+        pending = ad.lineto(4, 3) # Result not retrieved; its error is raised by the next query
+        while not pending.done():
+            time.sleep(0.01)
+        with self.assertRaises(RuntimeError):
+            ad.turtle_pos()
+        ad.turtle_pos() # Reported once
+        ad._command_queue.close()
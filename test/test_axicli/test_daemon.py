@@ -0,0 +1,110 @@
+import argparse
+import io
+import os
+import tempfile
+import threading
+import unittest
+from contextlib import redirect_stdout
+
+from mock import patch
+
+from axicli import daemon
+
+# python -m unittest discover in top-level package dir
+
+LINE_SVG = """<svg xmlns="http://www.w3.org/2000/svg" width="4in" height="3in" viewBox="0 0 4 3">
+<path d="M 1 1 L 3 2" fill="none" stroke="black" stroke-width="0.01"/>
+</svg>"""
+
+
+class DaemonTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self.temp_dir.name, 'axidraw.sock')
+        self.plot_server = daemon.PlotServer()
+        self.server = daemon.DaemonServer(self.socket_path, self.plot_server)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        daemon.send_request({'command': 'shutdown'}, self.socket_path)
+        self.thread.join()
+        self.server.server_close()
+        self.temp_dir.cleanup()
+
+    def test_preview(self):
+        """ preview over the socket returns estimates, and reuses the AxiDraw instance """
+        for _ in range(2):
+            result = daemon.send_request({'command': 'preview', 'svg': LINE_SVG,
+                'options': {'report_time': True}}, self.socket_path)
+            self.assertEqual(result['error_code'], 0)
+            self.assertGreater(result['time_estimate'], 0)
+            self.assertAlmostEqual(result['distance_pendown'], 0.0254 * 5 ** 0.5, places=3)
+        self.assertEqual(len(self.plot_server.units), 1)
+        status = daemon.send_request({'command': 'status'}, self.socket_path)
+        self.assertEqual(status['jobs'], 2)
+        self.assertEqual(status['open_ports'], [])
+
+    def test_port_kept_open(self):
+        """ the serial port is opened once, and passed to each job """
+        port = object()
+        with patch.object(daemon.PlotServer, 'open_port', return_value=port) as open_port,\
+                patch('pyaxidraw.axidraw.AxiDraw.plot_run') as plot_run:
+            for command in ('toggle', 'plot'):
+                result = daemon.send_request({'command': command, 'svg': LINE_SVG},
+                    self.socket_path)
+                self.assertEqual(result['error_code'], 0)
+        open_port.assert_called_once_with('')
+        self.assertEqual(plot_run.call_count, 2)
+        self.assertIs(self.plot_server.units[''].ad.options.port, port)
+        status = daemon.send_request({'command': 'status'}, self.socket_path)
+        self.assertEqual(status['open_ports'], [''])
+        self.plot_server.units[''].port = None # Not a real port; do not close it
+
+    def test_errors(self):
+        """ bad requests and failed connections give results with error codes """
+        result = daemon.send_request({'command': 'walk'}, self.socket_path)
+        self.assertEqual(result['error_code'], -1)
+        self.assertIn('manual_cmd', result['error'])
+        result = daemon.send_request({'command': 'align'}, self.socket_path)
+        self.assertEqual(result['error_code'], -1)
+        events = []
+        with patch.object(daemon.PlotServer, 'open_port', return_value=None):
+            result = daemon.send_request({'command': 'toggle', 'options': {'port': 'unit1'}},
+                self.socket_path, events.append)
+        self.assertEqual(result['error_code'], 101)
+        self.assertEqual(events, [{'event': 'message',
+            'text': 'Failed to connect to AxiDraw unit1'}])
+
+    def test_socket_in_use(self):
+        """ a second daemon does not take the socket of a running one; a stale socket is reused """
+        with self.assertRaises(RuntimeError):
+            daemon.DaemonServer(self.socket_path, daemon.PlotServer())
+        self.assertEqual(daemon.send_request({'command': 'status'}, self.socket_path)['event'],
+            'result')
+
+        stale_path = os.path.join(self.temp_dir.name, 'stale.sock')
+        stale = daemon.DaemonServer(stale_path, daemon.PlotServer())
+        stale.socket.close() # Exited without removing its socket file
+        self.assertTrue(os.path.exists(stale_path))
+        server = daemon.DaemonServer(stale_path, daemon.PlotServer())
+        server.server_close()
+
+    def test_client(self):
+        """ axicli arguments are sent to the daemon as a job """
+        with tempfile.NamedTemporaryFile('w', suffix='.svg', delete=False) as svg_file:
+            svg_file.write(LINE_SVG)
+        args = argparse.Namespace(svg_in=svg_file.name, config=None, mode=None,
+            preview='True', manual_cmd=None, output_file=None, progress=None,
+            speed_pendown=50, report_time='True')
+        output = io.StringIO()
+        with redirect_stdout(output):
+            exit_code = daemon.run_client(args, self.socket_path)
+        os.unlink(svg_file.name)
+        self.assertEqual(exit_code, 0)
+        self.assertIn('Estimated print time', output.getvalue())
+
+        args.mode = 'align'
+        with redirect_stdout(output):
+            self.assertEqual(daemon.run_client(args, self.socket_path), 1)
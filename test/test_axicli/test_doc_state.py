@@ -0,0 +1,131 @@
+import copy
+import os
+import subprocess
+import sys
+import unittest
+
+from lxml import etree
+from mock import patch
+
+from pyaxidraw import axidraw, doc_state
+
+try:
+    import resource
+except ImportError:
+    resource = None # Not available on Windows
+
+# python -m unittest discover in top-level package dir
+
+SVG = '''<svg xmlns="http://www.w3.org/2000/svg" width="200mm" height="150mm"
+    viewBox="0 0 200 150">
+  <g id="layer1"><path d="M 10,10 L 90,10 L 90,60" stroke="black" fill="none"/></g>
+  <circle cx="150" cy="50" r="25" stroke="black" fill="none"/>
+  <plotdata application="axidraw" model="2" layer="-1" pause_dist="0" pause_ref="0"
+    plob_version="n/a" row="0" rand_seed="1" last_x="0" last_y="0"/>
+</svg>'''
+
+# Child process: peak memory added by plotting (or by one copy of) a large document
+BENCHMARK = '''
+import copy, resource, sys
+from pyaxidraw import axidraw
+count, mode = int(sys.argv[1]), sys.argv[2]
+hidden = ''.join(f'<path d="M {i % 100},{i % 70} L {i % 90},5" stroke="black"/>'
+    for i in range(count))
+ad = axidraw.AxiDraw()
+ad.plot_setup('<svg xmlns="http://www.w3.org/2000/svg" width="200mm" height="150mm" '
+    'viewBox="0 0 200 150"><path d="M 10,10 L 90,10" stroke="black"/>'
+    f'<g style="display:none">{hidden}</g></svg>')
+del hidden
+ad.options.preview = True
+ad.options.report_time = False
+start = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if mode == 'plot':
+    ad.plot_run()
+    ad.plot_run()
+else:
+    backup = copy.deepcopy(ad.document)
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start)
+'''
+
+def tree_copies(function):
+    ''' count deep copies of lxml trees and elements made while calling function '''
+    copies = []
+    original = copy.deepcopy
+    def counting_deepcopy(item, *args):
+        if isinstance(item, etree._ElementTree) or etree.iselement(item):
+            copies.append(item)
+        return original(item, *args)
+    with patch('copy.deepcopy', counting_deepcopy):
+        function()
+    return len(copies)
+
+
+class DocStateTestCase(unittest.TestCase):
+
+    def test_restore(self):
+        """ added root children and plotdata changes are reverted; other nodes untouched """
+        document = etree.ElementTree(etree.fromstring(SVG))
+        root = document.getroot()
+        layer, circle, plotdata = list(root)
+        state = doc_state.DocumentState(document)
+
+        root.append(etree.Element('g'))
+        root.remove(circle)
+        root.remove(plotdata)
+        etree.SubElement(root, 'plotdata').set('pause_dist', '5')
+        plotdata.set('pause_dist', '7')
+        root.set('width', '10in')
+        self.assertIs(state.restore(), document)
+        self.assertEqual(list(root), [layer, circle, plotdata])
+        self.assertEqual(plotdata.get('pause_dist'), '0')
+        self.assertEqual(root.get('width'), '200mm')
+        self.assertEqual(etree.tostring(document), etree.tostring(etree.fromstring(SVG)))
+
+    def test_pristine_copy(self):
+        """ pristine_copy copies the recorded state, leaving the document as it is """
+        document = etree.ElementTree(etree.fromstring(SVG))
+        state = doc_state.DocumentState(document)
+        document.getroot().append(etree.Element('g'))
+        modified = etree.tostring(document)
+        pristine = state.pristine_copy()
+        self.assertEqual(etree.tostring(pristine), etree.tostring(etree.fromstring(SVG)))
+        self.assertEqual(etree.tostring(document), modified)
+
+    def test_deepcopy(self):
+        """ deep-copying a DocumentState copies it, leaving the document as it is """
+        document = etree.ElementTree(etree.fromstring(SVG))
+        state = doc_state.DocumentState(document)
+        document.getroot().append(etree.Element('g'))
+        modified = etree.tostring(document)
+        duplicate = copy.deepcopy(state)
+        self.assertIsNot(duplicate, state)
+        self.assertIsNot(duplicate.document, document)
+        self.assertEqual(etree.tostring(document), modified)
+
+    def test_no_tree_copies(self):
+        """ plot_setup and plot_run do not copy the document tree """
+        ad = axidraw.AxiDraw()
+        self.assertEqual(tree_copies(lambda: ad.plot_setup(SVG)), 0)
+        ad.options.preview = True
+        ad.options.report_time = False
+        self.assertEqual(tree_copies(ad.plot_run), 0)
+        self.assertEqual(tree_copies(ad.plot_run), 0)
+        output = etree.fromstring(ad.get_output())
+        self.assertEqual(len(output.findall('{http://www.w3.org/2000/svg}g')), 2) # Preview
+        self.assertEqual(len(output.findall('{http://www.w3.org/2000/svg}plotdata')), 1)
+
+        original = etree.tostring(ad.original_document) # Copied when first asked for
+        self.assertEqual(original, etree.tostring(etree.fromstring(SVG)))
+        self.assertIsNot(ad.original_document, ad.document)
+
+    @unittest.skipIf(resource is None, "resource module not available")
+    def test_peak_memory(self):
+        """ plotting a large document adds less to peak memory than one copy of its tree """
+        def peak_increase(mode):
+            env = dict(os.environ, PYTHONPATH=os.getcwd())
+            result = subprocess.run([sys.executable, '-c', BENCHMARK, '40000', mode],
+                capture_output=True, text=True, env=env, check=True)
+            return int(result.stdout.split()[-1])
+        one_copy = peak_increase('copy')
+        self.assertGreater(one_copy, 0)
+        self.assertLess(peak_increase('plot'), one_copy / 2)
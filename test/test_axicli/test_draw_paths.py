@@ -0,0 +1,69 @@
+import math
+import random
+import unittest
+
+from mock import patch
+
+from axidrawinternal import plot_status
+
+from test.test_axicli.test_buffered_motion import interactive_preview
+
+# python -m unittest discover in top-level package dir
+
+def random_strokes(count, seed=0):
+    ''' short random strokes, in mm, a few of which extend past the travel bounds '''
+    rng = random.Random(seed)
+    strokes = []
+    for _ in range(count):
+        x_pos, y_pos = rng.uniform(10, 290), rng.uniform(10, 200)
+        strokes.append([[x_pos, y_pos], [x_pos + rng.uniform(-10, 10),
+            y_pos + rng.uniform(-10, 10)], [x_pos + rng.uniform(-10, 10), y_pos + 20]])
+    return strokes
+
+def stroke_length(strokes):
+    ''' total length of strokes '''
+    return sum(math.dist(vertex_a, vertex_b) for stroke in strokes
+        for vertex_a, vertex_b in zip(stroke, stroke[1:]))
+
+
+class DrawPathsTestCase(unittest.TestCase):
+
+    def test_matches_draw_path(self):
+        """ draw_paths draws the same strokes as draw_path, in less time when reordered """
+        strokes = random_strokes(100)
+        results = []
+        for batch in (False, True):
+            ad = interactive_preview(False)
+            ad.options.units = 2
+            ad.options.reordering = 2
+            if batch:
+                self.assertEqual(ad.draw_paths(strokes), [])
+            else:
+                for stroke in strokes:
+                    ad.draw_path(stroke)
+            self.assertTrue(ad.turtle_pen())
+            results.append((ad.plot_status.stats.pt_estimate,
+                ad.plot_status.stats.down_travel_inch))
+        (time_single, dist_single), (time_batch, dist_batch) = results
+        self.assertAlmostEqual(dist_batch, dist_single, delta=0.05) # Step rounding
+        self.assertLess(time_batch, time_single * 0.8)
+
+    def test_resume(self):
+        """ paths not drawn when stopped are returned, and may be drawn to finish """
+        strokes = [stroke for stroke in random_strokes(60, seed=2)
+            if max(vertex[1] for vertex in stroke) < 210] # Avoid clipping
+        ad = interactive_preview(False)
+        ad.options.units = 2
+        ad.options.reordering = 4
+        presses = iter([0] * 150 + [1])
+        with patch.object(plot_status.ResumeStatus, 'check_button',
+                lambda *args: next(presses, 0)):
+            remaining = ad.draw_paths(strokes)
+        drawn = 25.4 * ad.plot_status.stats.down_travel_inch
+        self.assertTrue(0 < len(remaining) < len(strokes))
+        self.assertAlmostEqual(drawn + stroke_length(remaining), stroke_length(strokes), delta=0.2)
+
+        ad.plot_status.stopped = 0 # Resume after the pause
+        self.assertEqual(ad.draw_paths(remaining), [])
+        self.assertAlmostEqual(25.4 * ad.plot_status.stats.down_travel_inch,
+            stroke_length(strokes), delta=0.2)
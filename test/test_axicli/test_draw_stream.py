@@ -0,0 +1,104 @@
+import itertools
+import signal
+import threading
+import unittest
+
+from mock import patch
+
+from axidrawinternal import plot_status
+
+from test.test_axicli.test_buffered_motion import interactive_preview
+from test.test_axicli.test_draw_paths import random_strokes, stroke_length
+
+# python -m unittest discover in top-level package dir
+
+class DrawStreamTestCase(unittest.TestCase):
+
+    def test_matches_draw_paths(self):
+        """ a stream in one window draws as draw_paths does; smaller windows draw the same """
+        strokes = [stroke for stroke in random_strokes(80, seed=3)
+            if max(vertex[1] for vertex in stroke) < 210] # Avoid clipping
+        results = []
+        for window in (None, 1000, 10):
+            ad = interactive_preview(False)
+            ad.options.units = 2
+            ad.options.reordering = 2
+            if window is None:
+                self.assertEqual(ad.draw_paths(strokes), [])
+            else:
+                self.assertEqual(ad.draw_stream((stroke for stroke in strokes), window), [])
+            self.assertTrue(ad.turtle_pen())
+            results.append((ad.plot_status.stats.pt_estimate,
+                25.4 * ad.plot_status.stats.down_travel_inch))
+        self.assertAlmostEqual(results[1][0], results[0][0], delta=results[0][0] * 0.01)
+        for _, distance in results:
+            self.assertAlmostEqual(distance, stroke_length(strokes), delta=1) # Step rounding
+
+    def test_lazy_windows(self):
+        """ paths are taken from the iterable only one window at a time """
+        strokes = random_strokes(50, seed=4)
+        ad = interactive_preview(False)
+        ad.options.units = 2
+        taken = []
+        def stream():
+            for index, stroke in enumerate(strokes):
+                taken.append((index, ad.plot_status.stats.down_travel_inch))
+                yield stroke
+        self.assertEqual(ad.draw_stream(stream(), window=8), [])
+        self.assertEqual(len(taken), 50)
+        for index, distance in taken:
+            if index % 8 == 0 and index > 0:
+                self.assertGreater(distance, taken[index - 8][1]) # Prior window drawn first
+            elif index % 8:
+                self.assertEqual(distance, taken[index - 1][1]) # Same window
+
+    def test_pause_and_resume(self):
+        """ a software pause stops the stream; the rest may be plotted to finish """
+        strokes = [stroke for stroke in random_strokes(60, seed=2)
+            if max(vertex[1] for vertex in stroke) < 210] # Avoid clipping
+        ad = interactive_preview(False)
+        ad.options.units = 2
+        ad.options.reordering = 4
+        presses = iter([0] * 150 + [1])
+        def check_button(*args):
+            if next(presses, 0):
+                ad.transmit_pause_request()
+            return 0
+        stream = iter(strokes)
+        with patch.object(plot_status.ResumeStatus, 'check_button', check_button):
+            remaining = ad.draw_stream(stream, window=10)
+        self.assertEqual(abs(ad.plot_status.stopped), 103) # Keyboard (software) pause
+        rest = list(stream)
+        self.assertTrue(rest)
+        self.assertEqual((len(strokes) - len(rest)) % 10, 0) # Whole windows taken
+        drawn = 25.4 * ad.plot_status.stats.down_travel_inch
+        self.assertAlmostEqual(drawn + stroke_length(remaining) + stroke_length(rest),
+            stroke_length(strokes), delta=0.2)
+
+        ad.plot_status.stopped = 0 # Resume after the pause
+        self.assertEqual(ad.draw_stream(itertools.chain(remaining, rest), window=10), [])
+        self.assertAlmostEqual(25.4 * ad.plot_status.stats.down_travel_inch,
+            stroke_length(strokes), delta=0.2)
+
+    def test_async_pause_before_start(self):
+        """ queued, with keyboard_pause, a pause requested before the stream starts stops it """
+        strokes = random_strokes(30, seed=5)
+        ad = interactive_preview(False)
+        ad.options.units = 2
+        ad.keyboard_pause = True
+        ad.async_commands = True
+        handler = signal.getsignal(signal.SIGINT)
+        try:
+            ad.set_up_pause_transmitter() # As by connect(), in the caller's thread
+            gate = threading.Event()
+            ad._command_queue_ref().submit(gate.wait)
+            future = ad.draw_stream(iter(strokes), window=10)
+            ad.transmit_pause_request()
+            gate.set()
+            self.assertTrue(future.result()) # Stopped, with paths not plotted
+            self.assertEqual(abs(ad.plot_status.stopped), 103)
+            ad.plot_status.stopped = 0
+            self.assertEqual(ad.draw_stream(iter(strokes), window=10).result(), [])
+        finally:
+            signal.signal(signal.SIGINT, handler)
+            ad._command_queue.close()
@@ -0,0 +1,77 @@
+import random
+import unittest
+
+from pyaxidraw import axidraw, estimate
+
+# python -m unittest discover in top-level package dir
+
+def make_svg(count, seed=0):
+    ''' document of circles, lines, polylines and curves '''
+    rng = random.Random(seed)
+    elements = []
+    for index_i in range(count):
+        x_pos, y_pos = rng.uniform(0.5, 7), rng.uniform(0.5, 5)
+        kind = index_i % 4
+        if kind == 0:
+            elements.append(f'<circle cx="{x_pos:.3f}" cy="{y_pos:.3f}" '
+                + f'r="{rng.uniform(0.05, 0.8):.3f}" fill="none" stroke="black"/>')
+        elif kind == 1:
+            elements.append(f'<path d="M {x_pos:.3f} {y_pos:.3f} l {rng.uniform(-1, 1):.3f} '
+                + f'{rng.uniform(-1, 1):.3f}" stroke="black"/>')
+        elif kind == 2:
+            points = " ".join(f"{x_pos + rng.uniform(-0.5, 0.5):.3f},"
+                + f"{y_pos + rng.uniform(-0.5, 0.5):.3f}" for _ in range(8))
+            elements.append(f'<polyline points="{points}" fill="none" stroke="black"/>')
+        else:
+            elements.append(f'<path d="M {x_pos:.3f} {y_pos:.3f} c 0.3 -0.5 0.6 0.5 1 0 '
+                + 's 0.5 0.4 0.8 0" stroke="black" fill="none"/>')
+    return '<svg xmlns="http://www.w3.org/2000/svg" width="8in" height="6in" viewBox="0 0 8 6">'\
+        + "".join(elements) + '</svg>'
+
+def preview(svg, fast_estimate, **options):
+    ''' run a preview and return the AxiDraw object '''
+    ad = axidraw.AxiDraw()
+    ad.plot_setup(svg)
+    ad.options.preview = True
+    for name, value in options.items():
+        setattr(ad.options, name, value)
+    ad.fast_estimate = fast_estimate
+    ad.plot_run()
+    return ad
+
+
+class EstimateTestCase(unittest.TestCase):
+
+    def test_matches_preview(self):
+        """ fast estimates of time and distance agree with the full preview """
+        svg = make_svg(80, seed=2)
+        for options in ({}, {'const_speed': True}, {'resolution': 2, 'speed_pendown': 60},
+                {'reordering': 2, 'accel': 30}):
+            with self.subTest(**options):
+                full = preview(svg, False, **options)
+                fast = preview(svg, True, **options)
+                self.assertAlmostEqual(fast.time_estimate / full.time_estimate, 1, delta=0.02)
+                self.assertAlmostEqual(fast.distance_pendown / full.distance_pendown, 1,
+                    delta=0.001)
+                self.assertAlmostEqual(fast.distance_total / full.distance_total, 1,
+                    delta=0.001)
+                self.assertEqual(fast.pen_lifts, full.pen_lifts)
+
+    def test_no_rendering(self):
+        """ fast estimates do not render the preview """
+        svg = make_svg(4)
+        self.assertIn('% Preview', preview(svg, False, rendering=3).get_output())
+        self.assertNotIn('% Preview', preview(svg, True, rendering=3).get_output())
+
+    def test_segment_time(self):
+        """ trapezoid and constant-velocity segment durations """
+        ad = preview(make_svg(1), False)
+        profile = estimate.SegmentProfile(ad, True)
+        v_max, accel = profile.speed_limit, profile.accel_rate
+        length = 10 * v_max * v_max / accel
+        self.assertAlmostEqual(profile.time(length, 0, 0),
+            2 * v_max / accel + (length - v_max * v_max / accel) / v_max)
+
+        ad.options.const_speed = True
+        profile = estimate.SegmentProfile(ad, False)
+        self.assertAlmostEqual(profile.time(2.0, 0, 0), 2.0 / ad.speed_pendown)
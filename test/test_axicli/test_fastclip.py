@@ -0,0 +1,78 @@
+import copy
+import math
+import random
+import unittest
+
+from axidrawinternal import boundsclip, path_objects
+
+from pyaxidraw import fastclip
+
+# python -m unittest discover in top-level package dir
+
+PHY_BOUNDS = [[0, 0], [11.81, 8.58]]
+
+def make_digest(count, seed=0):
+    ''' flat digest of jagged paths, some of which cross the bounds '''
+    rng = random.Random(seed)
+    layer = path_objects.LayerItem()
+    for index_i in range(count):
+        x_pos, y_pos = rng.uniform(-1, 13), rng.uniform(-1, 10)
+        path = path_objects.PathItem()
+        path.item_id = f'path{index_i}'
+        path.subpaths = [[[x_pos + rng.uniform(-0.5, 0.5), y_pos + rng.uniform(-0.5, 0.5)]
+            for _ in range(30)]]
+        layer.paths.append(path)
+    digest = path_objects.DocDigest()
+    digest.layers.append(layer)
+    return digest
+
+def subpaths(digest):
+    ''' all subpaths of a digest, in order '''
+    return [subpath for layer in digest.layers for path in layer.paths
+        for subpath in path.subpaths]
+
+
+class FastClipTestCase(unittest.TestCase):
+
+    def test_matches_boundsclip(self):
+        """ output and warning flag match boundsclip.clip_at_bounds """
+        cases = [([8.5, 11], True), ([12.5, 9], True), ([8.5, 11], False)]
+        for seed in range(5):
+            for doc_bounds, doc_clip in cases:
+                with self.subTest(seed=seed, doc_bounds=doc_bounds, doc_clip=doc_clip):
+                    expected = make_digest(40, seed)
+                    result = copy.deepcopy(expected)
+                    flag = boundsclip.clip_at_bounds(expected, copy.deepcopy(PHY_BOUNDS),
+                        doc_bounds, 0.003, doc_clip)
+                    self.assertEqual(fastclip.clip_at_bounds(result, copy.deepcopy(PHY_BOUNDS),
+                        doc_bounds, 0.003, doc_clip), flag)
+                    expected_list, result_list = subpaths(expected), subpaths(result)
+                    self.assertEqual([len(item) for item in result_list],
+                        [len(item) for item in expected_list])
+                    for subpath_a, subpath_b in zip(expected_list, result_list):
+                        for vertex_a, vertex_b in zip(subpath_a, subpath_b):
+                            self.assertLess(math.dist(vertex_a, vertex_b), 1e-9)
+
+    def test_inside_paths_untouched(self):
+        """ paths entirely within bounds keep their original vertex lists """
+        digest = make_digest(1)
+        vertices = [[1, 1], [2, 1], [2, 2]]
+        digest.layers[0].paths[0].subpaths = [vertices]
+        self.assertFalse(fastclip.clip_at_bounds(digest, PHY_BOUNDS, [8.5, 11], 0.003))
+        self.assertIs(digest.layers[0].paths[0].subpaths[0], vertices)
+
+    def test_warning_tolerance(self):
+        """ warn only past the tolerance, and only at positive physical limits """
+        for x_end, warn in [(11.812, False), (11.82, True), (-5, False)]:
+            digest = make_digest(1)
+            digest.layers[0].paths[0].subpaths = [[[1, 1], [x_end, 1]]]
+            self.assertEqual(fastclip.clip_at_bounds(digest, PHY_BOUNDS, [12, 9], 0.003,
+                doc_clip=False), warn)
+
+    def test_liang_barsky(self):
+        """ segment clipping at bounds """
+        bounds = (0, 0, 10, 10)
+        self.assertEqual(fastclip.liang_barsky(-5, 5, 15, 5, bounds), (0, 5, 10, 5))
+        self.assertEqual(fastclip.liang_barsky(1, 1, 2, 2, bounds), (1, 1, 2, 2))
+        self.assertIsNone(fastclip.liang_barsky(-5, 11, 15, 11, bounds))
+        self.assertIsNone(fastclip.liang_barsky(-2, 1, 1, -2, bounds))
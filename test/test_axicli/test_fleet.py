@@ -0,0 +1,118 @@
+import time
+import unittest
+
+from mock import patch
+
+from pyaxidraw import fleet
+
+# python -m unittest discover in top-level package dir
+
+LINE_SVG = """<svg xmlns="http://www.w3.org/2000/svg" width="4in" height="3in" viewBox="0 0 4 3">
+<path d="M 1 1 L {0} 2" fill="none" stroke="black" stroke-width="0.01"/>
+</svg>"""
+
+
+class FailingUnit(fleet.SimulatedUnit):
+    ''' simulated unit that fails to connect '''
+
+    def plot(self, fleet_ref, job, digest):
+        return 101
+
+
+class SlowFailingUnit(fleet.SimulatedUnit):
+    ''' simulated unit that fails to connect, after other units have found the queue empty '''
+
+    def plot(self, fleet_ref, job, digest):
+        time.sleep(0.2)
+        return 101
+
+
+class FleetTestCase(unittest.TestCase):
+
+    def test_all_jobs_plotted(self):
+        """ every job is plotted once, and busy time is reported per unit """
+        units = [fleet.SimulatedUnit('alpha'), fleet.SimulatedUnit('beta')]
+        the_fleet = fleet.Fleet(units, prepare_workers=0)
+        jobs = [the_fleet.submit(LINE_SVG.format(2 + index_i * 0.1)) for index_i in range(6)]
+        the_fleet.run()
+        self.assertEqual([job.status for job in jobs], ["done"] * 6)
+        self.assertTrue(all(job.unit in ('alpha', 'beta') for job in jobs))
+        self.assertTrue(all(job.time_elapsed > 0 for job in jobs))
+        report = the_fleet.report()
+        self.assertEqual([row.name for row in report], ['alpha', 'beta'])
+        self.assertEqual(sum(row.jobs for row in report), 6)
+        for row in report:
+            self.assertGreaterEqual(row.busy_time, 0)
+            self.assertLessEqual(row.utilization, 1.0)
+        the_fleet.close()
+
+    def test_offline_unit_requeues(self):
+        """ a unit that fails to connect goes offline and its job is plotted elsewhere """
+        units = [FailingUnit('broken'), fleet.SimulatedUnit('working')]
+        the_fleet = fleet.Fleet(units, prepare_workers=0)
+        jobs = [the_fleet.submit(LINE_SVG.format(3)) for _ in range(3)]
+        the_fleet.run()
+        self.assertEqual([job.unit for job in jobs], ['working'] * 3)
+        self.assertEqual([job.status for job in jobs], ["done"] * 3)
+        report = {row.name: row for row in the_fleet.report()}
+        self.assertFalse(report['broken'].online)
+        self.assertEqual(report['working'].jobs, 3)
+
+    def test_requeue_after_queue_empty(self):
+        """ a job requeued by a failing unit is plotted by a unit that was waiting """
+        units = [SlowFailingUnit('broken'), fleet.SimulatedUnit('working')]
+        the_fleet = fleet.Fleet(units, prepare_workers=0)
+        job = the_fleet.submit(LINE_SVG.format(3))
+        the_fleet.run()
+        self.assertEqual((job.status, job.unit), ("done", 'working'))
+
+    def test_no_units_online(self):
+        """ jobs fail, rather than staying queued, once all units are offline """
+        units = [FailingUnit('broken'), SlowFailingUnit('slow')]
+        the_fleet = fleet.Fleet(units, prepare_workers=0)
+        jobs = [the_fleet.submit(LINE_SVG.format(3)) for _ in range(3)]
+        the_fleet.run()
+        self.assertEqual([job.status for job in jobs], ["failed"] * 3)
+        self.assertEqual([job.error_code for job in jobs], [101] * 3)
+
+    def test_prepare_limited(self):
+        """ only jobs near the head of the queue are prepared ahead """
+        units = [fleet.SimulatedUnit('alpha'), fleet.SimulatedUnit('beta')]
+        the_fleet = fleet.Fleet(units, prepare_workers=1)
+        try:
+            jobs = [the_fleet.submit(LINE_SVG.format(3)) for _ in range(6)]
+            self.assertEqual([job.prepared is not None for job in jobs],
+                [True, True, False, False, False, False])
+            the_fleet.run()
+            self.assertEqual([job.status for job in jobs], ["done"] * 6)
+        finally:
+            the_fleet.close()
+
+    def test_prepared_ahead(self):
+        """ jobs prepared ahead are plotted from their digests, with job options """
+        the_fleet = fleet.Fleet([fleet.SimulatedUnit('alpha')], prepare_workers=1)
+        job_fast = the_fleet.submit(LINE_SVG.format(3), speed_pendown=100)
+        job_slow = the_fleet.submit(LINE_SVG.format(3), speed_pendown=10)
+        with patch('pyaxidraw.axidraw.digest_svg.DigestSVG.process_svg') as process_svg:
+            the_fleet.run()
+        the_fleet.close()
+        process_svg.assert_not_called() # Digests came from preparation processes
+        self.assertEqual([job_fast.status, job_slow.status], ["done", "done"])
+        self.assertLess(job_fast.time_elapsed, job_slow.time_elapsed)
+
+    def test_prepare_random_start(self):
+        """ with random_start, jobs are prepared without randomizing or reordering """
+        svg = LINE_SVG.replace('</svg>', '<circle cx="3" cy="1" r="0.5" stroke="black"/>'
+            '<rect x="0.5" y="2" width="1" height="0.5" stroke="black"/></svg>').format(3)
+        def paths(digest):
+            return [path.subpaths for layer in digest.layers for path in layer.paths]
+        deferred = fleet.prepare_digest(svg, {'random_start': True, 'reordering': 2})
+        unordered = fleet.prepare_digest(svg, {'random_start': False, 'reordering': 0})
+        self.assertEqual(paths(deferred), paths(unordered))
+
+    def test_discover_units(self):
+        """ units are discovered by name, if any are connected """
+        with patch('pyaxidraw.fleet.ebb_serial.list_named_ebbs', return_value=['one', 'two']):
+            self.assertEqual([unit.name for unit in fleet.discover_units()], ['one', 'two'])
+        with patch('pyaxidraw.fleet.ebb_serial.list_named_ebbs', return_value=None):
+            self.assertEqual(fleet.discover_units(), [])
@@ -0,0 +1,110 @@
+import copy
+import math
+import random
+import unittest
+
+from axidrawinternal import path_objects
+from axidrawinternal.clipping import ClipPathsProcess
+
+from pyaxidraw import axidraw
+from pyaxidraw.hidden_lines import BoxGrid, IndexedClipPathsProcess, TiledClipPathsProcess
+
+# python -m unittest discover in top-level package dir
+
+OVERLAP_SVG = """<svg xmlns="http://www.w3.org/2000/svg" width="8in" height="6in" viewBox="0 0 8 6">
+<rect x="1" y="1" width="2" height="2" fill="none" stroke="black" stroke-width="0.01"/>
+<rect x="2" y="2" width="2" height="2" fill="white" stroke="black" stroke-width="0.01"/>
+<rect x="6" y="4" width="1" height="1" fill="white" stroke="black" stroke-width="0.01"/>
+</svg>"""
+
+def make_layers(count, seed=0):
+    ''' one layer of overlapping squares, some filled and some stroked '''
+    rng = random.Random(seed)
+    layer = path_objects.LayerItem()
+    layer.item_id = 'layer1'
+    for index_i in range(count):
+        x_pos, y_pos, size = rng.uniform(0, 10), rng.uniform(0, 8), rng.uniform(0.1, 0.6)
+        path = path_objects.PathItem()
+        path.item_id = f'path{index_i}'
+        path.subpaths = [[[x_pos, y_pos], [x_pos + size, y_pos], [x_pos + size, y_pos + size],
+            [x_pos, y_pos + size], [x_pos, y_pos]]]
+        kind = rng.random()
+        path.fill = 'black' if kind < 0.6 else None
+        path.stroke = 'black' if kind > 0.3 else None
+        layer.paths.append(path)
+    return [layer]
+
+def stroked_geometry(layers):
+    ''' sorted stroked segments, ignoring stroke direction and fragment order '''
+    segments = []
+    for layer in layers:
+        for path in layer.paths:
+            if str(path.stroke).lower() == 'none':
+                continue
+            for subpath in path.subpaths:
+                points = [tuple(vertex) for vertex in subpath]
+                segments.append(min(points, points[::-1]))
+    return sorted(segments)
+
+def stroked_length(layers):
+    ''' total length of stroked subpaths '''
+    total = 0
+    for layer in layers:
+        for path in layer.paths:
+            if str(path.stroke).lower() != 'none':
+                for subpath in path.subpaths:
+                    total += sum(math.dist(a, b) for a, b in zip(subpath, subpath[1:]))
+    return total
+
+
+class HiddenLinesTestCase(unittest.TestCase):
+
+    def test_matches_clip_paths_process(self):
+        """ indexed clipping gives the same visible strokes as the standard process """
+        layers = make_layers(200)
+        bounds = [[0, 0], [11, 9]]
+        expected = ClipPathsProcess().run(copy.deepcopy(layers), bounds)
+        process = IndexedClipPathsProcess()
+        result = process.run(layers, bounds)
+
+        self.assertEqual(stroked_geometry(result), stroked_geometry(expected))
+        self.assertLessEqual(process.pairs_clipped, process.pairs_tested)
+        self.assertLess(process.pairs_tested, 200 * 199 // 2)
+
+    def test_tiled_matches_untiled(self):
+        """ tiled clipping, in or out of process, gives the same stroked length """
+        layers = make_layers(300, seed=3)
+        bounds = [[0, 0], [11, 9]]
+        expected = stroked_length(IndexedClipPathsProcess().run(copy.deepcopy(layers),
+            copy.deepcopy(bounds)))
+        for workers in (0, 2):
+            result = TiledClipPathsProcess(3, workers).run(copy.deepcopy(layers),
+                copy.deepcopy(bounds))
+            self.assertAlmostEqual(stroked_length(result), expected, places=6)
+
+    def test_tiles(self):
+        """ tiles partition the bounds """
+        tiles = TiledClipPathsProcess(2).tiles([[0, 0], [4, 2]])
+        self.assertEqual(tiles, [[[0, 0], [2, 1]], [[2, 0], [4, 1]],
+            [[0, 1], [2, 2]], [[2, 1], [4, 2]]])
+
+    def test_grid_query(self):
+        """ grid query returns overlapping boxes, and not distant ones """
+        grid = BoxGrid([(0, 0, 1, 1), (5, 5, 6, 6), None, (0.5, 0.5, 5.5, 5.5)])
+        self.assertEqual(grid.query((0.2, 0.2, 0.3, 0.3)) & {0, 1, 3}, {0, 3})
+        self.assertNotIn(2, grid.query((0, 0, 6, 6)))
+
+    def test_hiding_plot_distance(self):
+        """ preview with hiding plots only the visible portions of strokes """
+        ad = axidraw.AxiDraw()
+        ad.plot_setup(OVERLAP_SVG)
+        ad.options.preview = True
+        ad.options.hiding = True
+        ad.plot_run()
+        # Lower square: 8 in perimeter, of which 2 in is hidden. Upper squares: 8 + 4 in.
+        self.assertAlmostEqual(ad.distance_pendown, 0.0254 * 18, places=3)
+
+        ad.hiding_tiles = 3
+        ad.hiding_workers = 0
+        ad.plot_run()
+        self.assertAlmostEqual(ad.distance_pendown, 0.0254 * 18, places=3)
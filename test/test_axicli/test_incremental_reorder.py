@@ -0,0 +1,103 @@
+import math
+import random
+import unittest
+
+from axidrawinternal import path_objects, plot_optimizations
+
+from pyaxidraw import axidraw
+from pyaxidraw.incremental_reorder import TourCache
+
+# python -m unittest discover in top-level package dir
+
+def square(x_pos, y_pos, size=0.1):
+    ''' closed path item '''
+    path = path_objects.PathItem()
+    path.subpaths = [[[x_pos, y_pos], [x_pos + size, y_pos], [x_pos + size, y_pos + size],
+        [x_pos, y_pos + size], [x_pos, y_pos]]]
+    return path
+
+def make_digest(count=400, seed=1):
+    ''' flat digest with a mix of closed and open paths '''
+    rng = random.Random(seed)
+    layer = path_objects.LayerItem()
+    for index_i in range(count):
+        x_pos, y_pos = rng.uniform(0, 8), rng.uniform(0, 5)
+        if index_i % 3:
+            layer.paths.append(square(x_pos, y_pos))
+        else:
+            path = path_objects.PathItem()
+            path.subpaths = [[[x_pos, y_pos], [x_pos + 0.2, y_pos + 0.1]]]
+            layer.paths.append(path)
+    digest = path_objects.DocDigest()
+    digest.layers.append(layer)
+    digest.flat = True
+    return digest
+
+def pen_up_travel(paths):
+    ''' total pen-up distance for a layer, starting from the origin '''
+    position = (0, 0)
+    total = 0
+    for path in paths:
+        total += math.dist(position, path.first_point())
+        position = path.last_point()
+    return total
+
+
+class IncrementalReorderTestCase(unittest.TestCase):
+
+    def test_repair_keeps_all_paths(self):
+        """ repair reorders paths in the layer, without adding or dropping any """
+        digest = make_digest()
+        original = set(id(path) for path in digest.layers[0].paths)
+        plot_optimizations.reorder(digest, True)
+        cache = TourCache(digest)
+
+        plot_optimizations.randomize_start(digest, 5)
+        cache.repair()
+
+        self.assertTrue(cache.valid_for(digest))
+        self.assertGreater(cache.rotated, 0)
+        self.assertEqual(set(id(path) for path in digest.layers[0].paths), original)
+        self.assertEqual(len(digest.layers[0].paths), len(original))
+
+    def test_repair_does_not_increase_travel(self):
+        """ relocating rotated paths only ever shortens pen-up travel """
+        digest = make_digest()
+        plot_optimizations.reorder(digest, True)
+        cache = TourCache(digest)
+        plot_optimizations.randomize_start(digest, 7)
+        unrepaired = pen_up_travel(digest.layers[0].paths)
+
+        cache.repair()
+
+        self.assertLessEqual(pen_up_travel(digest.layers[0].paths), unrepaired + 1e-9)
+
+    def test_cache_invalid_for_other_digest(self):
+        """ a cache is only reused for the digest that it was built for """
+        digest = make_digest(20)
+        cache = TourCache(digest)
+        self.assertFalse(cache.valid_for(make_digest(20)))
+        digest.layers[0].paths.pop()
+        self.assertFalse(cache.valid_for(digest))
+
+    def test_copies_use_tour_cache(self):
+        """ additional copies with random_start repair the cached tour """
+        ad = axidraw.AxiDraw()
+        ad.plot_setup()
+        ad.options.preview = True
+        ad.options.random_start = True
+        ad.options.reordering = 1
+        ad.digest = make_digest(60)
+        ad.plot_status.resume.new.plob_version = "n/a"
+
+        ad.randomize_optimize(True)
+        cache = ad.tour_cache
+        self.assertIsNotNone(cache)
+
+        ad.randomize_optimize()
+        self.assertIs(ad.tour_cache, cache)
+        self.assertEqual(len(ad.digest.layers[0].paths), 60)
+
+        ad.incremental_reorder = False
+        ad.randomize_optimize()
+        self.assertIsNone(ad.tour_cache)
@@ -0,0 +1,144 @@
+import threading
+import unittest
+
+from mock import patch
+
+from axidrawinternal import axidraw as axidraw_engine, digest_svg, plot_status
+
+from pyaxidraw import axidraw, multi_unit, port_cache
+
+# python -m unittest discover in top-level package dir
+
+SVG = """<svg xmlns="http://www.w3.org/2000/svg" width="8in" height="6in" viewBox="0 0 8 6">
+<path d="M 1 1 L 7 1 L 7 5 L 1 5 Z" fill="none" stroke="black"/>
+<circle cx="4" cy="3" r="1" fill="none" stroke="black"/>
+<path d="M 2 4 L 6 2" fill="none" stroke="black"/>
+</svg>"""
+
+PORTS = [(f'port{index}', 'EiBotBoard',
+    f'USB VID:PID=04D8:FD92 SER=unit{index} LOCATION=1-{index}') for index in (1, 2, 3)]
+
+def digest_string(digest):
+    ''' string form of a flat DocDigest '''
+    return str([(layer.name, [path.subpaths for path in layer.paths]) for layer in digest.layers])
+
+
+class MultiUnitTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.process_calls = 0
+        self.plotted = {} # port: digest string
+        self.documents = {} # port: document plotted
+        self.seeds = {} # port: random seed saved for the plot
+        self.lock = threading.Lock()
+
+    def count_process_svg(self, original):
+        ''' DigestSVG.process_svg replacement that counts calls '''
+        def process_svg(digester, *args, **kwargs):
+            with self.lock:
+                self.process_calls += 1
+            return original(digester, *args, **kwargs)
+        return process_svg
+
+    def run_wrapper(self, **option_values):
+        ''' Plot SVG to three simulated units; return the wrapper '''
+        test_case = self
+
+        def serial_connect(ad):
+            ad.plot_status.port = ad.options.port
+
+        def plot_document(ad):
+            with test_case.lock:
+                test_case.plotted[ad.options.port] = digest_string(ad.digest)
+                test_case.seeds[ad.options.port] = ad.plot_status.resume.new.rand_seed
+                test_case.documents[ad.options.port] = ad.document
+
+        adc = multi_unit.AxiDrawWrapperClass()
+        adc.getoptions([])
+        adc.options.port_config = 3
+        for name, value in option_values.items():
+            setattr(adc.options, name, value)
+        adc.document = digest_svg.etree.ElementTree(digest_svg.etree.fromstring(SVG))
+        adc.original_document = adc.document
+        with patch.object(port_cache.ebb_serial, 'listEBBports', return_value=PORTS),\
+                patch('axidrawinternal.axidraw_control.ebb_serial.listEBBports',
+                    return_value=PORTS),\
+                patch.object(digest_svg.DigestSVG, 'process_svg',
+                    self.count_process_svg(digest_svg.DigestSVG.process_svg)),\
+                patch.object(axidraw.AxiDraw, 'serial_connect', serial_connect),\
+                patch.object(axidraw.AxiDraw, 'plot_document', plot_document),\
+                patch.object(axidraw_engine.AxiDraw, 'serial_connect', serial_connect),\
+                patch.object(axidraw_engine.AxiDraw, 'plot_document', plot_document),\
+                patch.object(axidraw.AxiDraw, 'query_ebb_voltage', create=True),\
+                patch.object(plot_status.ResumeStatus, 'clear_button'),\
+                patch('axidrawinternal.axidraw.ebb_motion.doTimedPause'):
+            adc.effect()
+        return adc
+
+    def test_prepared_once(self):
+        """ the document is digested once, and each unit plots the same digest """
+        adc = self.run_wrapper()
+        self.assertEqual(self.process_calls, 1)
+        self.assertEqual(sorted(self.plotted), ['port1', 'port2', 'port3'])
+        self.assertEqual(len(set(self.plotted.values())), 1)
+        self.assertIsNone(adc.shared_digest)
+
+        ad = axidraw.AxiDraw()
+        ad.plot_setup(SVG)
+        ad.options.digest = 2
+        ad.plot_run()
+        self.assertEqual(self.plotted['port1'], digest_string(ad.digest))
+
+    def test_random_start(self):
+        """ with random_start, each unit's plot is reproduced by its own saved seed """
+        self.run_wrapper(random_start=True, reordering=2)
+        self.assertEqual(self.process_calls, 1)
+        self.assertEqual(sorted(self.plotted), ['port1', 'port2', 'port3'])
+        for port, plotted in self.plotted.items():
+            ad = axidraw.AxiDraw()
+            ad.plot_setup(SVG)
+            ad.options.digest = 2
+            ad.options.random_start = True
+            ad.options.reordering = 2
+            with patch('axidrawinternal.axidraw.time.time',
+                    return_value=(self.seeds[port] + 0.5) / 100):
+                ad.plot_run()
+            self.assertEqual(ad.plot_status.resume.new.rand_seed, self.seeds[port])
+            self.assertEqual(plotted, digest_string(ad.digest))
+
+    def test_not_shared(self):
+        """ modes other than plot and layers prepare the document in each unit as before """
+        self.run_wrapper(mode='res_plot')
+        self.assertEqual(self.process_calls, 0) # No resume data in document; nothing plotted
+
+    def test_unit_documents(self):
+        """ each unit plots its own copy of the document, with or without a shared digest """
+        for shared in (True, False):
+            with self.subTest(shared=shared):
+                self.documents = {}
+                with patch.object(multi_unit.AxiDrawWrapperClass, 'share_digest',
+                        return_value=shared):
+                    adc = self.run_wrapper()
+                documents = list(self.documents.values())
+                self.assertEqual(sorted(self.documents), ['port1', 'port2', 'port3'])
+                self.assertEqual(len({id(document) for document in documents}), 3)
+                self.assertIsNone(adc.document_data)
+                for document in documents: # The input document, plus at most its own plot data
+                    self.assertEqual(len(document.getroot().findall('{*}path')), 2)
+                    self.assertLessEqual(len(document.getroot().findall('plotdata')), 1)
+                self.assertEqual(len(set(self.plotted.values())), 1)
+
+    def test_shared_digest(self):
+        """ each load gives a separate, identical copy of the digest """
+        ad = axidraw.AxiDraw()
+        ad.plot_setup(SVG)
+        ad.options.digest = 2
+        ad.plot_run()
+        shared = multi_unit.SharedDigest(ad.digest)
+        try:
+            copy_a, copy_b = shared.load(), shared.load()
+        finally:
+            shared.release()
+        self.assertIsNot(copy_a, copy_b)
+        self.assertEqual(digest_string(copy_a), digest_string(ad.digest))
+        self.assertEqual(digest_string(copy_b), digest_string(ad.digest))
@@ -0,0 +1,100 @@
+import unittest
+
+from lxml import etree
+
+from axidrawinternal import path_objects
+
+from pyaxidraw import axidraw
+
+# python -m unittest discover in top-level package dir
+
+SVG = '''<svg xmlns="http://www.w3.org/2000/svg" width="200mm" height="150mm"
+    viewBox="0 0 200 150">
+  <path d="M 10,10 L 90,10 L 90,60" stroke="black" fill="none"/>
+  <path d="M 120,100 L 20,140" stroke="black" fill="none"/>
+  <circle cx="150" cy="50" r="25" stroke="black" fill="none"/>
+</svg>'''
+
+def preview(svg_input, **kwargs):
+    ''' preview svg_input with plot_setup(svg_input); return the AxiDraw instance '''
+    ad = axidraw.AxiDraw()
+    ad.plot_setup(svg_input, **kwargs)
+    ad.options.preview = True
+    ad.options.report_time = False
+    ad.plot_run()
+    return ad
+
+def results(ad):
+    ''' time and distance results of a plot '''
+    return (round(ad.time_estimate, 3), round(ad.distance_pendown, 4),
+        round(ad.distance_total, 4), ad.pen_lifts)
+
+def line_digest():
+    ''' DocDigest of a 4 x 2 inch rectangle and a diagonal line, on a Letter page '''
+    digest = path_objects.DocDigest()
+    digest.width, digest.height = 11, 8.5
+    layer = path_objects.LayerItem()
+    for vertices in ([[1, 1], [5, 1], [5, 3], [1, 3], [1, 1]], [[6, 1], [8, 4]]):
+        path = path_objects.PathItem()
+        path.stroke = 'black'
+        path.subpaths = [vertices]
+        layer.paths.append(path)
+    digest.layers.append(layer)
+    return digest
+
+
+class PlotInputTestCase(unittest.TestCase):
+
+    def test_tree_input(self):
+        """ an lxml element or tree plots as the same SVG given as a string """
+        expected = results(preview(SVG))
+        self.assertGreater(expected[1], 0)
+        for copy_input in (False, True):
+            for as_tree in (False, True):
+                with self.subTest(copy_input=copy_input, as_tree=as_tree):
+                    root = etree.fromstring(SVG)
+                    svg_input = root.getroottree() if as_tree else root
+                    ad = axidraw.AxiDraw()
+                    ad.plot_setup(svg_input, copy_input=copy_input)
+                    self.assertEqual(ad.document.getroot() is root, not copy_input)
+                    ad.options.preview = True
+                    ad.plot_run()
+                    self.assertEqual(results(ad), expected)
+
+    def test_digest_input(self):
+        """ a DocDigest plots as the SVG it was made from, without changing it """
+        ad = axidraw.AxiDraw()
+        ad.plot_setup(SVG)
+        ad.options.digest = 2 # Process the SVG into a digest, without plotting
+        ad.plot_run()
+        digest = ad.digest
+        self.assertTrue(digest.layers)
+        before = [path.subpaths for layer in digest.layers for path in layer.paths]
+
+        ad = preview(digest)
+        self.assertEqual(results(ad), results(preview(SVG)))
+        self.assertEqual([path.subpaths for layer in digest.layers for path in layer.paths],
+            before)
+
+    def test_digest_plot(self):
+        """ a hand-made DocDigest is plotted, with repeat runs alike """
+        digest = line_digest()
+        ad = preview(digest)
+        self.assertAlmostEqual(ad.distance_pendown, 0.0254 * (12 + 13 ** 0.5), delta=1e-4) # m
+        self.assertEqual(ad.pen_lifts, 2)
+        first = results(ad)
+        ad.plot_run()
+        self.assertEqual(results(ad), first)
+        self.assertEqual(digest.layers[0].paths[1].subpaths, [[[6, 1], [8, 4]]])
+        self.assertFalse(digest.flat)
+
+    def test_copy_digest(self):
+        """ copy_digest copies vertex lists, sharing other attributes """
+        digest = line_digest()
+        copied = axidraw.copy_digest(digest)
+        self.assertEqual(copied.layers[0].paths[0].subpaths, digest.layers[0].paths[0].subpaths)
+        copied.layers[0].paths[0].subpaths[0][0][0] = 2
+        copied.layers[0].paths.pop()
+        self.assertEqual(digest.layers[0].paths[0].subpaths[0][0], [1, 1])
+        self.assertEqual(len(digest.layers[0].paths), 2)
+        self.assertIs(copied.layers[0].props, digest.layers[0].props)
@@ -0,0 +1,89 @@
+import threading
+import unittest
+
+from mock import patch
+
+from pyaxidraw import axidraw, port_cache
+
+# python -m unittest discover in top-level package dir
+
+PORTS = [('/dev/ttyACM0', 'EiBotBoard', 'USB VID:PID=04D8:FD92 SER=Alpha LOCATION=1-1:1.0'),
+    ('COM4', 'EiBotBoard Beta', 'USB VID:PID=04D8:FD92'),
+    ('COM5', 'EiBotBoard', 'USB VID:PID=04D8:FD92 SNR=Gamma'),
+    ('COM6', 'EiBotBoard', 'USB VID:PID=04D8:FD92')]
+
+
+class PortCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = port_cache.PortCache()
+        patcher = patch.object(port_cache.ebb_serial, 'listEBBports', return_value=PORTS)
+        self.list_ports = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch.object(port_cache.PortCache, 'valid', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_descriptor_names(self):
+        """ names from USB descriptors match ebb_serial.list_named_ebbs """
+        names = [port_cache.descriptor_name(port_info) or port_info[0] for port_info in PORTS]
+        self.assertEqual(names, port_cache.ebb_serial.list_named_ebbs())
+
+    def test_cached_lookup(self):
+        """ names and devices resolve from one scan; a miss scans again """
+        with patch.object(port_cache, 'probe_name', return_value=None):
+            self.assertEqual(self.cache.find('alpha').device, '/dev/ttyACM0')
+            self.assertEqual(self.cache.find('ttyACM0').name, 'Alpha')
+            self.assertEqual(self.cache.find('Beta').device, 'COM4')
+            self.assertEqual(self.cache.find('COM6').name, 'COM6')
+            self.assertEqual(self.cache.find().device, '/dev/ttyACM0')
+            self.assertEqual(self.list_ports.call_count, 1)
+            self.assertIsNone(self.cache.find('delta'))
+            self.assertEqual(self.list_ports.call_count, 2)
+            self.assertEqual(self.cache.names(), ['Alpha', 'Beta', 'Gamma', 'COM6'])
+
+    def test_parallel_probe(self):
+        """ EBBs without names in their descriptors are queried at the same time """
+        ports = [(f'COM{index}', 'EiBotBoard', 'USB VID:PID=04D8:FD92') for index in range(3)]
+        barrier = threading.Barrier(3)
+
+        def probe_name(device):
+            barrier.wait(timeout=5) # Raises BrokenBarrierError unless probed in parallel
+            return 'unit_' + device
+
+        with patch.object(port_cache, 'probe_name', probe_name):
+            self.list_ports.return_value = ports
+            self.assertEqual(self.cache.names(), ['unit_COM0', 'unit_COM1', 'unit_COM2'])
+        self.assertEqual(self.cache.find('UNIT_COM1').device, 'COM1')
+
+    def test_open_port_retries(self):
+        """ a cached port that fails to open, or has a new name, is found again by scanning """
+        port = object()
+        with patch.object(port_cache, 'probe_name', return_value=None),\
+                patch.object(port_cache.ebb_serial, 'testPort', side_effect=[None, port]),\
+                patch.object(port_cache.ebb_serial, 'query_nickname', return_value='BETA'):
+            self.assertIs(self.cache.open_port('Beta'), port)
+        self.assertEqual(self.cache.scans, 2)
+
+        with patch.object(port_cache, 'probe_name', return_value=None),\
+                patch.object(port_cache.ebb_serial, 'testPort', return_value=port),\
+                patch.object(port_cache.ebb_serial, 'closePort') as close_port,\
+                patch.object(port_cache.ebb_serial, 'query_nickname', return_value='Other'):
+            self.assertIsNone(self.cache.open_port('Beta'))
+        self.assertEqual(close_port.call_count, 2)
+
+    def test_axidraw_connect(self):
+        """ AxiDraw connects through the port cache, and closes the port it opened """
+        port = object()
+        ad = axidraw.AxiDraw()
+        ad.plot_setup()
+        ad.options.port = 'Alpha'
+        ad.options.port_config = 2
+        with patch.object(port_cache.default_cache, 'open_port', return_value=port) as open_port,\
+                patch.object(port_cache.ebb_serial, 'queryVersion',
+                    return_value='EBBv13_and_above EB Firmware Version 2.8.1'):
+            ad.serial_connect()
+        open_port.assert_called_once_with('Alpha')
+        self.assertIs(ad.plot_status.port, port)
+        self.assertIsNone(ad.options.port)
+        self.assertEqual(ad.options.port_config, 2)
@@ -0,0 +1,91 @@
+import os
+import struct
+import tempfile
+import unittest
+import zlib
+
+from pyaxidraw import axidraw, preview_raster
+
+# python -m unittest discover in top-level package dir
+
+SVG = """<svg xmlns="http://www.w3.org/2000/svg" width="8in" height="6in" viewBox="0 0 8 6">
+<path d="M 1 1 L 7 1 L 7 5 L 1 5 Z" fill="none" stroke="black" stroke-width="0.01"/>
+<circle cx="4" cy="3" r="1" fill="none" stroke="black" stroke-width="0.01"/>
+</svg>"""
+
+def decode_png(data):
+    ''' width, height and RGB bytes of an 8-bit RGB PNG with unfiltered scanlines '''
+    width, height = struct.unpack('>II', data[16:24])
+    offset, idat = 8, b''
+    while offset < len(data):
+        length, chunk_type = struct.unpack('>I4s', data[offset:offset + 8])
+        if chunk_type == b'IDAT':
+            idat += data[offset + 8:offset + 8 + length]
+        offset += length + 12
+    scanlines = zlib.decompress(idat)
+    row_length = 3 * width + 1
+    rgb = b''.join(scanlines[offset + 1:offset + row_length]
+        for offset in range(0, len(scanlines), row_length))
+    return width, height, rgb
+
+def pixel(image, x_pix, y_pix):
+    ''' (r, g, b) color of one pixel of a decoded image '''
+    width, _height, rgb = image
+    offset = 3 * (y_pix * width + x_pix)
+    return tuple(rgb[offset:offset + 3])
+
+
+class PreviewRasterTestCase(unittest.TestCase):
+
+    def test_png_file(self):
+        """ preview renders a PNG file of pen-down and pen-up moves """
+        ad = axidraw.AxiDraw()
+        ad.plot_setup(SVG)
+        ad.options.preview = True
+        ad.options.rendering = 3
+        with tempfile.TemporaryDirectory() as temp_dir:
+            ad.preview_png = os.path.join(temp_dir, 'preview.png')
+            ad.preview_png_size = 80
+            ad.plot_run()
+            with open(ad.preview_png, 'rb') as png_file:
+                data = png_file.read()
+        self.assertEqual(data[:8], b'\x89PNG\r\n\x1a\n')
+        image = decode_png(data)
+        self.assertEqual(image[:2], (80, 60))
+        self.assertEqual(pixel(image, 40, 10), (0, 0, 255)) # Pen-down: Blue
+        self.assertEqual(pixel(image, 5, 5), (255, 182, 193)) # Pen-up from origin: LightPink
+        self.assertEqual(pixel(image, 20, 30), (255, 255, 255))
+
+    def test_rendering_option(self):
+        """ raster follows the rendering option, and page rotation """
+        ad = axidraw.AxiDraw()
+        ad.plot_setup(SVG)
+        ad.options.preview = True
+        ad.options.rendering = 1
+        ad.plot_run()
+        image = decode_png(preview_raster.render(ad.preview, ad, 80).png())
+        self.assertEqual(pixel(image, 40, 10), (0, 0, 255))
+        self.assertEqual(pixel(image, 5, 5), (255, 255, 255))
+
+        ad.plot_setup(SVG.replace('width="8in" height="6in" viewBox="0 0 8 6"',
+            'width="6in" height="8in" viewBox="0 0 6 8"'))
+        ad.options.preview = True
+        ad.plot_run()
+        image = decode_png(preview_raster.render(ad.preview, ad, 80).png())
+        self.assertEqual(image[:2], (60, 80))
+        self.assertEqual(pixel(image, 40, 10), (0, 0, 255))
+
+    @unittest.skipIf(preview_raster.numpy is None, "NumPy is not installed")
+    def test_numpy(self):
+        """ NumPy and pure Python drawing give nearly the same image """
+        ad = axidraw.AxiDraw()
+        ad.plot_setup(SVG)
+        ad.options.preview = True
+        ad.plot_run()
+        images = []
+        for use_numpy in (True, False):
+            raster = preview_raster.Raster(400, 300, use_numpy)
+            x_page, y_page = ad.preview.trace_pd.page_coords(ad)
+            raster.draw_trace(ad.preview.trace_pd, x_page, y_page, 50, (0, 0, 0))
+            images.append(raster.rgb_bytes())
+        self.assertLess(sum(a != b for a, b in zip(*images)), 0.001 * len(images[0]))
@@ -0,0 +1,137 @@
+import math
+import re
+import unittest
+
+from axidrawinternal import preview
+
+from pyaxidraw import axidraw, preview_recorder
+
+# python -m unittest discover in top-level package dir
+
+LANDSCAPE_SVG = """<svg xmlns="http://www.w3.org/2000/svg" width="8in" height="6in" viewBox="0 0 8 6">
+<path d="M 1 1 L 3 1 L 3 2 Z M 4 4 C 5 3 6 5 7 4" fill="none" stroke="black" stroke-width="0.01"/>
+<circle cx="2" cy="4" r="1" fill="none" stroke="black" stroke-width="0.01"/>
+</svg>"""
+
+PORTRAIT_SVG = """<svg xmlns="http://www.w3.org/2000/svg" width="6in" height="9in" viewBox="0 0 6 9">
+<path d="M 1 1 L 3 1 L 3 2 Z M 4 7 C 5 6 5 8 2 8" fill="none" stroke="black" stroke-width="0.01"/>
+</svg>"""
+
+def vertex_counts(output):
+    ''' number of vertices in each path of the preview layer '''
+    preview_layer = output[output.index('% Preview'):]
+    return [len(re.findall(r'-?\d+\.\d+', path_data)) // 2
+        for path_data in re.findall(r' d="([^"]*)"', preview_layer)]
+
+def render(svg, recorder, rotate_ccw=True, **option_values):
+    ''' preview output and time estimate of an SVG, using the given preview class '''
+    ad = axidraw.AxiDraw()
+    ad.preview = recorder()
+    ad.plot_setup(svg)
+    ad.params.auto_rotate_ccw = rotate_ccw
+    ad.options.preview = True
+    for name, value in option_values.items():
+        setattr(ad.options, name, value)
+    ad.preview.v_chart.enable = option_values.get('report_time', False)
+    output = ad.plot_run(True)
+    return output, ad.time_estimate
+
+
+class PreviewRecorderTestCase(unittest.TestCase):
+
+    def test_matches_preview(self):
+        """ recorded preview renders the same output as axidrawinternal.preview """
+        cases = [(LANDSCAPE_SVG, {'rendering': 1}), (LANDSCAPE_SVG, {'rendering': 2}),
+            (LANDSCAPE_SVG, {'rendering': 3, 'report_time': True}),
+            (PORTRAIT_SVG, {'rendering': 3, 'auto_rotate': False}),
+            (LANDSCAPE_SVG, {'rendering': 0})]
+        for svg, option_values in cases:
+            with self.subTest(**option_values):
+                self.assertEqual(render(svg, preview_recorder.Preview, **option_values),
+                    render(svg, preview.Preview, **option_values))
+
+    def test_rotation(self):
+        """ page rotation in either direction is applied at render time """
+        for rotate_ccw in (True, False):
+            with self.subTest(rotate_ccw=rotate_ccw):
+                expected = render(PORTRAIT_SVG, preview.Preview, rotate_ccw, rendering=3)
+                self.assertIn('% Preview', expected[0])
+                self.assertEqual(render(PORTRAIT_SVG, preview_recorder.Preview, rotate_ccw,
+                    rendering=3), expected)
+
+    def test_move_trace(self):
+        """ subpaths and path data of recorded moves """
+        trace = preview_recorder.MoveTrace()
+        trace.move_to(0, 0)
+        trace.line_to(1, 0.5)
+        trace.move_to(2, 2)
+        trace.line_to(3, 2)
+        self.assertEqual(list(trace.subpaths()), [(0, 2), (2, 4)])
+        self.assertEqual(len(trace), 4)
+        trace.clear()
+        self.assertEqual(list(trace.subpaths()), [])
+
+    def test_budget(self):
+        """ with a vertex budget, each preview path has at most that many vertices """
+        circles = "".join(f'<circle cx="{1 + index_i % 6}" cy="{1 + index_i // 6}" r="0.4"/>'
+            for index_i in range(24))
+        svg = LANDSCAPE_SVG.replace('</svg>', circles + '</svg>')
+        ad = axidraw.AxiDraw()
+        ad.plot_setup(svg)
+        ad.options.preview = True
+        ad.options.rendering = 3
+        ad.preview.v_chart.enable = True
+        counts = vertex_counts(ad.plot_run(True))
+        self.assertEqual(len(counts), 5)
+        self.assertGreater(min(counts), 200)
+
+        ad.preview_budget = 200
+        counts = vertex_counts(ad.plot_run(True))
+        self.assertEqual(len(counts), 5)
+        self.assertLessEqual(max(counts), 200)
+        self.assertGreater(min(counts), 50) # Straight pen-up moves merge to two vertices each
+
+    def test_budget_large_subpath(self):
+        """ a subpath over budget even when coarsely simplified is thinned, not dropped """
+        points = [(4 + (0.1 + index_i * 0.0007) * math.cos(index_i * 0.0628),
+            3 + (0.1 + index_i * 0.0007) * math.sin(index_i * 0.0628)) for index_i in range(4000)]
+        spiral = "M " + " L ".join(f"{x_pos:.4f} {y_pos:.4f}" for x_pos, y_pos in points)
+        ad = axidraw.AxiDraw()
+        ad.plot_setup('<svg xmlns="http://www.w3.org/2000/svg" width="8in" height="6in" '
+            f'viewBox="0 0 8 6"><path d="{spiral}" fill="none" stroke="black"/></svg>')
+        ad.options.preview = True
+        ad.options.rendering = 1
+        ad.preview_budget = 100
+        output = ad.plot_run(True)
+        self.assertNotIn(' d=""', output)
+        counts = vertex_counts(output)
+        self.assertEqual(len(counts), 1)
+        self.assertGreater(counts[0], 50)
+        self.assertLessEqual(counts[0], 100)
+
+        trace = preview_recorder.MoveTrace()
+        trace.move_to(*points[0])
+        for x_pos, y_pos in points[1:]:
+            trace.line_to(x_pos, y_pos)
+        decimated = trace.decimated(0.006, 100)
+        self.assertEqual(len(decimated), 100)
+        self.assertEqual((decimated.x_pos[0], decimated.x_pos[-1]), (points[0][0], points[-1][0]))
+
+    def test_simplify(self):
+        """ collinear vertices are merged, others are kept """
+        x_pos = [0, 1, 2, 3, 3, 3.0005, 3]
+        y_pos = [0, 0, 0, 0, 1, 2, 3]
+        self.assertEqual(preview_recorder.simplify(x_pos, y_pos, 0, 7, 0.001), [0, 3, 6])
+        self.assertEqual(preview_recorder.simplify(x_pos, y_pos, 0, 7, 0.0001), [0, 3, 4, 5, 6])
+        self.assertEqual(preview_recorder.simplify(x_pos, y_pos, 2, 4, 0.001), [2, 3])
+
+    def test_decimated(self):
+        """ decimation drops small subpaths, then keeps the largest within budget """
+        trace = preview_recorder.MoveTrace()
+        for size in (1, 0.0001, 3, 2):
+            trace.move_to(0, 0)
+            trace.line_to(size, 0)
+            trace.line_to(size, size)
+        self.assertEqual(len(trace.decimated(0.001, 100)), 9)
+        decimated = trace.decimated(0.001, 7)
+        self.assertEqual(list(decimated.x_pos), [0, 3, 3, 0, 2, 2])
@@ -0,0 +1,130 @@
+import unittest
+
+from mock import MagicMock, patch
+
+from pyaxidraw import axidraw
+
+# python -m unittest discover in top-level package dir
+
+SVG = '''<svg xmlns="http://www.w3.org/2000/svg" width="100mm" height="100mm"
+    viewBox="0 0 100 100">
+  <path d="M 10,10 L 20,10 L 20,20" stroke="black" fill="none"/>
+</svg>'''
+
+# Responses to EBB queries, by command name. Other commands respond "OK".
+RESPONSES = {'V': ['EBBv13_and_above EB Firmware Version 2.8.1'], 'QP': ['1', 'OK'],
+    'QB': ['0', 'OK'], 'QL': ['0', 'OK'], 'QC': ['0300,0300', 'OK'], 'QS': ['0,0', 'OK'],
+    'QM': ['QM,0,0,0,0'], 'QG': ['00'], 'PI': ['PI,1']}
+
+class FakeEBB:
+    ''' serial port object for a simulated EBB, recording the commands sent to it '''
+
+    def __init__(self):
+        self.commands = []
+        self.replies = []
+        self.connected = True
+        self.closed = False
+
+    def write(self, data):
+        if not self.connected:
+            raise OSError('Device not configured')
+        command = data.decode('ascii').strip()
+        self.commands.append(command)
+        name = command.split(',')[0]
+        self.replies.extend(line + '\r\n' for line in RESPONSES.get(name, ['OK']))
+
+    def readline(self):
+        return self.replies.pop(0).encode('ascii') if self.replies else b''
+
+    def close(self):
+        self.closed = True
+
+    def count(self, name):
+        ''' number of commands sent with the given name '''
+        return sum(1 for command in self.commands if command.split(',')[0] == name)
+
+
+def session_axidraw(ports):
+    ''' AxiDraw, plotting SVG, that opens each of the given FakeEBB ports in turn '''
+    ad = axidraw.AxiDraw()
+    ad.plot_setup(SVG)
+    ad.options.report_time = False
+    ad.keep_open = True
+    ad.port_cache = MagicMock()
+    ad.port_cache.open_port.side_effect = ports
+    return ad
+
+
+class SessionTestCase(unittest.TestCase):
+
+    def test_port_kept_open(self):
+        """ with keep_open, later plots reuse the port without resending settings """
+        port = FakeEBB()
+        ad = session_axidraw([port])
+        ad.plot_run()
+        self.assertEqual(ad.errors.code, 0)
+        self.assertFalse(port.closed)
+        first = len(port.commands)
+        self.assertGreater(port.count('SC'), 0) # Servo configuration
+        self.assertGreater(port.count('PI'), 0) # Motor enable query
+
+        ad.plot_run()
+        self.assertEqual(ad.errors.code, 0)
+        second = port.commands[first:]
+        self.assertEqual(ad.port_cache.open_port.call_count, 1)
+        self.assertEqual([command for command in second if command.split(',')[0] in
+            ('SC', 'PI', 'QL', 'QP')], [])
+        self.assertLessEqual(second.count('V'), port.commands[:first].count('V')) # Probe only
+        self.assertGreater(sum(1 for command in second if command.startswith('SM')), 0)
+        self.assertIsNone(ad.options.port)
+
+        ad.disconnect()
+        self.assertTrue(port.closed)
+        self.assertIsNone(ad.session.port)
+
+    def test_changed_settings(self):
+        """ changed pen heights are sent through the kept port """
+        port = FakeEBB()
+        ad = session_axidraw([port])
+        ad.plot_run()
+        first = len(port.commands)
+        ad.options.pen_pos_up = 70
+        ad.plot_run()
+        self.assertEqual(sum(1 for command in port.commands[first:]
+            if command.startswith('SC,4,')), 1) # New pen-up position
+
+    def test_reconnect(self):
+        """ if the USB link is lost between plots, a new port is opened """
+        ports = [FakeEBB(), FakeEBB()]
+        ad = session_axidraw(ports)
+        ad.plot_run()
+        ports[0].connected = False
+        ad.plot_run()
+        self.assertEqual(ad.errors.code, 0)
+        self.assertTrue(ports[0].closed)
+        self.assertIs(ad.session.port, ports[1])
+        self.assertGreater(ports[1].count('SC'), 0)
+
+    def test_port_option_restored(self):
+        """ the port option is restored if a plot raises an error """
+        port = FakeEBB()
+        ad = session_axidraw([port])
+        with patch.object(ad, 'plot_document', side_effect=RuntimeError('plot failed')):
+            with self.assertRaises(RuntimeError):
+                ad.plot_run()
+        self.assertIsNone(ad.options.port)
+        ad.plot_run()
+        self.assertEqual(ad.errors.code, 0)
+        self.assertIsNone(ad.options.port)
+        ad.disconnect()
+
+    def test_not_kept(self):
+        """ without keep_open, the port is closed after each plot """
+        ports = [FakeEBB(), FakeEBB()]
+        ad = session_axidraw(ports)
+        ad.keep_open = False
+        ad.plot_run()
+        ad.plot_run()
+        self.assertTrue(ports[0].closed and ports[1].closed)
+        self.assertGreater(ports[1].count('SC'), 0)
+        self.assertIsNone(ad.session.port)
@@ -0,0 +1,62 @@
+import unittest
+
+from pyaxidraw import axidraw
+
+# python -m unittest discover in top-level package dir
+
+LAYERS_SVG = """<svg xmlns="http://www.w3.org/2000/svg"
+xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape" width="8in" height="6in" viewBox="0 0 8 6">
+<g inkscape:groupmode="layer" inkscape:label="1 outline">
+<path d="M 1 1 L 7 1 L 7 5 L 1 5 Z" fill="none" stroke="black"/>
+<path d="M 2 2 L 3 2" fill="none" stroke="black"/>
+</g>
+<g inkscape:groupmode="layer" inkscape:label="2+d500 detail">
+<circle cx="4" cy="3" r="1" fill="none" stroke="black"/>
+</g>
+</svg>"""
+
+def run_preview(**attributes):
+    ''' AxiDraw instance after a preview of LAYERS_SVG with stats collection '''
+    ad = axidraw.AxiDraw()
+    ad.plot_setup(LAYERS_SVG)
+    ad.options.preview = True
+    ad.collect_stats = True
+    for name, value in attributes.items():
+        setattr(ad, name, value)
+    ad.plot_run()
+    return ad
+
+
+class StatsCollectorTestCase(unittest.TestCase):
+
+    def test_path_rows(self):
+        """ one row per path, plus one for the layer delay; totals match the document """
+        for fast_estimate in (False, True):
+            with self.subTest(fast_estimate=fast_estimate):
+                ad = run_preview(fast_estimate=fast_estimate)
+                rows = ad.plot_stats.rows
+                self.assertEqual([row.layer_name for row in rows],
+                    ['1 outline', '1 outline', '2+d500 detail', '2+d500 detail'])
+                self.assertEqual([row.path_id is None for row in rows], [False, False, True, False])
+                self.assertAlmostEqual(rows[0].distance_pendown, 0.0254 * 20)
+                self.assertAlmostEqual(rows[1].distance_pendown, 0.0254)
+                self.assertAlmostEqual(rows[2].time_estimate, 0.5)
+                self.assertEqual([row.pen_lifts for row in rows], [1, 1, 0, 1])
+                self.assertAlmostEqual(sum(row.distance_pendown for row in rows),
+                    ad.distance_pendown)
+                self.assertEqual(sum(row.pen_lifts for row in rows), ad.pen_lifts)
+                # Excludes only the return home:
+                self.assertLess(sum(row.time_estimate for row in rows), ad.time_estimate)
+                self.assertLess(sum(row.distance_total for row in rows), ad.distance_total)
+
+    def test_layer_totals(self):
+        """ layer totals combine the rows of each layer """
+        layers = run_preview().plot_stats.layers()
+        self.assertEqual([layer.layer_name for layer in layers], ['1 outline', '2+d500 detail'])
+        self.assertEqual([layer.pen_lifts for layer in layers], [2, 1])
+        self.assertAlmostEqual(layers[0].distance_pendown, 0.0254 * 21)
+        self.assertIsNone(layers[0].path_id)
+
+    def test_disabled(self):
+        """ no stats are collected by default """
+        self.assertIsNone(run_preview(collect_stats=False).plot_stats)
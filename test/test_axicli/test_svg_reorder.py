@@ -0,0 +1,129 @@
+import io
+import math
+import random
+import unittest
+
+from lxml import etree
+from mock import patch
+
+from axidrawinternal import axidraw_svg_reorder
+
+from pyaxidraw import svg_reorder
+
+# python -m unittest discover in top-level package dir
+
+def make_svg(count, seed=0, hidden_every=0):
+    ''' document of short, scattered line segments, optionally with some hidden elements '''
+    rng = random.Random(seed)
+    elements = []
+    for index_i in range(count):
+        if hidden_every and index_i % hidden_every == 1:
+            elements.append(f'<path id="hidden{index_i}" style="display:none" d="M 1 1 l 1 1"/>')
+        elements.append(f'<path id="path{index_i}" d="M {rng.uniform(0, 8):.4f} '
+            + f'{rng.uniform(0, 6):.4f} l {rng.uniform(-0.2, 0.2):.4f} {rng.uniform(-0.2, 0.2):.4f}"/>')
+    return '<svg xmlns="http://www.w3.org/2000/svg" width="8in" height="6in" viewBox="0 0 8 6">'\
+        + "".join(elements) + '</svg>'
+
+NESTED_SVG = """<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink"
+width="8in" height="6in" viewBox="0 0 8 6">
+<defs><path id="mark" d="M 1 1 L 2 2 Z"/></defs>
+<g id="outer" transform="translate(1,0)">
+<use id="clone" xlink:href="#inner" x="0.5"/>
+<g id="inner" transform="rotate(10)"><path id="first" d="M 1 2 l 1 0 m 1 1 l 2 2"/>
+<rect id="box" x="3" y="3" width="1" height="1"/><path id="last" d="M 4 4 L 5 5 z"/></g>
+<use id="marker" xlink:href="#mark" y="2"/></g></svg>"""
+
+def reorder(effect_class, svg):
+    ''' run a reorder effect on svg; return its top-level elements in order '''
+    effect = effect_class()
+    effect.getoptions([])
+    effect.document = etree.parse(io.StringIO(svg))
+    effect.effect()
+    return list(effect.document.getroot())
+
+def pen_up_travel(elements):
+    ''' pen-up distance from the origin through relative line segments '''
+    position = (0, 0)
+    total = 0
+    for element in elements:
+        if element.get('style'):
+            continue
+        values = element.get('d').split()
+        start = (float(values[1]), float(values[2]))
+        total += math.dist(position, start)
+        position = (start[0] + float(values[4]), start[1] + float(values[5]))
+    return total
+
+
+class SvgReorderTestCase(unittest.TestCase):
+
+    def test_comparable_to_greedy(self):
+        """ indexed reordering keeps every element, with travel close to the full greedy search """
+        svg = make_svg(300, seed=3, hidden_every=40)
+        expected = reorder(axidraw_svg_reorder.ReorderEffect, svg)
+        result = reorder(svg_reorder.ReorderEffect, svg)
+
+        self.assertEqual(sorted(element.get('id') for element in result),
+            sorted(element.get('id') for element in expected))
+        self.assertLess(pen_up_travel(result), 1.1 * pen_up_travel(expected))
+
+    def test_non_plottable_placement(self):
+        """ non-plottable elements are placed as by the full greedy search """
+        svg = make_svg(3, seed=1, hidden_every=2)
+        expected = reorder(axidraw_svg_reorder.ReorderEffect, svg)
+        result = reorder(svg_reorder.ReorderEffect, svg)
+        self.assertEqual([element.get('id') for element in result],
+            [element.get('id') for element in expected])
+
+    def test_coincident_ends(self):
+        """ elements that all start and end at one point are still all output """
+        svg = '<svg xmlns="http://www.w3.org/2000/svg" width="8in" height="6in" viewBox="0 0 8 6">'\
+            + "".join(f'<path id="path{index_i}" d="M 1 1 l 0 0"/>' for index_i in range(4))\
+            + '</svg>'
+        expected = reorder(axidraw_svg_reorder.ReorderEffect, svg)
+        result = reorder(svg_reorder.ReorderEffect, svg)
+        self.assertEqual([element.get('id') for element in result],
+            [element.get('id') for element in expected])
+
+    def test_memoized_points(self):
+        """ memoized first and last points match those found by the original methods """
+        document = etree.parse(io.StringIO(NESTED_SVG))
+        matrix = [[2.0, 0.0, 0.5], [0.0, 2.0, 0.0]]
+        original = axidraw_svg_reorder.ReorderEffect()
+        effect = svg_reorder.ReorderEffect()
+        for element in document.getroot().iter('{*}path', '{*}rect', '{*}use'):
+            for _ in range(2):
+                self.assertEqual(effect.getFirstPoint(element, matrix),
+                    original.getFirstPoint(element, matrix))
+                self.assertEqual(effect.getLastPoint(element, matrix),
+                    original.getLastPoint(element, matrix))
+        for element in document.getroot().iter('{*}g'):
+            for _ in range(2):
+                self.assertEqual(effect.group_first_pt(element, matrix),
+                    original.group_first_pt(element, matrix))
+                self.assertEqual(effect.group_last_pt(element, matrix),
+                    original.group_last_pt(element, matrix))
+
+    def test_single_parse(self):
+        """ path data is parsed once per path, not once per query """
+        svg = make_svg(50, seed=2)
+        with patch.object(svg_reorder.simplepath, 'parsePath2',
+                wraps=svg_reorder.simplepath.parsePath2) as parse_path:
+            reorder(svg_reorder.ReorderEffect, svg)
+        self.assertEqual(parse_path.call_count, 50)
+
+    def test_invalidate_on_reorder(self):
+        """ cached group points are refreshed once a group has been reordered """
+        document = etree.parse(io.StringIO(NESTED_SVG))
+        inner = document.getroot().find('.//*[@id="inner"]')
+        effect = svg_reorder.ReorderEffect()
+        effect.getoptions([])
+        effect.x_last, effect.y_last = 10, 10
+        effect.preview_rendering = False
+        effect.layer_index = 0
+        before = effect.group_first_pt(inner)
+        effect.parse_svg(inner)
+        self.assertEqual(inner[0].get('id'), 'last')
+        after = effect.group_first_pt(inner)
+        self.assertNotEqual(after, before)
+        self.assertEqual(after, axidraw_svg_reorder.ReorderEffect().group_first_pt(inner))
@@ -0,0 +1,53 @@
+import array
+import unittest
+
+from test.test_axicli.test_buffered_motion import interactive_preview
+
+from pyaxidraw import vertex_arrays
+
+# python -m unittest discover in top-level package dir
+
+VERTICES = [[10, 10], [50, 20], [80, 60], [20, 70]] # mm
+
+
+class VertexArraysTestCase(unittest.TestCase):
+
+    def test_buffers(self):
+        """ flat array.array and memoryview buffers of x, y values become [x, y] lists """
+        flat = array.array('d', [value for vertex in VERTICES for value in vertex])
+        self.assertEqual(vertex_arrays.to_vertex_list(flat), VERTICES)
+        self.assertEqual(vertex_arrays.to_vertex_list(memoryview(flat), 0.5),
+            [[x_value / 2, y_value / 2] for x_value, y_value in VERTICES])
+        self.assertIs(vertex_arrays.to_vertex_list(VERTICES), VERTICES)
+        self.assertFalse(vertex_arrays.is_array(VERTICES))
+
+    @unittest.skipIf(vertex_arrays.numpy is None, "NumPy is not installed")
+    def test_numpy(self):
+        """ (N, 2) NumPy arrays become [x, y] lists, without modifying the array """
+        values = vertex_arrays.numpy.array(VERTICES, dtype=float)
+        self.assertEqual(vertex_arrays.to_vertex_list(values, 2),
+            [[x_value * 2, y_value * 2] for x_value, y_value in VERTICES])
+        self.assertEqual(values.tolist(), VERTICES)
+
+    def test_clamp(self):
+        """ vertices are truncated at travel limits, in place """
+        vertex_list = [[1, 1], [2, 1]]
+        vertex_arrays.clamp(vertex_list, 5, 5)
+        self.assertEqual(vertex_list, [[1, 1], [2, 1]])
+        vertex_list = [[-1, 1], [7, 6]]
+        vertex_arrays.clamp(vertex_list, 5, 5)
+        self.assertEqual(vertex_list, [[0, 1], [5, 5]])
+
+    def test_draw_path_arrays(self):
+        """ draw_path and draw_paths give the same results for arrays as for lists """
+        flat = array.array('d', [value for vertex in VERTICES for value in vertex])
+        results = []
+        for path in (VERTICES, flat):
+            ad = interactive_preview(False)
+            ad.options.units = 2
+            ad.draw_path(path)
+            ad.draw_paths([path, path])
+            results.append((ad.plot_status.stats.pt_estimate,
+                ad.plot_status.stats.down_travel_inch, ad.turtle_pos()))
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(VERTICES, [[10, 10], [50, 20], [80, 60], [20, 70]]) # Unmodified